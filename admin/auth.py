@@ -7,15 +7,11 @@ from typing import Optional, Union
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from admin.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from admin.database import get_db
-from admin.models import AdminUser
-
-# Password context for hashing and verification
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from admin.models import AdminUser, pwd_context
 
 # OAuth2 password bearer for token handling
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
@@ -62,7 +58,7 @@ async def get_token_from_cookie(request: Request) -> Optional[str]:
         return token.replace("Bearer ", "")
     return None
 
-async def get_current_user(
+def get_current_user(
     request: Request,
     db: Session = Depends(get_db),
     token: str = Depends(get_token_from_cookie)
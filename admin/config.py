@@ -5,6 +5,8 @@ Loads environment variables and defines constants.
 import os
 from pathlib import Path
 
+from bot.config import DB_POOL_SIZE, DB_MAX_OVERFLOW
+
 # Admin panel configuration
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin")  # Default for development
@@ -17,6 +19,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Database configuration
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///booking.db")
 
+# Connection pool, set with DB_POOL_SIZE and DB_MAX_OVERFLOW for the admin process.
+# Sync routes run on a threadpool, each worker thread holds at most one
+# connection, so the threadpool is sized to match the pool.
+THREADPOOL_SIZE = int(os.getenv("ADMIN_THREADPOOL_SIZE", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
 # Base directory
 BASE_DIR = Path(__file__).parent.parent
 
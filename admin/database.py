@@ -1,21 +1,20 @@
 """
 Database configuration and session management for the Admin Panel.
 """
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
 from admin.config import DB_URL
+# Admin tables live in the same metadata as the bot's
+from bot.database import Base
+from bot.engine import get_engine
 
-# Create SQLAlchemy engine
-engine = create_engine(DB_URL)
+# The process-wide engine, pool sized by DB_POOL_* (see bot.engine)
+engine = get_engine(DB_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Base class for SQLAlchemy models
-Base = declarative_base()
-
 def get_db():
     """
     Get database session.
@@ -28,7 +27,10 @@ def get_db():
 
 def init_admin_db():
     """
-    Initialize database tables.
+    Initialize database tables and the default admin user.
+
+    The only place the admin user is seeded, for both the FastAPI and the
+    Flask admin, from ADMIN_USERNAME and ADMIN_PASSWORD.
     """
     from admin.models import AdminUser
     Base.metadata.create_all(bind=engine)
@@ -47,6 +49,10 @@ def init_admin_db():
                 is_active=True
             )
             db.add(admin)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # The other admin panel seeded it at the same time
+                db.rollback()
     finally:
         db.close()
@@ -8,19 +8,27 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional
 
+import anyio
 import uvicorn
 from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from admin.auth import authenticate_user, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from admin.database import get_db
+from admin.config import THREADPOOL_SIZE
+from admin.database import get_db, init_admin_db
 from admin.models import AdminUser
-from admin.routers import staff, bookings, schedule
+from admin.routers import staff, bookings, schedule, reports
+from bot.database import Booking, Staff
+from bot.engine import dispose_engines
+from bot.utils.dashboard import dashboard_stats
+from bot.utils import metrics
+from bot.utils.live import HEARTBEAT_INTERVAL, format_sse, live_feed
 
 # Setup logging
 logging.basicConfig(
@@ -51,6 +59,33 @@ templates = Jinja2Templates(directory="admin/templates")
 app.include_router(staff.router, prefix="/staff", tags=["staff"])
 app.include_router(bookings.router, prefix="/bookings", tags=["bookings"])
 app.include_router(schedule.router, prefix="/schedule", tags=["schedule"])
+app.include_router(reports.router, prefix="/reports", tags=["reports"])
+
+@app.on_event("startup")
+async def create_tables():
+    """Create missing tables and the default admin user (ADMIN_USERNAME/ADMIN_PASSWORD)."""
+    await run_in_threadpool(init_admin_db)
+
+@app.on_event("startup")
+async def size_threadpool():
+    """
+    Match the threadpool that runs the sync routes to the database pool, so
+    requests queue for a thread rather than holding one while waiting for a connection.
+    """
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+@app.on_event("startup")
+async def start_live_feed():
+    """Start fanning booking events out to open dashboards."""
+    live_feed.start()
+
+@app.on_event("shutdown")
+async def stop_live_feed():
+    await live_feed.stop()
+
+@app.on_event("shutdown")
+def close_database_connections():
+    dispose_engines()
 
 @app.get("/")
 async def index(request: Request, current_user: AdminUser = Depends(get_current_user)):
@@ -60,9 +95,55 @@ async def index(request: Request, current_user: AdminUser = Depends(get_current_
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "current_user": current_user,
-        "title": "Dashboard"
+        "title": "Dashboard",
+        "live_events_url": "/events/dashboard"
     })
 
+@app.get("/api/dashboard")
+def api_dashboard(
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """
+    Dashboard counters (cached, see bot.utils.dashboard)
+    """
+    return dashboard_stats.get(db, Booking, Staff)
+
+@app.get("/api/metrics")
+def api_metrics(current_user: AdminUser = Depends(get_current_user)):
+    """
+    Admin panel metrics of this process, e.g. fragment render times
+    """
+    return metrics.snapshot("admin.")
+
+@app.get("/events/dashboard")
+async def dashboard_events(request: Request, current_user: AdminUser = Depends(get_current_user)):
+    """
+    Server-Sent Events stream of booking changes and counter deltas for the dashboard
+    """
+    queue = live_feed.connect()
+
+    async def stream():
+        try:
+            # Ask the browser to wait a few seconds before reconnecting
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(message)
+        finally:
+            live_feed.disconnect(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/login")
 async def login_page(request: Request):
     """
@@ -74,7 +155,7 @@ async def login_page(request: Request):
     })
 
 @app.post("/login")
-async def login(
+def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -1,16 +1,20 @@
 """
 Database models for the Admin Panel.
 """
+from passlib.context import CryptContext
 from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
-from admin.database import Base
-from bot.database import User, Staff, Booking, StaffSchedule, BookingStatus
+from bot.database import Base, User, Staff, Booking, StaffSchedule, BookingStatus
+
+# Password context for hashing and verification, shared by both admin panels
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class AdminUser(Base):
     """
     Admin user model for authentication.
+    Used by both the FastAPI and the Flask admin panel.
     """
     __tablename__ = "admin_users"
     
@@ -21,5 +25,13 @@ class AdminUser(Base):
     created_at = Column(DateTime, server_default=func.now())
     last_login = Column(DateTime, nullable=True)
 
+    def set_password(self, password: str) -> None:
+        """Hash and store a new password."""
+        self.hashed_password = pwd_context.hash(password)
+
+    def check_password(self, password: str) -> bool:
+        """Check a password against the stored hash."""
+        return bool(self.hashed_password) and pwd_context.verify(password, self.hashed_password)
+
 # We'll reuse the models from the bot's database
 # Importing them here for reference
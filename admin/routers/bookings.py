@@ -4,26 +4,28 @@ Booking management routes for the Admin Panel.
 from datetime import datetime, timedelta
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager, joinedload
 
 from admin.auth import get_current_user
-from admin.database import get_db
+from admin.database import SessionLocal, get_db
 from admin.models import AdminUser
 from bot.database import Booking, BookingStatus, User, Staff
 from bot.utils.zoom import update_zoom_meeting
-from bot.utils.bitrix24 import update_bitrix_event
+from bot.utils import events
+from bot.utils.bitrix24_batch import get_batch_client
+from bot.utils.export import EXPORT_FORMATS, iter_export
+from bot.utils.pagination import paginate_bookings
+from bot.utils.recent_bookings import recent_bookings
+from bot.utils.search import user_search_condition
 
 router = APIRouter()
 templates = Jinja2Templates(directory="admin/templates")
 
-@router.get("/", response_class=HTMLResponse)
-async def get_bookings_list(
-    request: Request,
-    db: Session = Depends(get_db),
-    current_user: AdminUser = Depends(get_current_user),
-    page: int = Query(1, ge=1),
+def _filter_bookings(
+    query,
     status: Optional[str] = None,
     staff_id: Optional[int] = None,
     date_from: Optional[str] = None,
@@ -31,12 +33,9 @@ async def get_bookings_list(
     search: Optional[str] = None
 ):
     """
-    Get the list of bookings with filters.
+    Apply the booking list filters to a query joined with User and Staff.
+    Invalid filter values are ignored.
     """
-    # Base query
-    query = db.query(Booking).join(User).join(Staff)
-    
-    # Apply filters
     if status:
         try:
             booking_status = BookingStatus[status.upper()]
@@ -63,26 +62,48 @@ async def get_bookings_list(
             pass
     
     if search:
-        query = query.filter(
-            (User.first_name.ilike(f"%{search}%")) |
-            (User.last_name.ilike(f"%{search}%")) |
-            (User.phone_number.ilike(f"%{search}%")) |
-            (User.username.ilike(f"%{search}%"))
-        )
-    
-    # Order by date, most recent first
-    query = query.order_by(Booking.booking_date.desc())
+        condition = user_search_condition(query.session.get_bind(), search)
+        if condition is not None:
+            query = query.filter(condition)
     
-    # Count total items
-    total_items = query.count()
+    return query
+
+@router.get("/", response_class=HTMLResponse)
+def get_bookings_list(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    status: Optional[str] = None,
+    staff_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    search: Optional[str] = None
+):
+    """
+    Get the list of bookings with filters.
+    """
+    # Base query; the joins used for filtering also populate booking.user and booking.staff
+    query = (
+        db.query(Booking)
+        .join(User)
+        .join(Staff)
+        .options(contains_eager(Booking.user), contains_eager(Booking.staff))
+    )
+    query = _filter_bookings(query, status, staff_id, date_from, date_to, search)
     
-    # Pagination
+    # Newest first, one page at a time using the last row seen as the cursor
     items_per_page = 10
-    total_pages = (total_items + items_per_page - 1) // items_per_page
-    offset = (page - 1) * items_per_page
-    
-    # Get paginated items
-    bookings = query.offset(offset).limit(items_per_page).all()
+    page = paginate_bookings(
+        query,
+        Booking,
+        per_page=items_per_page,
+        after=after,
+        before=before,
+        count_key=("admin.bookings", status, staff_id, date_from, date_to, search)
+    )
+    bookings = page.items
     
     # Get all staff for filter dropdown
     staff_members = db.query(Staff).all()
@@ -92,19 +113,110 @@ async def get_bookings_list(
         "current_user": current_user,
         "title": "Booking Management",
         "bookings": bookings,
-        "current_page": page,
-        "total_pages": total_pages,
+        "pagination": page,
         "status_filter": status,
         "staff_id_filter": staff_id,
         "date_from_filter": date_from,
         "date_to_filter": date_to,
         "search": search or "",
+        "filters": {
+            "status": status,
+            "staff_id": staff_id,
+            "date_from": date_from,
+            "date_to": date_to,
+            "search": search
+        },
         "staff_members": staff_members,
         "booking_statuses": [status.name for status in BookingStatus]
     })
 
+@router.get("/recent", response_class=HTMLResponse)
+def get_recent_bookings(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """
+    Table rows of the five newest bookings, for the dashboard.
+    Rendered only when a booking was added or changed (see bot.utils.recent_bookings).
+    """
+    rows_template = templates.get_template("recent_bookings.html")
+    html = recent_bookings.render(db, Booking, lambda bookings: rows_template.render(bookings=bookings))
+    return HTMLResponse(content=html)
+
+# Columns of an export, in order
+EXPORT_COLUMNS = {
+    "id": Booking.id,
+    "booking_date": Booking.booking_date,
+    "duration_minutes": Booking.duration_minutes,
+    "status": Booking.status,
+    "price": Booking.price,
+    "staff_id": Booking.staff_id,
+    "staff_name": Staff.name,
+    "user_id": Booking.user_id,
+    "telegram_id": User.telegram_id,
+    "first_name": User.first_name,
+    "last_name": User.last_name,
+    "username": User.username,
+    "phone_number": User.phone_number,
+    "payment_id": Booking.payment_id,
+    "zoom_join_url": Booking.zoom_join_url,
+    "created_at": Booking.created_at,
+}
+
+# Rows fetched from the server-side cursor at a time
+EXPORT_BATCH_SIZE = 1000
+
+def _export_rows(status, staff_id, date_from, date_to, search):
+    """
+    Yield the filtered booking rows for an export.
+
+    Uses its own session so it stays open while the response is streamed,
+    and a server-side cursor so rows are never all in memory at once.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(*EXPORT_COLUMNS.values()).select_from(Booking).join(User).join(Staff)
+        query = _filter_bookings(query, status, staff_id, date_from, date_to, search)
+        query = query.order_by(Booking.booking_date.desc(), Booking.id.desc())
+        yield from query.yield_per(EXPORT_BATCH_SIZE)
+    finally:
+        db.close()
+
+@router.get("/export")
+def export_bookings(
+    format: str = "csv",
+    gzip: bool = False,
+    status: Optional[str] = None,
+    staff_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    search: Optional[str] = None,
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """
+    Export bookings as CSV or JSON Lines, with the same filters as the list.
+    The file is streamed, optionally gzip-compressed, in constant memory.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    rows = _export_rows(status, staff_id, date_from, date_to, search)
+    filename = f"bookings-{datetime.now():%Y%m%d-%H%M%S}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    # A sync generator is iterated in the threadpool, so the database reads don't block the event loop
+    return StreamingResponse(
+        iter_export(format, list(EXPORT_COLUMNS), rows, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/{booking_id}", response_class=HTMLResponse)
-async def get_booking_details(
+def get_booking_details(
     request: Request,
     booking_id: int,
     db: Session = Depends(get_db),
@@ -113,7 +225,12 @@ async def get_booking_details(
     """
     Get details of a specific booking.
     """
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = (
+        db.query(Booking)
+        .options(joinedload(Booking.user), joinedload(Booking.staff))
+        .filter(Booking.id == booking_id)
+        .first()
+    )
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -126,7 +243,7 @@ async def get_booking_details(
     })
 
 @router.post("/{booking_id}/status", response_class=HTMLResponse)
-async def update_booking_status(
+def update_booking_status(
     request: Request,
     booking_id: int,
     status: str = Form(...),
@@ -142,11 +259,21 @@ async def update_booking_status(
     
     try:
         new_status = BookingStatus[status.upper()]
-        booking.status = new_status
-        db.commit()
     except (KeyError, ValueError):
         raise HTTPException(status_code=400, detail="Invalid status")
     
+    old_status = booking.status
+    booking.status = new_status
+    db.commit()
+    
+    events.publish(
+        events.BOOKING_STATUS_CHANGED,
+        booking_id=booking.id,
+        old_status=old_status,
+        new_status=new_status
+    )
+    events.publish(events.AVAILABILITY_CHANGED, staff_ids=[booking.staff_id], date=booking.booking_date.date())
+    
     return RedirectResponse(url=f"/bookings/{booking.id}", status_code=303)
 
 @router.post("/{booking_id}/reschedule", response_class=HTMLResponse)
@@ -161,42 +288,64 @@ async def reschedule_booking(
     """
     Reschedule a booking to a new date and time.
     """
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-    
     try:
         # Parse new date and time
         new_datetime = datetime.strptime(f"{new_date} {new_time}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time format")
+    
+    def move_booking():
+        booking = (
+            db.query(Booking)
+            .options(joinedload(Booking.staff))
+            .filter(Booking.id == booking_id)
+            .first()
+        )
+        if not booking:
+            return None
         
         # Update booking date
         old_date = booking.booking_date
         booking.booking_date = new_datetime
         db.commit()
         
-        # Update Zoom meeting if exists
-        if booking.zoom_meeting_id:
-            await update_zoom_meeting(
-                booking.zoom_meeting_id,
-                new_datetime,
-                booking.duration_minutes or 30
-            )
-        
-        # Update Bitrix24 event if exists
-        if booking.bitrix_event_id and booking.staff and booking.staff.bitrix_user_id:
-            await update_bitrix_event(
-                booking.staff.bitrix_user_id,
-                booking.bitrix_event_id,
-                new_datetime,
-                booking.duration_minutes or 30
-            )
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date or time format")
+        # Read what the calendar updates need before leaving the worker thread
+        bitrix_user_id = booking.staff.bitrix_user_id if booking.staff else None
+        return (
+            booking.staff_id, old_date, booking.zoom_meeting_id, booking.bitrix_event_id,
+            bitrix_user_id, booking.duration_minutes or 30
+        )
     
-    return RedirectResponse(url=f"/bookings/{booking.id}", status_code=303)
+    # The route awaits Zoom and Bitrix24, so its database work is sent to the threadpool
+    moved = await run_in_threadpool(move_booking)
+    if moved is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    staff_id, old_date, zoom_meeting_id, bitrix_event_id, bitrix_user_id, duration_minutes = moved
+    
+    events.publish(
+        events.BOOKING_RESCHEDULED,
+        booking_id=booking_id,
+        staff_id=staff_id,
+        old_date=old_date,
+        new_date=new_datetime
+    )
+    for day in {old_date.date(), new_datetime.date()}:
+        events.publish(events.AVAILABILITY_CHANGED, staff_ids=[staff_id], date=day)
+    
+    # Update Zoom meeting if exists
+    if zoom_meeting_id:
+        await update_zoom_meeting(zoom_meeting_id, new_datetime, duration_minutes)
+    
+    # Update Bitrix24 event if exists, batched with other reschedules in flight
+    if bitrix_event_id and bitrix_user_id:
+        await get_batch_client().update_event(
+            booking_id, bitrix_user_id, bitrix_event_id, new_datetime, duration_minutes
+        )
+    
+    return RedirectResponse(url=f"/bookings/{booking_id}", status_code=303)
 
 @router.delete("/{booking_id}")
-async def delete_booking(
+def delete_booking(
     booking_id: int,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
@@ -210,19 +359,6 @@ async def delete_booking(
     
     db.delete(booking)
     db.commit()
+    recent_bookings.invalidate()
     
     return {"status": "success", "message": "Booking deleted successfully"}
-
-@router.get("/export", response_class=HTMLResponse)
-async def export_bookings(
-    request: Request,
-    format: str = "csv",
-    db: Session = Depends(get_db),
-    current_user: AdminUser = Depends(get_current_user)
-):
-    """
-    Export bookings data.
-    """
-    # This would normally generate a CSV or Excel file for download
-    # For simplicity, we'll just redirect to the bookings page
-    return RedirectResponse(url="/bookings", status_code=303)
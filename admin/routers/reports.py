@@ -0,0 +1,72 @@
+"""
+Staff report routes for the Admin Panel.
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from sqlalchemy.orm import Session
+
+from admin.auth import get_current_user
+from admin.database import get_db
+from admin.models import AdminUser
+from bot.utils.export import EXPORT_FORMATS, iter_export
+from bot.utils.reports import (
+    REPORT_COLUMNS, REPORT_PERIODS, queued_day_count, report_csv_rows, report_range, staff_report
+)
+
+router = APIRouter()
+templates = Jinja2Templates(directory="admin/templates")
+
+def _report(db: Session, date_from: Optional[str], date_to: Optional[str], period: str):
+    if period not in REPORT_PERIODS:
+        raise HTTPException(status_code=400, detail=f"Unknown period: {period}")
+    try:
+        start, end = report_range(date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return start, end, staff_report(db, start, end, period)
+
+@router.get("/", response_class=HTMLResponse)
+def get_reports(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    period: str = Query("week")
+):
+    """
+    Per-staff utilization, cancellations and revenue, read from the daily rollups.
+    """
+    start, end, rows = _report(db, date_from, date_to, period)
+    
+    return templates.TemplateResponse("reports.html", {
+        "request": request,
+        "current_user": current_user,
+        "title": "Staff Performance",
+        "rows": rows,
+        "periods": REPORT_PERIODS,
+        "stale_days": queued_day_count(db, start, end),
+        "filters": {"date_from": start.isoformat(), "date_to": end.isoformat(), "period": period}
+    })
+
+@router.get("/download")
+def download_report(
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    period: str = Query("week")
+):
+    """
+    The staff report as CSV.
+    """
+    start, end, rows = _report(db, date_from, date_to, period)
+    filename = f"staff-report-{start:%Y%m%d}-{end:%Y%m%d}-{period}.csv"
+    
+    return StreamingResponse(
+        iter_export("csv", list(REPORT_COLUMNS), report_csv_rows(rows)),
+        media_type=EXPORT_FORMATS["csv"],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,9 +1,11 @@
 """
 Staff schedule management routes for the Admin Panel.
 """
-from typing import List, Optional, Dict
-from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+import re
+from typing import Any, List, Optional, Dict
+from fastapi import APIRouter, Body, Depends, Request, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
@@ -11,13 +13,60 @@ from admin.auth import get_current_user
 from admin.database import get_db
 from admin.models import AdminUser
 from admin.config import DEFAULT_WORKING_HOURS
-from bot.database import Staff, StaffSchedule
+from bot.database import Staff, StaffSchedule, staff_schedule_upsert
+from bot.utils import events
+from bot.utils.http_cache import cache_headers, get_table_versions, is_not_modified
 
 router = APIRouter()
 templates = Jinja2Templates(directory="admin/templates")
 
+TIME_FORMAT = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+
+# Hours stored for days off, the columns can't be empty
+DAY_OFF_HOURS = ("09:00", "17:00")
+
+def _schedule_row(staff_id: int, weekday: int, is_working_day: bool,
+                  start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validate one day of a schedule and turn it into a row for staff_schedule_upsert.
+    Days off are kept as rows with is_working_day False.
+    """
+    if weekday not in range(7):
+        raise HTTPException(status_code=400, detail=f"Invalid weekday: {weekday}")
+    
+    if not is_working_day:
+        start_time, end_time = start_time or DAY_OFF_HOURS[0], end_time or DAY_OFF_HOURS[1]
+    
+    for value in (start_time, end_time):
+        if not value or not TIME_FORMAT.match(value):
+            raise HTTPException(status_code=400, detail=f"Invalid time for weekday {weekday}: {value!r}")
+    if is_working_day and start_time >= end_time:
+        raise HTTPException(status_code=400, detail=f"Start time must be before end time for weekday {weekday}")
+    
+    return {
+        "staff_id": staff_id,
+        "weekday": weekday,
+        "start_time": start_time,
+        "end_time": end_time,
+        "is_working_day": is_working_day
+    }
+
+def _save_schedules(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Write schedule rows in one INSERT ... ON CONFLICT statement and announce
+    a single availability change for the affected staff.
+    """
+    db.execute(staff_schedule_upsert(rows, db.get_bind().dialect.name))
+    db.commit()
+    
+    events.publish(
+        events.AVAILABILITY_CHANGED,
+        staff_ids=sorted({row["staff_id"] for row in rows}),
+        date=None
+    )
+
 @router.get("/", response_class=HTMLResponse)
-async def get_schedule_list(
+def get_schedule_list(
     request: Request,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user),
@@ -25,7 +74,15 @@ async def get_schedule_list(
 ):
     """
     Get the schedule management page.
+    Answers 304 while staff and schedules are unchanged since the browser's copy.
     """
+    versions = get_table_versions(db, ("staff", "staff_schedules"))
+    etag = versions.etag("schedule", current_user.id, staff_id)
+    headers = cache_headers(etag, versions.last_modified)
+    if is_not_modified(etag, versions.last_modified,
+                       request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    
     # Get all staff members
     staff_members = db.query(Staff).all()
     
@@ -70,10 +127,10 @@ async def get_schedule_list(
             {"id": 5, "name": "Saturday"},
             {"id": 6, "name": "Sunday"}
         ]
-    })
+    }, headers=headers)
 
 @router.post("/update", response_class=HTMLResponse)
-async def update_schedule(
+def update_schedule(
     request: Request,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user),
@@ -91,31 +148,8 @@ async def update_schedule(
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
     
-    # Check if schedule already exists for this weekday
-    schedule = db.query(StaffSchedule).filter(
-        StaffSchedule.staff_id == staff_id,
-        StaffSchedule.weekday == weekday
-    ).first()
-    
-    if is_working_day and start_time and end_time:
-        # Working day - create or update schedule
-        if schedule:
-            schedule.start_time = start_time
-            schedule.end_time = end_time
-        else:
-            schedule = StaffSchedule(
-                staff_id=staff_id,
-                weekday=weekday,
-                start_time=start_time,
-                end_time=end_time
-            )
-            db.add(schedule)
-    else:
-        # Not a working day - delete schedule if exists
-        if schedule:
-            db.delete(schedule)
-    
-    db.commit()
+    is_working_day = bool(is_working_day and start_time and end_time)
+    _save_schedules(db, [_schedule_row(staff_id, weekday, is_working_day, start_time, end_time)])
     
     return RedirectResponse(url=f"/schedule?staff_id={staff_id}", status_code=303)
 
@@ -129,47 +163,68 @@ async def bulk_update_schedule(
     """
     Bulk update a staff member's schedule for all weekdays.
     """
-    # Check if staff exists
-    staff = db.query(Staff).filter(Staff.id == staff_id).first()
+    # The route awaits the form, so its database work is sent to the threadpool
+    staff = await run_in_threadpool(db.get, Staff, staff_id)
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
     
-    # Process each weekday
+    # The whole week is written in one statement
+    form = await request.form()
+    rows = []
     for weekday in range(7):
-        is_working_day = request.form.get(f"is_working_day_{weekday}", "off") == "on"
-        start_time = request.form.get(f"start_time_{weekday}")
-        end_time = request.form.get(f"end_time_{weekday}")
-        
-        # Check if schedule already exists for this weekday
-        schedule = db.query(StaffSchedule).filter(
-            StaffSchedule.staff_id == staff_id,
-            StaffSchedule.weekday == weekday
-        ).first()
-        
-        if is_working_day and start_time and end_time:
-            # Working day - create or update schedule
-            if schedule:
-                schedule.start_time = start_time
-                schedule.end_time = end_time
-            else:
-                schedule = StaffSchedule(
-                    staff_id=staff_id,
-                    weekday=weekday,
-                    start_time=start_time,
-                    end_time=end_time
-                )
-                db.add(schedule)
-        else:
-            # Not a working day - delete schedule if exists
-            if schedule:
-                db.delete(schedule)
+        start_time = form.get(f"start_time_{weekday}")
+        end_time = form.get(f"end_time_{weekday}")
+        is_working_day = form.get(f"is_working_day_{weekday}", "off") == "on" and bool(start_time and end_time)
+        rows.append(_schedule_row(staff_id, weekday, is_working_day, start_time, end_time))
     
-    db.commit()
+    await run_in_threadpool(_save_schedules, db, rows)
     
     return RedirectResponse(url=f"/schedule?staff_id={staff_id}", status_code=303)
 
+@router.post("/bulk")
+def bulk_upsert_schedules(
+    staff_ids: List[int] = Body(...),
+    days: List[Dict[str, Any]] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """
+    Set the same weekly hours for several staff members at once.
+    
+    Expects JSON like {"staff_ids": [1, 2], "days": [{"weekday": 0, "start_time": "09:00",
+    "end_time": "17:00", "is_working_day": true}, ...]}. Weekdays that aren't listed are left unchanged.
+    """
+    if not staff_ids or not days:
+        raise HTTPException(status_code=400, detail="staff_ids and days are required")
+    
+    found = {staff_id for (staff_id,) in db.query(Staff.id).filter(Staff.id.in_(staff_ids))}
+    missing = sorted(set(staff_ids) - found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Staff not found: {missing}")
+    
+    rows = []
+    for day in days:
+        try:
+            weekday = int(day["weekday"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Every day needs a weekday (0-6)")
+        for staff_id in sorted(found):
+            rows.append(_schedule_row(
+                staff_id,
+                weekday,
+                bool(day.get("is_working_day", True)),
+                day.get("start_time"),
+                day.get("end_time")
+            ))
+    
+    # Later entries for the same weekday win, ON CONFLICT can't update a row twice
+    rows = list({(row["staff_id"], row["weekday"]): row for row in rows}.values())
+    _save_schedules(db, rows)
+    
+    return {"status": "success", "updated": len(rows)}
+
 @router.post("/apply-default", response_class=HTMLResponse)
-async def apply_default_schedule(
+def apply_default_schedule(
     request: Request,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user),
@@ -183,21 +238,12 @@ async def apply_default_schedule(
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
     
-    # Delete existing schedules
-    db.query(StaffSchedule).filter(StaffSchedule.staff_id == staff_id).delete()
-    
-    # Apply default schedule
+    # Apply default schedule, days without hours are days off
+    rows = []
     for weekday, hours in DEFAULT_WORKING_HOURS.items():
-        if hours:
-            start_time, end_time = hours
-            schedule = StaffSchedule(
-                staff_id=staff_id,
-                weekday=weekday,
-                start_time=start_time,
-                end_time=end_time
-            )
-            db.add(schedule)
+        start_time, end_time = hours or (None, None)
+        rows.append(_schedule_row(staff_id, weekday, bool(hours), start_time, end_time))
     
-    db.commit()
+    _save_schedules(db, rows)
     
     return RedirectResponse(url=f"/schedule?staff_id={staff_id}", status_code=303)
@@ -4,20 +4,22 @@ Staff management routes for the Admin Panel.
 import os
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Request, Form, UploadFile, File, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
 from sqlalchemy.orm import Session
 
 from admin.auth import get_current_user
 from admin.database import get_db
 from admin.models import AdminUser
 from bot.database import Staff
+from bot.utils.http_cache import cache_headers, fragment_cache, get_table_versions, is_not_modified
 
 router = APIRouter()
 templates = Jinja2Templates(directory="admin/templates")
 
 @router.get("/", response_class=HTMLResponse)
-async def get_staff_list(
+def get_staff_list(
     request: Request,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user),
@@ -26,37 +28,53 @@ async def get_staff_list(
 ):
     """
     Get the list of staff members.
+    Answers 304 while the staff table is unchanged since the browser's copy.
     """
-    # Base query
-    query = db.query(Staff)
+    versions = get_table_versions(db, ("staff",))
+    etag = versions.etag("staff", current_user.id, page, search)
+    headers = cache_headers(etag, versions.last_modified)
+    if is_not_modified(etag, versions.last_modified,
+                       request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
     
-    # Apply search filter if provided
-    if search:
-        query = query.filter(Staff.name.ilike(f"%{search}%"))
+    def render_staff_cards():
+        # Base query
+        query = db.query(Staff)
+        
+        # Apply search filter if provided
+        if search:
+            query = query.filter(Staff.name.ilike(f"%{search}%"))
+        
+        # Count total items
+        total_items = query.count()
+        
+        # Pagination
+        items_per_page = 10
+        total_pages = (total_items + items_per_page - 1) // items_per_page
+        offset = (page - 1) * items_per_page
+        
+        # Get paginated items
+        staff_members = query.offset(offset).limit(items_per_page).all()
+        html = templates.get_template("components/staff_cards.html").render(staff_list=staff_members)
+        return html, total_pages
     
-    # Count total items
-    total_items = query.count()
-    
-    # Pagination
-    items_per_page = 10
-    total_pages = (total_items + items_per_page - 1) // items_per_page
-    offset = (page - 1) * items_per_page
-    
-    # Get paginated items
-    staff_members = query.offset(offset).limit(items_per_page).all()
+    # The cards are the same for every admin until the staff table changes
+    staff_cards, total_pages = fragment_cache.get_or_render(
+        f"admin:staff_cards:{versions.etag(page, search)}", render_staff_cards
+    )
     
     return templates.TemplateResponse("staff.html", {
         "request": request,
         "current_user": current_user,
         "title": "Staff Management",
-        "staff_members": staff_members,
+        "staff_cards": Markup(staff_cards),
         "current_page": page,
         "total_pages": total_pages,
         "search": search or ""
-    })
+    }, headers=headers)
 
 @router.get("/add", response_class=HTMLResponse)
-async def get_add_staff_form(
+def get_add_staff_form(
     request: Request,
     current_user: AdminUser = Depends(get_current_user)
 ):
@@ -71,7 +89,7 @@ async def get_add_staff_form(
     })
 
 @router.post("/add", response_class=HTMLResponse)
-async def add_staff(
+def add_staff(
     request: Request,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user),
@@ -105,7 +123,7 @@ async def add_staff(
     return RedirectResponse(url="/staff", status_code=303)
 
 @router.get("/edit/{staff_id}", response_class=HTMLResponse)
-async def get_edit_staff_form(
+def get_edit_staff_form(
     request: Request,
     staff_id: int,
     db: Session = Depends(get_db),
@@ -127,7 +145,7 @@ async def get_edit_staff_form(
     })
 
 @router.post("/edit/{staff_id}", response_class=HTMLResponse)
-async def edit_staff(
+def edit_staff(
     request: Request,
     staff_id: int,
     db: Session = Depends(get_db),
@@ -163,7 +181,7 @@ async def edit_staff(
     return RedirectResponse(url="/staff", status_code=303)
 
 @router.delete("/{staff_id}")
-async def delete_staff(
+def delete_staff(
     staff_id: int,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
@@ -181,7 +199,7 @@ async def delete_staff(
     return {"status": "success", "message": "Staff deleted successfully"}
 
 @router.post("/{staff_id}/toggle-active")
-async def toggle_staff_active(
+def toggle_staff_active(
     staff_id: int,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
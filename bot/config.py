@@ -12,6 +12,8 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+# Share state (e.g. API tokens) between worker processes through Redis
+USE_REDIS = os.getenv("USE_REDIS", "false").lower() == "true"
 
 # Database configuration
 # Get standard DATABASE_URL from environment and convert to async-compatible format if needed
@@ -29,6 +31,15 @@ if raw_db_url and raw_db_url.startswith("postgresql"):
 else:
     ASYNC_DB_URL = raw_db_url
 
+# Connection pool of this process, shared by everything in it (see bot.engine).
+# Set them per process: the bot, the Flask admin and the FastAPI admin each get their own pool.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 300))  # Seconds before a connection is replaced
+# Log every SQL statement
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
 # Bitrix24 API configuration
 BITRIX24_WEBHOOK_URL = os.getenv("BITRIX24_WEBHOOK_URL")
 
@@ -36,6 +47,18 @@ BITRIX24_WEBHOOK_URL = os.getenv("BITRIX24_WEBHOOK_URL")
 ZOOM_CLIENT_ID = os.getenv("ZOOM_CLIENT_ID")
 ZOOM_CLIENT_SECRET = os.getenv("ZOOM_CLIENT_SECRET")
 ZOOM_ACCOUNT_EMAIL = os.getenv("ZOOM_ACCOUNT_EMAIL")
+# Renew the Zoom access token this many seconds before it expires
+ZOOM_TOKEN_REFRESH_MARGIN = int(os.getenv("ZOOM_TOKEN_REFRESH_MARGIN", 300))
+# Number of pre-created Zoom meetings kept per staff member (0 disables the pool)
+ZOOM_MEETING_POOL_SIZE = int(os.getenv("ZOOM_MEETING_POOL_SIZE", 0))
+# Patch the start time of a claimed meeting in the background instead of inline
+ZOOM_POOL_DEFER_PATCH = os.getenv("ZOOM_POOL_DEFER_PATCH", "false").lower() == "true"
+
+# Circuit breaker and timeouts for external APIs (Zoom, Bitrix24, SMTP)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))  # Failures before opening
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))  # Seconds before a trial call
+EXTERNAL_TIMEOUT_MIN = float(os.getenv("EXTERNAL_TIMEOUT_MIN", 2))  # Seconds
+EXTERNAL_TIMEOUT_MAX = float(os.getenv("EXTERNAL_TIMEOUT_MAX", 15))  # Seconds
 
 # Click UZ payment provider tokens (from Telegram BotFather)
 CLICK_LIVE_TOKEN = os.getenv("CLICK_LIVE_TOKEN", "333605228:LIVE:18486_1A5B4FF440980100E5F5C1D745DFCB165C5E2A37")
@@ -43,6 +66,26 @@ CLICK_TEST_TOKEN = os.getenv("CLICK_TEST_TOKEN", "398062629:TEST:999999999_F91D8
 # Use test token by default in development
 PAYMENT_PROVIDER_TOKEN = CLICK_TEST_TOKEN
 
+# Bookings still awaiting payment after this many minutes are released
+PAYMENT_PENDING_TIMEOUT = int(os.getenv("PAYMENT_PENDING_TIMEOUT", 30))
+PAYMENT_RECONCILE_INTERVAL = int(os.getenv("PAYMENT_RECONCILE_INTERVAL", 120))  # Seconds between runs
+PAYMENT_RECONCILE_BATCH_SIZE = int(os.getenv("PAYMENT_RECONCILE_BATCH_SIZE", 200))
+# Post-payment work (Zoom, Bitrix24, notifications) claimed this many minutes ago but not finished is retried
+PAYMENT_FULFILLMENT_TIMEOUT = int(os.getenv("PAYMENT_FULFILLMENT_TIMEOUT", 10))
+
+# Confirmed bookings are marked completed this many minutes after they end (start plus duration)
+BOOKING_COMPLETE_AFTER = int(os.getenv("BOOKING_COMPLETE_AFTER", 30))
+BOOKING_COMPLETE_INTERVAL = int(os.getenv("BOOKING_COMPLETE_INTERVAL", 600))  # Seconds between runs
+BOOKING_COMPLETE_BATCH_SIZE = int(os.getenv("BOOKING_COMPLETE_BATCH_SIZE", 500))
+
+# Completed and cancelled bookings older than this many months are moved to bookings_archive
+BOOKING_ARCHIVE_AFTER_MONTHS = int(os.getenv("BOOKING_ARCHIVE_AFTER_MONTHS", 6))
+
+# Staff report rollups (bot.utils.reports) are refreshed for changed days this often
+REPORT_REFRESH_INTERVAL = int(os.getenv("REPORT_REFRESH_INTERVAL", 60))  # Seconds between runs
+REPORT_REFRESH_BATCH_SIZE = int(os.getenv("REPORT_REFRESH_BATCH_SIZE", 500))  # Changed days per transaction
+REPORT_BACKFILL_CHUNK_DAYS = int(os.getenv("REPORT_BACKFILL_CHUNK_DAYS", 31))  # Days of history per transaction
+
 # Admin IDs (comma-separated list of Telegram user IDs)
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
 
@@ -2,18 +2,20 @@
 Database setup and models for the Telegram bot.
 """
 import enum
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Text, ForeignKey, func, select
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Enum, Text, ForeignKey, Index, event, func, inspect, select, update, delete, insert, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, joinedload
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 # For the migration to aiogram 3.x, we'll use synchronous SQLAlchemy
-from sqlalchemy import create_engine  
 from sqlalchemy.orm import Session
 USING_ASYNC = False  # Force synchronous mode due to issues with asyncpg and sslmode
 
 from bot.config import DB_URL
+from bot.engine import get_engine
 
-# Base class for SQLAlchemy models
+# Base class for SQLAlchemy models, shared by the bot and both admin panels
 Base = declarative_base()
 
 # Set up global variables for session management
@@ -25,8 +27,8 @@ sync_session_factory = None
 # Using async with psycopg2 is causing issues, so we'll use the synchronous approach
 # until the migration is complete
 try:
-    # Use synchronous engine
-    engine = create_engine(DB_URL, echo=True)
+    # Use the process-wide synchronous engine
+    engine = get_engine(DB_URL)
     sync_session_factory = sessionmaker(engine, expire_on_commit=False)
     USING_ASYNC = False
 except Exception as e:
@@ -79,7 +81,7 @@ class Staff(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
-    schedules = relationship("StaffSchedule", back_populates="staff")
+    schedules = relationship("StaffSchedule", back_populates="staff", cascade="all, delete-orphan")
     bookings = relationship("Booking", back_populates="staff")
 
     def __repr__(self):
@@ -99,6 +101,11 @@ class StaffSchedule(Base):
 
     staff = relationship("Staff", back_populates="schedules")
 
+    __table_args__ = (
+        # One row per staff member and weekday, also the conflict target of staff_schedule_upsert
+        Index('uq_staff_schedules_staff_id_weekday', 'staff_id', 'weekday', unique=True),
+    )
+
     def __repr__(self):
         return f"<StaffSchedule(staff_id={self.staff_id}, weekday={self.weekday}, {self.start_time}-{self.end_time})>"
 
@@ -129,16 +136,364 @@ class Booking(Base):
     bitrix_event_id = Column(String(100))
     invoice_payload = Column(String(255))  # Telegram payment invoice payload
     invoice_url = Column(String(512))  # Telegram payment invoice URL for web browser payments
+    invoice_amount = Column(Integer)  # Amount the stored invoice URL was created for
+    invoice_expires_at = Column(DateTime)  # When the stored invoice URL should be replaced
+    payment_started_at = Column(DateTime)  # When the invoice was sent or last approved at pre-checkout
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
     user = relationship("User", back_populates="bookings")
     staff = relationship("Staff", back_populates="bookings")
 
+    __table_args__ = (
+        # Used by the reconciler to find bookings stuck waiting for payment
+        Index('ix_bookings_status_payment_started_at', 'status', 'payment_started_at'),
+        # Upcoming bookings by status (reminders, completion job) and counts by status (stats)
+        Index('ix_bookings_status_booking_date', 'status', 'booking_date'),
+        # Admin booking lists, newest first, paginated by (booking_date, id)
+        Index('ix_bookings_booking_date_id', 'booking_date', 'id'),
+        # Admin booking list filtered by staff and date
+        Index('ix_bookings_staff_id_booking_date_status', 'staff_id', 'booking_date', 'status'),
+        # A user's bookings (my_bookings)
+        Index('ix_bookings_user_id_booking_date', 'user_id', 'booking_date'),
+        # Latest change, part of the recent bookings cache key (bot.utils.recent_bookings)
+        Index('ix_bookings_updated_at', 'updated_at'),
+    )
+
     def __repr__(self):
         return f"<Booking(id={self.id}, user_id={self.user_id}, staff_id={self.staff_id}, date={self.booking_date})>"
 
 
+# Bookings that occupy a slot, filtered by staff and date in the calendar and time slot keyboards.
+# The predicate must match the queries' status filter for the planner to use it.
+ACTIVE_BOOKING_STATUSES = [BookingStatus.CONFIRMED, BookingStatus.PAYMENT_PENDING]
+Index(
+    'ix_bookings_active_staff_id_booking_date',
+    Booking.staff_id, Booking.booking_date,
+    postgresql_where=Booking.status.in_(ACTIVE_BOOKING_STATUSES),
+    sqlite_where=Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+)
+
+
+class BookingArchive(Base):
+    """
+    Finished bookings moved out of the bookings table.
+    On PostgreSQL the table is partitioned by month of booking_date, so
+    date-bounded queries only touch the matching partitions.
+    """
+    __tablename__ = 'bookings_archive'
+
+    # booking_date is part of the key because PostgreSQL requires the partition key in it
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    booking_date = Column(DateTime, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    staff_id = Column(Integer, nullable=False)
+    duration_minutes = Column(Integer)
+    status = Column(Enum(BookingStatus))
+    price = Column(Integer)
+    payment_id = Column(String(100))
+    zoom_meeting_id = Column(String(100))
+    zoom_join_url = Column(String(255))
+    bitrix_event_id = Column(String(100))
+    invoice_payload = Column(String(255))
+    invoice_url = Column(String(512))
+    invoice_amount = Column(Integer)
+    invoice_expires_at = Column(DateTime)
+    payment_started_at = Column(DateTime)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_bookings_archive_staff_id_booking_date', 'staff_id', 'booking_date'),
+        Index('ix_bookings_archive_user_id_booking_date', 'user_id', 'booking_date'),
+        {'postgresql_partition_by': 'RANGE (booking_date)'},
+    )
+
+    def __repr__(self):
+        return f"<BookingArchive(id={self.id}, staff_id={self.staff_id}, date={self.booking_date})>"
+
+
+class PaymentLedger(Base):
+    """Ledger of processed Telegram payments, used to ignore redelivered updates"""
+    __tablename__ = 'payment_ledger'
+
+    id = Column(Integer, primary_key=True)
+    telegram_payment_charge_id = Column(String(255), unique=True, nullable=False)
+    booking_id = Column(Integer, ForeignKey('bookings.id'), nullable=False, index=True)
+    total_amount = Column(Integer)
+    currency = Column(String(3))
+    fulfillment_claimed_at = Column(DateTime)  # Set when a worker starts the Zoom, Bitrix24 and notification work
+    fulfilled_at = Column(DateTime)  # Set once that work has finished
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<PaymentLedger(charge_id={self.telegram_payment_charge_id}, booking_id={self.booking_id})>"
+
+
+class PaymentLedgerArchive(Base):
+    """
+    Payment ledger entries of archived bookings.
+    Kept for refunds, disputes and accounting; booking_id refers to bookings_archive.
+    """
+    __tablename__ = 'payment_ledger_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    telegram_payment_charge_id = Column(String(255), unique=True, nullable=False)
+    booking_id = Column(Integer, nullable=False, index=True)
+    total_amount = Column(Integer)
+    currency = Column(String(3))
+    fulfillment_claimed_at = Column(DateTime)
+    fulfilled_at = Column(DateTime)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<PaymentLedgerArchive(charge_id={self.telegram_payment_charge_id}, booking_id={self.booking_id})>"
+
+
+class ZoomMeetingPool(Base):
+    """Pre-created Zoom meetings waiting to be claimed by a booking"""
+    __tablename__ = 'zoom_meeting_pool'
+
+    id = Column(Integer, primary_key=True)
+    staff_id = Column(Integer, ForeignKey('staff.id'), nullable=False, index=True)
+    meeting_id = Column(String(100), nullable=False)
+    join_url = Column(String(255))
+    start_url = Column(Text)
+    password = Column(String(50))
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<ZoomMeetingPool(staff_id={self.staff_id}, meeting_id={self.meeting_id})>"
+
+
+# Tables whose changes are counted in table_versions, for HTTP caching of the pages built from them
+VERSIONED_TABLES = frozenset({'staff', 'staff_schedules'})
+
+
+class TableVersion(Base):
+    """Change counter of a table, bumped in every transaction that writes to it"""
+    __tablename__ = 'table_versions'
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)  # UTC
+
+    def __repr__(self):
+        return f"<TableVersion(table_name={self.table_name}, version={self.version})>"
+
+
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, the clock of the change tracking tables."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def table_version_bump(tables, dialect_name: str):
+    """
+    Build a single INSERT ... ON CONFLICT (table_name) DO UPDATE that
+    increments the change counter of each table.
+    
+    Args:
+        tables: Names of the changed tables
+        dialect_name: "postgresql" or "sqlite"
+    """
+    now = utc_now()
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(TableVersion).values(
+        [{"table_name": table, "version": 1, "updated_at": now} for table in sorted(tables)]
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={"version": TableVersion.version + 1, "updated_at": statement.excluded.updated_at}
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_changes(session, flush_context):
+    """Bump the versions of the tables changed by a flush, in the same transaction."""
+    changed = {type(obj).__table__.name for obj in session.new}
+    changed.update(type(obj).__table__.name for obj in session.deleted)
+    changed.update(type(obj).__table__.name for obj in session.dirty if session.is_modified(obj))
+    changed &= VERSIONED_TABLES
+    if changed:
+        connection = session.connection()
+        connection.execute(table_version_bump(changed, connection.dialect.name))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_statement_changes(orm_execute_state):
+    """Bump the version of a table written by an INSERT/UPDATE/DELETE statement (e.g. an upsert)."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if getattr(table, "name", None) in VERSIONED_TABLES:
+        connection = orm_execute_state.session.connection()
+        connection.execute(table_version_bump([table.name], connection.dialect.name))
+
+
+
+class StaffDailyStats(Base):
+    """
+    Daily rollup of a staff member's bookings, by booking date.
+    Kept up to date by bot.utils.reports, the admin reports only read this table.
+    """
+    __tablename__ = 'staff_daily_stats'
+
+    staff_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bookings = Column(Integer, nullable=False, default=0)  # Any status
+    pending = Column(Integer, nullable=False, default=0)  # Pending or awaiting payment
+    confirmed = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    booked_minutes = Column(Integer, nullable=False, default=0)  # Confirmed and completed
+    revenue = Column(Integer, nullable=False, default=0)  # Confirmed and completed, smallest currency unit
+    updated_at = Column(DateTime, nullable=False)  # UTC
+
+    __table_args__ = (
+        # Reports cover every staff member over a date range
+        Index('ix_staff_daily_stats_day', 'day'),
+    )
+
+    def __repr__(self):
+        return f"<StaffDailyStats(staff_id={self.staff_id}, day={self.day}, bookings={self.bookings})>"
+
+
+class ReportDirtyDay(Base):
+    """A staff member's day whose rollup must be recomputed, queued by the transaction that changed it"""
+    __tablename__ = 'report_dirty_days'
+
+    staff_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    marked_at = Column(DateTime, nullable=False)  # UTC
+
+
+# Booking columns the rollups are computed from
+REPORT_COLUMNS = ('staff_id', 'booking_date', 'status', 'price', 'duration_minutes')
+
+
+def report_dirty_days_upsert(keys, dialect_name: str):
+    """
+    Build a single INSERT ... ON CONFLICT (staff_id, day) DO UPDATE queueing days for a rollup refresh.
+    
+    Args:
+        keys: (staff_id, day) pairs
+        dialect_name: "postgresql" or "sqlite"
+    """
+    now = utc_now()
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(ReportDirtyDay).values(
+        [{"staff_id": staff_id, "day": day, "marked_at": now} for staff_id, day in sorted(keys)]
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[ReportDirtyDay.staff_id, ReportDirtyDay.day],
+        set_={"marked_at": statement.excluded.marked_at}
+    )
+
+
+def staff_daily_stats_upsert(rows, dialect_name: str):
+    """
+    Build a single INSERT ... ON CONFLICT (staff_id, day) DO UPDATE for rollup rows,
+    so a refresh and a backfill of the same day can't collide.
+    
+    Args:
+        rows: Dicts with staff_id, day, updated_at and every counter column
+        dialect_name: "postgresql" or "sqlite"
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(StaffDailyStats).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=[StaffDailyStats.staff_id, StaffDailyStats.day],
+        set_={
+            column.name: statement.excluded[column.name]
+            for column in StaffDailyStats.__table__.columns
+            if column.name not in ("staff_id", "day")
+        }
+    )
+
+def _mark_report_days(connection, bookings):
+    """Queue the (staff_id, booking_date) pairs' days in the current transaction."""
+    keys = {
+        (staff_id, booking_date.date())
+        for staff_id, booking_date in bookings
+        if staff_id is not None and booking_date is not None
+    }
+    if keys:
+        connection.execute(report_dirty_days_upsert(keys, connection.dialect.name))
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed_booking_days(session, flush_context):
+    """Queue the report days of bookings added, deleted or changed by a flush."""
+    bookings = []
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            bookings.append((obj.staff_id, obj.booking_date))
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            # Read without loading, the row is already gone
+            loaded = inspect(obj).dict
+            bookings.append((loaded.get('staff_id'), loaded.get('booking_date')))
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[column].history.has_changes() for column in REPORT_COLUMNS):
+            continue
+        bookings.append((obj.staff_id, obj.booking_date))
+        # A moved booking also leaves its old day
+        old_staff_ids = attrs.staff_id.history.deleted or [obj.staff_id]
+        old_dates = attrs.booking_date.history.deleted or [obj.booking_date]
+        bookings.append((old_staff_ids[0], old_dates[0]))
+    if bookings:
+        _mark_report_days(session.connection(), bookings)
+
+
+# Execution option for booking statements that can't change a rollup, e.g. moving
+# a booking between pending and payment pending (both count as pending)
+REPORT_DAYS_UNCHANGED = "report_days_unchanged"
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_booking_days(orm_execute_state):
+    """
+    Queue the report days of the bookings an UPDATE or DELETE statement changes.
+    
+    Statements with the REPORT_DAYS_UNCHANGED option are skipped. An UPDATE
+    returning staff_id and booking_date is marked from its own rows, so it
+    must not move bookings (the old day wouldn't be queued); any other
+    statement looks its bookings up first.
+    """
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    statement = orm_execute_state.statement
+    if getattr(getattr(statement, "table", None), "name", None) != Booking.__tablename__:
+        return
+    if orm_execute_state.execution_options.get(REPORT_DAYS_UNCHANGED):
+        return
+    
+    connection = orm_execute_state.session.connection()
+    returned = [column["name"] for column in getattr(statement, "returning_column_descriptions", ())]
+    if orm_execute_state.is_update and "staff_id" in returned and "booking_date" in returned:
+        result = orm_execute_state.invoke_statement().freeze()
+        rows = result().all()
+        staff_index, date_index = returned.index("staff_id"), returned.index("booking_date")
+        _mark_report_days(connection, [(row[staff_index], row[date_index]) for row in rows])
+        return result()
+    
+    if statement.whereclause is not None:
+        condition = statement.whereclause
+    else:
+        # Bulk update by primary key: session.execute(update(Booking), [{"id": ..., ...}])
+        parameters = orm_execute_state.parameters
+        booking_ids = [row["id"] for row in parameters if "id" in row] if isinstance(parameters, list) else []
+        if not booking_ids:
+            return
+        condition = Booking.id.in_(booking_ids)
+    
+    _mark_report_days(connection, connection.execute(select(Booking.staff_id, Booking.booking_date).where(condition)).all())
+
 async def init_db():
     """Initialize the database, creating tables if they don't exist"""
     try:
@@ -282,6 +637,26 @@ async def get_staff_schedule_async(staff_id: int):
     return get_staff_schedule(staff_id)
 
 
+def staff_schedule_upsert(schedules: list, dialect_name: str):
+    """
+    Build a single INSERT ... ON CONFLICT (staff_id, weekday) DO UPDATE for schedule rows.
+    
+    Args:
+        schedules: Dicts with staff_id, weekday, start_time, end_time and is_working_day
+        dialect_name: "postgresql" or "sqlite"
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(StaffSchedule).values(schedules)
+    return statement.on_conflict_do_update(
+        index_elements=[StaffSchedule.staff_id, StaffSchedule.weekday],
+        set_={
+            "start_time": statement.excluded.start_time,
+            "end_time": statement.excluded.end_time,
+            "is_working_day": statement.excluded.is_working_day
+        }
+    )
+
+
 def create_booking(user_id: int, staff_id: int, booking_date: datetime, duration_minutes: int = 30, price: int = 0):
     """Create a new booking (synchronous version)"""
     with sync_session() as session:
@@ -319,9 +694,13 @@ def get_user_bookings(telegram_id: int):
 
 
 def get_booking_by_id(booking_id: int):
-    """Get booking by ID (synchronous version)"""
+    """Get booking by ID, with its user and staff loaded (synchronous version)"""
     with sync_session() as session:
-        query = select(Booking).where(Booking.id == booking_id)
+        query = (
+            select(Booking)
+            .options(joinedload(Booking.user), joinedload(Booking.staff))
+            .where(Booking.id == booking_id)
+        )
         result = session.execute(query)
         return result.scalar_one_or_none()
         
@@ -352,12 +731,44 @@ def update_booking_payment_pending(booking_id: int, invoice_payload: str):
         if booking:
             booking.status = BookingStatus.PAYMENT_PENDING
             booking.invoice_payload = invoice_payload
+            booking.payment_started_at = datetime.now()
             session.commit()
             return True
         
         return False
 
 
+def mark_booking_payment_pending(booking_id: int, invoice_payload: str):
+    """
+    Move a booking to payment pending in one conditional UPDATE (synchronous version).
+    Only bookings that are still pending or awaiting payment are updated.
+    Restarts the payment timeout, so the reconciler doesn't release a booking
+    between pre-checkout approval and the successful payment.
+    
+    Returns:
+        The booking price if the booking was updated, None otherwise
+    """
+    with sync_session() as session:
+        query = (
+            update(Booking)
+            .where(
+                Booking.id == booking_id,
+                Booking.status.in_([BookingStatus.PENDING, BookingStatus.PAYMENT_PENDING])
+            )
+            .values(
+                status=BookingStatus.PAYMENT_PENDING,
+                invoice_payload=invoice_payload,
+                payment_started_at=datetime.now()
+            )
+            .returning(Booking.price)
+            # Pending and payment pending share a rollup counter
+            .execution_options(**{REPORT_DAYS_UNCHANGED: True})
+        )
+        price = session.execute(query).scalar_one_or_none()
+        session.commit()
+        return price
+
+
 def update_booking_payment_completed(booking_id: int, payment_id: str):
     """Update booking after successful payment (synchronous version)"""
     with sync_session() as session:
@@ -395,6 +806,11 @@ async def update_booking_payment_pending_async(booking_id: int, invoice_payload:
     return update_booking_payment_pending(booking_id, invoice_payload)
     
     
+async def mark_booking_payment_pending_async(booking_id: int, invoice_payload: str):
+    """Async wrapper for mark_booking_payment_pending"""
+    return mark_booking_payment_pending(booking_id, invoice_payload)
+    
+    
 async def update_booking_payment_completed_async(booking_id: int, payment_id: str):
     """Async wrapper for update_booking_payment_completed"""
     return update_booking_payment_completed(booking_id, payment_id)
@@ -422,4 +838,469 @@ def update_booking_status(booking_id: int, status: BookingStatus):
 
 async def update_booking_status_async(booking_id: int, status: BookingStatus):
     """Async wrapper for update_booking_status"""
-    return update_booking_status(booking_id, status)
\ No newline at end of file
+    return update_booking_status(booking_id, status)
+
+
+def count_pooled_zoom_meetings(staff_id: int) -> int:
+    """Count pre-created Zoom meetings available for a staff member (synchronous version)"""
+    with sync_session() as session:
+        query = select(func.count(ZoomMeetingPool.id)).where(ZoomMeetingPool.staff_id == staff_id)
+        return session.execute(query).scalar_one()
+
+
+def add_pooled_zoom_meeting(staff_id: int, meeting: dict):
+    """Store a pre-created Zoom meeting in the pool (synchronous version)"""
+    with sync_session() as session:
+        pooled = ZoomMeetingPool(
+            staff_id=staff_id,
+            meeting_id=str(meeting.get("id")),
+            join_url=meeting.get("join_url"),
+            start_url=meeting.get("start_url"),
+            password=meeting.get("password")
+        )
+        session.add(pooled)
+        session.commit()
+        return True
+
+
+def claim_pooled_zoom_meeting(staff_id: int):
+    """
+    Take one pre-created Zoom meeting out of the pool (synchronous version).
+    The row is locked and deleted in one transaction so a meeting is never handed out twice.
+    """
+    with sync_session() as session:
+        query = (
+            select(ZoomMeetingPool)
+            .where(ZoomMeetingPool.staff_id == staff_id)
+            .order_by(ZoomMeetingPool.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        result = session.execute(query)
+        pooled = result.scalar_one_or_none()
+        
+        if not pooled:
+            return None
+        
+        meeting = {
+            "id": pooled.meeting_id,
+            "join_url": pooled.join_url,
+            "start_url": pooled.start_url,
+            "password": pooled.password
+        }
+        session.delete(pooled)
+        session.commit()
+        return meeting
+
+
+# Async wrappers for backward compatibility
+async def count_pooled_zoom_meetings_async(staff_id: int) -> int:
+    """Async wrapper for count_pooled_zoom_meetings"""
+    return count_pooled_zoom_meetings(staff_id)
+
+
+async def add_pooled_zoom_meeting_async(staff_id: int, meeting: dict):
+    """Async wrapper for add_pooled_zoom_meeting"""
+    return add_pooled_zoom_meeting(staff_id, meeting)
+
+
+async def claim_pooled_zoom_meeting_async(staff_id: int):
+    """Async wrapper for claim_pooled_zoom_meeting"""
+    return claim_pooled_zoom_meeting(staff_id)
+
+
+def get_bookings_missing_bitrix_event(after_id: int = 0, limit: int = 500):
+    """
+    Get confirmed bookings without a Bitrix24 event, ordered by ID (synchronous version).
+    User and staff are loaded eagerly so the result can be used outside the session.
+    """
+    with sync_session() as session:
+        query = (
+            select(Booking)
+            .join(Staff)
+            .options(selectinload(Booking.user), selectinload(Booking.staff))
+            .where(
+                Booking.id > after_id,
+                Booking.status == BookingStatus.CONFIRMED,
+                Booking.bitrix_event_id.is_(None),
+                Staff.bitrix_user_id.isnot(None)
+            )
+            .order_by(Booking.id)
+            .limit(limit)
+        )
+        result = session.execute(query)
+        return result.scalars().all()
+
+
+def set_booking_bitrix_event_ids(event_ids: dict):
+    """Store Bitrix24 event IDs for several bookings at once (synchronous version)"""
+    if not event_ids:
+        return 0
+    
+    with sync_session() as session:
+        session.execute(
+            update(Booking).execution_options(**{REPORT_DAYS_UNCHANGED: True}),
+            [{"id": booking_id, "bitrix_event_id": event_id} for booking_id, event_id in event_ids.items()]
+        )
+        session.commit()
+        return len(event_ids)
+
+
+def record_payment(telegram_payment_charge_id: str, booking_id: int, total_amount: int = None, currency: str = None):
+    """
+    Add a payment to the ledger and confirm its booking in one transaction (synchronous version).
+    The unique charge ID makes a redelivered payment a no-op. Because the ledger
+    row only commits together with the confirmation, a payment whose processing
+    failed isn't in the ledger and is processed again when Telegram redelivers it.
+    
+    Returns:
+        The booking status before the payment, or None if the payment was
+        already recorded or the booking doesn't exist
+    """
+    with sync_session() as session:
+        booking = session.execute(
+            select(Booking).where(Booking.id == booking_id).with_for_update()
+        ).scalar_one_or_none()
+        if not booking:
+            return None
+        
+        session.add(PaymentLedger(
+            telegram_payment_charge_id=telegram_payment_charge_id,
+            booking_id=booking_id,
+            total_amount=total_amount,
+            currency=currency
+        ))
+        try:
+            session.flush()
+        except IntegrityError:
+            session.rollback()
+            return None
+        
+        old_status = booking.status
+        booking.status = BookingStatus.CONFIRMED
+        booking.payment_id = telegram_payment_charge_id
+        session.commit()
+        return old_status
+
+
+def claim_payment_fulfillment(booking_id: int, claimed_before: datetime = None) -> bool:
+    """
+    Claim the post-payment work (Zoom, Bitrix24, notifications) for a booking (synchronous version).
+    Only one caller can claim a recorded payment. The claim is released by
+    `complete_payment_fulfillment`; a claim older than `claimed_before` is
+    taken to be abandoned (e.g. the bot stopped mid-way) and can be claimed again.
+    
+    Returns:
+        True if the caller should do the work, False otherwise
+    """
+    unclaimed = PaymentLedger.fulfillment_claimed_at.is_(None)
+    if claimed_before is not None:
+        unclaimed = unclaimed | (PaymentLedger.fulfillment_claimed_at < claimed_before)
+    
+    with sync_session() as session:
+        result = session.execute(
+            update(PaymentLedger)
+            .where(PaymentLedger.booking_id == booking_id, PaymentLedger.fulfilled_at.is_(None), unclaimed)
+            .values(fulfillment_claimed_at=datetime.now())
+        )
+        session.commit()
+        return result.rowcount > 0
+
+
+def complete_payment_fulfillment(booking_id: int) -> bool:
+    """Mark the post-payment work of a booking as finished (synchronous version)"""
+    with sync_session() as session:
+        result = session.execute(
+            update(PaymentLedger)
+            .where(PaymentLedger.booking_id == booking_id, PaymentLedger.fulfilled_at.is_(None))
+            .values(fulfilled_at=datetime.now())
+        )
+        session.commit()
+        return result.rowcount > 0
+
+
+def get_unfulfilled_paid_bookings(claimed_before: datetime, limit: int = 200):
+    """
+    Get upcoming confirmed bookings whose post-payment work was never claimed
+    or was left unfinished before `claimed_before` (synchronous version).
+    Past appointments need no meeting or calendar event anymore.
+    """
+    with sync_session() as session:
+        query = (
+            select(PaymentLedger.booking_id)
+            .join(Booking, Booking.id == PaymentLedger.booking_id)
+            .where(
+                PaymentLedger.fulfilled_at.is_(None),
+                PaymentLedger.fulfillment_claimed_at.is_(None)
+                | (PaymentLedger.fulfillment_claimed_at < claimed_before),
+                Booking.status == BookingStatus.CONFIRMED,
+                Booking.booking_date > datetime.now()
+            )
+            .order_by(PaymentLedger.id)
+            .limit(limit)
+        )
+        return session.execute(query).scalars().all()
+
+
+# Async wrappers for backward compatibility
+async def record_payment_async(telegram_payment_charge_id: str, booking_id: int, total_amount: int = None, currency: str = None):
+    """Async wrapper for record_payment"""
+    return record_payment(telegram_payment_charge_id, booking_id, total_amount, currency)
+
+
+async def claim_payment_fulfillment_async(booking_id: int, claimed_before: datetime = None) -> bool:
+    """Async wrapper for claim_payment_fulfillment"""
+    return claim_payment_fulfillment(booking_id, claimed_before)
+
+
+async def complete_payment_fulfillment_async(booking_id: int) -> bool:
+    """Async wrapper for complete_payment_fulfillment"""
+    return complete_payment_fulfillment(booking_id)
+
+
+async def get_unfulfilled_paid_bookings_async(claimed_before: datetime, limit: int = 200):
+    """Async wrapper for get_unfulfilled_paid_bookings"""
+    return get_unfulfilled_paid_bookings(claimed_before, limit)
+
+
+def get_stale_payment_pending_bookings(started_before: datetime, limit: int = 200):
+    """
+    Get bookings whose payment was started before a cutoff and is still pending (synchronous version).
+    Oldest first; served by the (status, payment_started_at) index.
+    """
+    with sync_session() as session:
+        query = (
+            select(Booking.id)
+            .where(
+                Booking.status == BookingStatus.PAYMENT_PENDING,
+                Booking.payment_started_at < started_before
+            )
+            .order_by(Booking.payment_started_at, Booking.id)
+            .limit(limit)
+        )
+        return session.execute(query).scalars().all()
+
+
+def resolve_stale_payment_pending_bookings(booking_ids: list):
+    """
+    Settle a batch of stale payment-pending bookings (synchronous version).
+    Bookings with a recorded payment are confirmed, the rest are cancelled to
+    free their slots. Both are conditional UPDATEs, so a booking whose status
+    changed in the meantime is left alone.
+    
+    Returns:
+        Tuple of (confirmed, released) lists of (booking_id, staff_id, booking_date) rows
+    """
+    if not booking_ids:
+        return [], []
+    
+    with sync_session() as session:
+        paid_ids = set(session.execute(
+            select(PaymentLedger.booking_id).where(PaymentLedger.booking_id.in_(booking_ids))
+        ).scalars().all())
+        unpaid_ids = [booking_id for booking_id in booking_ids if booking_id not in paid_ids]
+        returning = (Booking.id, Booking.staff_id, Booking.booking_date)
+        
+        confirmed = []
+        if paid_ids:
+            confirmed = session.execute(
+                update(Booking)
+                .where(Booking.id.in_(paid_ids), Booking.status == BookingStatus.PAYMENT_PENDING)
+                .values(status=BookingStatus.CONFIRMED)
+                .returning(*returning)
+            ).all()
+        
+        released = []
+        if unpaid_ids:
+            released = session.execute(
+                update(Booking)
+                .where(Booking.id.in_(unpaid_ids), Booking.status == BookingStatus.PAYMENT_PENDING)
+                .values(status=BookingStatus.CANCELLED)
+                .returning(*returning)
+            ).all()
+        
+        session.commit()
+        return confirmed, released
+
+
+# Async wrappers for backward compatibility
+async def get_stale_payment_pending_bookings_async(started_before: datetime, limit: int = 200):
+    """Async wrapper for get_stale_payment_pending_bookings"""
+    return get_stale_payment_pending_bookings(started_before, limit)
+
+
+async def resolve_stale_payment_pending_bookings_async(booking_ids: list):
+    """Async wrapper for resolve_stale_payment_pending_bookings"""
+    return resolve_stale_payment_pending_bookings(booking_ids)
+
+
+def set_booking_invoice_link(booking_id: int, invoice_url: str, amount: int, expires_at: datetime):
+    """Store the invoice link created for a booking (synchronous version)"""
+    with sync_session() as session:
+        session.execute(
+            update(Booking)
+            .where(Booking.id == booking_id)
+            .values(invoice_url=invoice_url, invoice_amount=amount, invoice_expires_at=expires_at)
+            .execution_options(**{REPORT_DAYS_UNCHANGED: True})
+        )
+        session.commit()
+        return True
+
+
+# Async wrappers for backward compatibility
+async def set_booking_invoice_link_async(booking_id: int, invoice_url: str, amount: int, expires_at: datetime):
+    """Async wrapper for set_booking_invoice_link"""
+    return set_booking_invoice_link(booking_id, invoice_url, amount, expires_at)
+
+
+def get_confirmed_booking_times_between(start: datetime, end: datetime):
+    """
+    Get (booking_id, booking_date) of confirmed bookings with start < booking_date <= end (synchronous version).
+    A single range scan on the (status, booking_date) index.
+    """
+    with sync_session() as session:
+        query = (
+            select(Booking.id, Booking.booking_date)
+            .where(
+                Booking.status == BookingStatus.CONFIRMED,
+                Booking.booking_date > start,
+                Booking.booking_date <= end
+            )
+            .order_by(Booking.booking_date)
+        )
+        return session.execute(query).all()
+
+
+# Async wrappers for backward compatibility
+async def get_confirmed_booking_times_between_async(start: datetime, end: datetime):
+    """Async wrapper for get_confirmed_booking_times_between"""
+    return get_confirmed_booking_times_between(start, end)
+
+
+def booking_end_time(dialect_name: str):
+    """
+    Build the SQL expression for when a booking ends: booking_date plus
+    duration_minutes (30 if unset).
+    
+    Args:
+        dialect_name: "postgresql" or "sqlite"
+    """
+    minutes = func.coalesce(Booking.duration_minutes, 30)
+    if dialect_name == "postgresql":
+        return Booking.booking_date + func.make_interval(0, 0, 0, 0, 0, minutes)
+    return func.datetime(Booking.booking_date, func.printf("+%d minutes", minutes), type_=DateTime)
+
+
+def complete_past_bookings(ended_before: datetime, limit: int = 500):
+    """
+    Mark one batch of confirmed bookings that ended before a cutoff as completed (synchronous version).
+    A booking ends duration_minutes after booking_date. The end time is checked
+    in the query, so bookings that are still running never fill a batch; the
+    (status, booking_date) index narrows the scan to bookings that started.
+    
+    Returns:
+        List of (booking_id, staff_id, booking_date) rows that were completed
+    """
+    with sync_session() as session:
+        booking_ids = session.execute(
+            select(Booking.id)
+            .where(
+                Booking.status == BookingStatus.CONFIRMED,
+                Booking.booking_date < ended_before,
+                booking_end_time(session.get_bind().dialect.name) <= ended_before
+            )
+            .order_by(Booking.booking_date)
+            .limit(limit)
+        ).scalars().all()
+        
+        if not booking_ids:
+            return []
+        
+        completed = session.execute(
+            update(Booking)
+            .where(Booking.id.in_(booking_ids), Booking.status == BookingStatus.CONFIRMED)
+            .values(status=BookingStatus.COMPLETED)
+            .returning(Booking.id, Booking.staff_id, Booking.booking_date)
+        ).all()
+        session.commit()
+        return completed
+
+
+# Async wrappers for backward compatibility
+async def complete_past_bookings_async(ended_before: datetime, limit: int = 500):
+    """Async wrapper for complete_past_bookings"""
+    return complete_past_bookings(ended_before, limit)
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + (value.month == 12), value.month % 12 + 1, 1)
+
+
+def ensure_archive_partitions(session, first_month: datetime, last_month: datetime):
+    """
+    Create the monthly bookings_archive partitions covering a date range (PostgreSQL only).
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    
+    month = _month_start(first_month)
+    while month <= last_month:
+        next_month = _next_month(month)
+        session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS bookings_archive_{month:%Y_%m} "
+            f"PARTITION OF bookings_archive "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        ))
+        month = next_month
+
+
+def archive_bookings_batch(before: datetime, limit: int = 1000) -> int:
+    """
+    Move one batch of finished bookings older than a cutoff to bookings_archive (synchronous version).
+    Their payment ledger entries move to payment_ledger_archive. Copying the
+    rows and deleting them happens in one transaction.
+    
+    Returns:
+        Number of bookings archived
+    """
+    with sync_session() as session:
+        rows = session.execute(
+            select(Booking.id, Booking.booking_date)
+            .where(
+                Booking.status.in_([BookingStatus.COMPLETED, BookingStatus.CANCELLED]),
+                Booking.booking_date < before
+            )
+            .order_by(Booking.booking_date)
+            .limit(limit)
+        ).all()
+        
+        if not rows:
+            return 0
+        
+        booking_ids = [row.id for row in rows]
+        ensure_archive_partitions(session, rows[0].booking_date, rows[-1].booking_date)
+        
+        columns = [column.name for column in Booking.__table__.columns]
+        session.execute(
+            insert(BookingArchive).from_select(
+                columns,
+                select(*[Booking.__table__.c[name] for name in columns]).where(Booking.id.in_(booking_ids))
+            )
+        )
+        # The ledger references bookings, so its rows move along with them
+        ledger_columns = [column.name for column in PaymentLedger.__table__.columns]
+        session.execute(
+            insert(PaymentLedgerArchive).from_select(
+                ledger_columns,
+                select(*[PaymentLedger.__table__.c[name] for name in ledger_columns])
+                .where(PaymentLedger.booking_id.in_(booking_ids))
+            )
+        )
+        session.execute(delete(PaymentLedger).where(PaymentLedger.booking_id.in_(booking_ids)))
+        session.execute(delete(Booking).where(Booking.id.in_(booking_ids)))
+        session.commit()
+        return len(booking_ids)
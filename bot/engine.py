@@ -0,0 +1,62 @@
+"""
+Shared database engine.
+
+The bot, the Flask admin and the FastAPI admin all use the same tables
+(bot.database). Each process creates one engine per database URL here, so
+everything in the process shares one connection pool sized by the DB_POOL_*
+settings of that process.
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from bot.config import DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_ECHO
+
+logger = logging.getLogger(__name__)
+
+_engines: Dict[str, Engine] = {}
+_lock = threading.Lock()
+
+def engine_options(url: str) -> dict:
+    """
+    Keyword arguments for `create_engine` from this process's pool settings.
+
+    SQLite databases don't get a sized pool, SQLAlchemy picks a suitable one.
+    """
+    options = {"pool_pre_ping": True, "echo": DB_ECHO}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE
+        )
+    return options
+
+def get_engine(url: Optional[str] = None) -> Engine:
+    """
+    Get the process-wide engine for a database, creating it on first use.
+
+    Args:
+        url: Database URL (defaults to DATABASE_URL)
+
+    Returns:
+        The same Engine for every call with the same URL
+    """
+    url = url or DB_URL
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, **engine_options(url))
+            _engines[url] = engine
+            logger.info(f"Created database engine for {engine.url!r}")
+        return engine
+
+def dispose_engines() -> None:
+    """Close the pooled connections of every engine, called when the process shuts down."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
@@ -19,7 +19,7 @@ from bot.database import (
     get_staff_schedule_async, update_user_language_async,
     create_booking_async, get_booking_by_id_async,
     update_booking_payment_pending_async, update_booking_payment_completed_async,
-    cancel_booking_async
+    cancel_booking_async, BookingStatus
 )
 from bot.keyboards.reply import main_menu_keyboard, cancel_keyboard, contact_keyboard
 from bot.keyboards.inline import (
@@ -29,10 +29,9 @@ from bot.keyboards.inline import (
 from bot.middlewares.i18n import _, i18n
 from bot.states.booking import BookingStates
 from bot.utils.calendar import format_date_for_user
-from bot.utils.zoom import create_zoom_meeting
-from bot.utils.bitrix24 import create_bitrix_event
-from bot.utils.payment import generate_payment_link, check_payment_status, create_invoice
-from bot.utils.notify import notify_admin_about_booking
+from bot.utils.payment import check_payment_status, create_invoice, prefetch_invoice_link, get_invoice_link
+from bot.utils import events
+from bot.handlers.users.payment import fulfill_paid_booking, fulfill_paid_booking_once
 
 logger = logging.getLogger(__name__)
 
@@ -592,6 +591,14 @@ async def confirmation_callback(callback: CallbackQuery, state: FSMContext):
             await state.clear()
             return
         
+        events.publish(
+            events.BOOKING_CREATED,
+            booking_id=booking.id,
+            staff_id=staff.id,
+            booking_date=booking.booking_date,
+            status=booking.status
+        )
+        
         # Answer callback
         await callback.answer()
         
@@ -606,91 +613,25 @@ async def confirmation_callback(callback: CallbackQuery, state: FSMContext):
             # Set state to payment
             await state.set_state(BookingStates.payment)
             
-            # Show payment instructions
-            payment_text = _(
-                "<b>Payment Required</b>\n\n"
-                "Your booking has been created, but payment is required to confirm it."
-            )
-            
-            await callback.message.edit_text(
-                payment_text,
-                parse_mode="HTML"
-            )
-            
-            # Get bot instance directly from the callback
-            current_bot = callback.bot
-            
-            # Send payment invoice
-            payment_description = _("Appointment with {staff_name} on {date}").format(
-                staff_name=staff.name,
-                date=booking.booking_date.strftime("%Y-%m-%d %H:%M")
-            )
-            
-            try:
-                # Send the invoice directly
-                await create_invoice(
-                    bot=current_bot,
-                    chat_id=callback.from_user.id,
-                    booking_id=booking.id,
-                    amount=staff.price,
-                    description=payment_description,
-                    title=_("Appointment Booking")
-                )
-                
-                # Also provide a backup method to check payment status
-                await callback.message.answer(
-                    _("If you close this payment dialog, you can check your payment status using this button:"),
-                    reply_markup={
-                        "inline_keyboard": [[{
-                            "text": _("Check Payment Status"),
-                            "callback_data": f"check_payment:{booking.id}"
-                        }]]
-                    }
-                )
-            except Exception as e:
-                logger.exception(f"Failed to create invoice: {e}")
-                
-                # Fallback to old payment method
-                payment_link = generate_payment_link(booking.id, staff.price, f"Appointment with {staff.name}")
-                
-                await callback.message.answer(
-                    _("Unable to create payment invoice. Please contact support or try again later."),
-                    reply_markup={
-                        "inline_keyboard": [[{
-                            "text": _("Check Payment Status"),
-                            "callback_data": f"check_payment:{booking.id}"
-                        }]]
-                    }
-                )
+            await send_payment_request(callback, booking, staff)
         else:
             # No payment required, confirm booking directly
-            # Create Zoom meeting
-            zoom_meeting_id, zoom_join_url = await create_zoom_meeting(
-                topic=f"Appointment with {staff.name}",
-                start_time=booking_datetime,
-                duration_minutes=30,
-                email=user.email  # Assuming user has email
-            )
-            
-            # Create Bitrix24 event
-            bitrix_event_id = await create_bitrix_event(
-                title=f"Appointment with {user.first_name}",
-                description=f"Telegram user: @{user.username}",
-                start_time=booking_datetime,
-                duration_minutes=30,
-                responsible_id=staff.bitrix_user_id
-            )
-            
-            # Update booking to confirmed
-            # In a real application, you would update the booking with Zoom and Bitrix24 information
-            # For this example, we'll just complete the booking
             await update_booking_payment_completed_async(
                 booking_id=booking.id,
                 payment_id="free"
             )
+            events.publish(
+                events.BOOKING_STATUS_CHANGED,
+                booking_id=booking.id,
+                old_status=BookingStatus.PENDING,
+                new_status=BookingStatus.CONFIRMED
+            )
             
-            # Notify admin about new booking
-            await notify_admin_about_booking(booking)
+            # Zoom meeting, Bitrix24 event and admin notification, stored like a paid booking's.
+            # Nobody else can confirm a free booking, so there is no fulfillment to claim.
+            confirmed = await get_booking_by_id_async(booking.id)
+            if confirmed:
+                await fulfill_paid_booking(confirmed)
             
             # Send confirmation message
             confirmation_text = _(
@@ -717,6 +658,74 @@ async def confirmation_callback(callback: CallbackQuery, state: FSMContext):
     elif action == "cancel":
         await cancel_booking_callback(callback, state)
 
+async def send_payment_request(callback: CallbackQuery, booking, staff) -> None:
+    """
+    Show payment instructions for a booking with a button to pay.
+    
+    The invoice link is stored on the booking, so showing it again (e.g. on
+    retry) costs no Bot API call. If no link can be created, the invoice is
+    sent as a message instead.
+    """
+    payment_description = _("Appointment with {staff_name} on {date}").format(
+        staff_name=staff.name,
+        date=booking.booking_date.strftime("%Y-%m-%d %H:%M")
+    )
+    title = _("Appointment Booking")
+    
+    # Start creating the link while the instructions are being shown
+    prefetch_invoice_link(callback.bot, booking, staff.price, payment_description, title)
+    
+    # Show payment instructions
+    payment_text = _(
+        "<b>Payment Required</b>\n\n"
+        "Your booking has been created, but payment is required to confirm it."
+    )
+    
+    await callback.message.edit_text(
+        payment_text,
+        parse_mode="HTML"
+    )
+    
+    check_status_button = {
+        "text": _("Check Payment Status"),
+        "callback_data": f"check_payment:{booking.id}"
+    }
+    
+    invoice_link = await get_invoice_link(callback.bot, booking, staff.price, payment_description, title)
+    if invoice_link:
+        await callback.message.answer(
+            _("Tap the button below to pay. If you close the payment dialog, you can check your payment status using the second button:"),
+            reply_markup={
+                "inline_keyboard": [
+                    [{"text": _("Pay"), "url": invoice_link}],
+                    [check_status_button]
+                ]
+            }
+        )
+        return
+    
+    # Fall back to sending the invoice directly
+    invoice = await create_invoice(
+        bot=callback.bot,
+        chat_id=callback.from_user.id,
+        booking_id=booking.id,
+        amount=staff.price,
+        description=payment_description,
+        title=title
+    )
+    
+    if invoice:
+        # Also provide a backup method to check payment status
+        await callback.message.answer(
+            _("If you close this payment dialog, you can check your payment status using this button:"),
+            reply_markup={"inline_keyboard": [[check_status_button]]}
+        )
+    else:
+        await callback.message.answer(
+            _("Unable to create payment invoice. Please contact support or try again later."),
+            reply_markup={"inline_keyboard": [[check_status_button]]}
+        )
+
 async def check_payment_status_callback(callback: CallbackQuery, state: FSMContext):
     """
     Check payment status for a booking.
@@ -746,37 +755,14 @@ async def check_payment_status_callback(callback: CallbackQuery, state: FSMConte
     i18n.current_locale = language
     
     # Check payment status
-    payment_status = await check_payment_status(booking.payment_id)
+    payment_status = await check_payment_status(booking.id)
     
     if payment_status == "paid":
-        # Update booking status to confirmed
-        await update_booking_payment_completed_async(
-            booking_id=booking.id,
-            payment_id=booking.payment_id or "paid"
-        )
-        
         # Get staff information
         staff = await get_staff_by_id_async(booking.staff_id)
         
-        # Create Zoom meeting
-        zoom_meeting_id, zoom_join_url = await create_zoom_meeting(
-            topic=f"Appointment with {staff.name}",
-            start_time=booking.booking_date,
-            duration_minutes=booking.duration_minutes,
-            email=None  # You might want to get user email or use a default
-        )
-        
-        # Create Bitrix24 event
-        bitrix_event_id = await create_bitrix_event(
-            title=f"Appointment with {booking.user.first_name}",
-            description=f"Telegram user: @{booking.user.username}",
-            start_time=booking.booking_date,
-            duration_minutes=booking.duration_minutes,
-            responsible_id=staff.bitrix_user_id
-        )
-        
-        # Notify admin about new confirmed booking
-        await notify_admin_about_booking(booking)
+        # The payment handler normally did this already; the ledger makes sure it runs once
+        await fulfill_paid_booking_once(booking)
         
         # Send confirmation message
         confirmation_text = _(
@@ -881,62 +867,7 @@ async def retry_payment_callback(callback: CallbackQuery, state: FSMContext):
     # Set state to payment
     await state.set_state(BookingStates.payment)
     
-    # Show payment instructions
-    payment_text = _(
-        "<b>Payment Required</b>\n\n"
-        "Your booking has been created, but payment is required to confirm it."
-    )
-    
-    await callback.message.edit_text(
-        payment_text,
-        parse_mode="HTML"
-    )
-    
-    # Get bot instance directly from the callback
-    current_bot = callback.bot
-    
-    # Send payment invoice
-    payment_description = _("Appointment with {staff_name} on {date}").format(
-        staff_name=staff.name,
-        date=booking.booking_date.strftime("%Y-%m-%d %H:%M")
-    )
-    
-    try:
-        # Send the invoice directly
-        await create_invoice(
-            bot=current_bot,
-            chat_id=callback.from_user.id,
-            booking_id=booking.id,
-            amount=staff.price,
-            description=payment_description,
-            title=_("Appointment Booking")
-        )
-        
-        # Also provide a backup method to check payment status
-        await callback.message.answer(
-            _("If you close this payment dialog, you can check your payment status using this button:"),
-            reply_markup={
-                "inline_keyboard": [[{
-                    "text": _("Check Payment Status"),
-                    "callback_data": f"check_payment:{booking.id}"
-                }]]
-            }
-        )
-    except Exception as e:
-        logger.exception(f"Failed to create invoice: {e}")
-        
-        # Fallback to old payment method
-        payment_link = generate_payment_link(booking.id, staff.price, f"Appointment with {staff.name}")
-        
-        await callback.message.answer(
-            _("Unable to create payment invoice. Please contact support or try again later."),
-            reply_markup={
-                "inline_keyboard": [[{
-                    "text": _("Check Payment Status"),
-                    "callback_data": f"check_payment:{booking.id}"
-                }]]
-            }
-        )
+    await send_payment_request(callback, booking, staff)
 
 def register_booking_handlers(router: Router):
     """
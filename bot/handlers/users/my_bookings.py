@@ -21,8 +21,9 @@ from bot.middlewares.i18n import _, i18n
 from bot.states.booking import RescheduleStates
 from bot.utils.calendar import format_date_for_user
 from bot.utils.zoom import update_zoom_meeting
-from bot.utils.bitrix24 import update_bitrix_event
+from bot.utils.bitrix24_batch import get_batch_client
 from bot.utils.notify import notify_admin_about_reschedule, notify_admin_about_cancellation
+from bot.utils import events
 
 async def cmd_my_bookings(message: types.Message, state: FSMContext):
     """
@@ -218,9 +219,18 @@ async def view_booking_callback(callback: types.CallbackQuery, callback_data: Di
             i18n.current_locale = user.language
             
             # Update booking status
+            old_status = booking.status
             booking.status = BookingStatus.CANCELLED
             session.commit()
             
+            events.publish(
+                events.BOOKING_STATUS_CHANGED,
+                booking_id=booking.id,
+                old_status=old_status,
+                new_status=BookingStatus.CANCELLED
+            )
+            events.publish(events.AVAILABILITY_CHANGED, staff_ids=[booking.staff_id], date=booking.booking_date.date())
+            
             # Notify admin about cancellation
             await notify_admin_about_cancellation(booking)
             
@@ -360,6 +370,16 @@ async def reschedule_time_callback(callback: types.CallbackQuery, callback_data:
             booking.booking_date = new_booking_datetime
             session.commit()
             
+            events.publish(
+                events.BOOKING_RESCHEDULED,
+                booking_id=booking.id,
+                staff_id=booking.staff_id,
+                old_date=old_date,
+                new_date=new_booking_datetime
+            )
+            for day in {old_date.date(), new_booking_datetime.date()}:
+                events.publish(events.AVAILABILITY_CHANGED, staff_ids=[booking.staff_id], date=day)
+            
             # Update Zoom meeting if exists
             if booking.zoom_meeting_id:
                 await update_zoom_meeting(
@@ -368,9 +388,10 @@ async def reschedule_time_callback(callback: types.CallbackQuery, callback_data:
                     30  # Duration in minutes
                 )
                 
-            # Update Bitrix24 event if exists
+            # Update Bitrix24 event if exists, batched with other reschedules in flight
             if booking.bitrix_event_id and booking.staff and booking.staff.bitrix_user_id:
-                await update_bitrix_event(
+                await get_batch_client().update_event(
+                    booking.id,
                     booking.staff.bitrix_user_id,
                     booking.bitrix_event_id,
                     new_booking_datetime,
@@ -2,7 +2,9 @@
 Payment handlers for Telegram payments integration.
 """
 import logging
-from typing import Dict, Any
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
 
 from aiogram import Router, F
 from aiogram.filters import CommandStart
@@ -13,15 +15,18 @@ from sqlalchemy import select
 from bot.database import (
     get_user_language_async, 
     get_booking_by_id_async, 
-    update_booking_payment_completed_async,
+    claim_payment_fulfillment_async,
+    complete_payment_fulfillment_async,
     Booking,
     sync_session
 )
 from bot.utils.payment import CLICK_PAYMENT_TOKEN, process_pre_checkout, process_successful_payment
 from bot.middlewares.i18n import _, i18n
-from bot.utils.zoom import create_zoom_meeting
-from bot.utils.bitrix24 import create_bitrix_event
+from bot.utils.zoom import zoom_configured
+from bot.utils.zoom_pool import get_zoom_meeting_for_booking
+from bot.utils.bitrix24 import bitrix_configured, create_bitrix_event
 from bot.utils.notify import notify_admin_about_booking
+from bot.utils import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +34,10 @@ async def pre_checkout_handler(pre_checkout_query: PreCheckoutQuery):
     """
     Handle pre-checkout queries.
     This is called when a user confirms payment but before they're charged.
+    Telegram cancels the payment if we don't answer within 10 seconds,
+    so logging and metrics are only done after the answer is sent.
     """
+    started = time.monotonic()
     try:
         # Process the pre-checkout query
         booking_success = await process_pre_checkout(pre_checkout_query)
@@ -37,13 +45,17 @@ async def pre_checkout_handler(pre_checkout_query: PreCheckoutQuery):
         if booking_success:
             # Answer with OK to confirm we're ready to accept payment
             await pre_checkout_query.answer(ok=True)
-            logger.info(f"Pre-checkout query approved: {pre_checkout_query.id}")
         else:
             # Answer with error if booking validation failed
             await pre_checkout_query.answer(
                 ok=False,
                 error_message="Sorry, your booking is no longer available. Please try again."
             )
+        
+        metrics.histogram("payments.pre_checkout.answer_latency").observe(time.monotonic() - started)
+        if booking_success:
+            logger.info(f"Pre-checkout query approved: {pre_checkout_query.id}")
+        else:
             logger.warning(f"Pre-checkout query rejected: {pre_checkout_query.id}")
     except Exception as e:
         # Handle any errors
@@ -53,6 +65,120 @@ async def pre_checkout_handler(pre_checkout_query: PreCheckoutQuery):
             error_message="Sorry, an error occurred while processing your payment. Please try again later."
         )
 
+async def fulfill_paid_booking(booking: Booking, notify_admin: bool = True) -> bool:
+    """
+    Set up everything a confirmed booking needs: Zoom meeting, Bitrix24 event
+    and admin notification.
+    Callers confirming a paid booking must claim the work with
+    `claim_payment_fulfillment_async` first, so a redelivered payment doesn't
+    create duplicates. Steps whose result is already stored on the booking are
+    skipped, so a retried fulfillment only does what is missing. Integrations
+    that aren't configured count as done.
+    
+    Args:
+        booking: Booking with user and staff loaded
+        notify_admin: Also send the admin notification
+        
+    Returns:
+        True if every step is done, False if the Zoom meeting or the Bitrix24 event is missing
+    """
+    booking_id = booking.id
+    zoom_join_url = booking.zoom_join_url
+    missing = []
+    
+    # Create Zoom meeting with error handling (a retried fulfillment may have one)
+    if not booking.zoom_meeting_id and zoom_configured():
+        missing.append("Zoom meeting")
+        try:
+            zoom_result = await get_zoom_meeting_for_booking(
+                staff_id=booking.staff_id,
+                topic=f"Appointment with {booking.staff.name}",
+                start_time=booking.booking_date,
+                duration_minutes=booking.duration_minutes,
+                user_email=booking.user.email if hasattr(booking.user, 'email') else None
+            )
+        
+            if zoom_result and 'join_url' in zoom_result:
+                # Update booking with Zoom meeting info
+                with sync_session() as session:
+                    query = select(Booking).where(Booking.id == booking_id)
+                    result = session.execute(query)
+                    booking_obj = result.scalar_one_or_none()
+                    if booking_obj:
+                        booking_obj.zoom_meeting_id = zoom_result.get('id')
+                        booking_obj.zoom_join_url = zoom_result.get('join_url')
+                        zoom_join_url = booking_obj.zoom_join_url
+                        session.commit()
+                        missing.remove("Zoom meeting")
+                        logger.info(f"Updated booking {booking_id} with Zoom meeting info")
+            else:
+                logger.warning(f"Zoom meeting creation failed for booking {booking_id}")
+        except Exception as e:
+            logger.exception(f"Error creating Zoom meeting: {e}")
+    
+    # Create Bitrix24 event with error handling (a retried fulfillment may have one)
+    if not booking.bitrix_event_id and bitrix_configured():
+        missing.append("Bitrix24 event")
+        try:
+            bitrix_result = await create_bitrix_event(
+                user_id=booking.user.telegram_id,
+                name=f"Appointment: {booking.user.first_name or 'Client'} - {booking.staff.name}",
+                start_time=booking.booking_date,
+                duration_minutes=booking.duration_minutes,
+                phone=booking.user.phone_number if hasattr(booking.user, 'phone_number') else None,
+                zoom_link=zoom_join_url,
+                responsible_id=booking.staff.bitrix_user_id if booking.staff.bitrix_user_id else None
+            )
+        
+            if bitrix_result and 'event_id' in bitrix_result:
+                # Update booking with Bitrix event info
+                with sync_session() as session:
+                    query = select(Booking).where(Booking.id == booking_id)
+                    result = session.execute(query)
+                    booking_obj = result.scalar_one_or_none()
+                    if booking_obj:
+                        booking_obj.bitrix_event_id = bitrix_result.get('event_id')
+                        session.commit()
+                        missing.remove("Bitrix24 event")
+                        logger.info(f"Updated booking {booking_id} with Bitrix event info")
+            else:
+                logger.warning(f"Bitrix event creation failed for booking {booking_id}")
+        except Exception as e:
+            logger.exception(f"Error creating Bitrix event: {e}")
+    
+    # Notify admin about new booking
+    if notify_admin:
+        await notify_admin_about_booking(booking)
+    
+    if missing:
+        logger.warning(f"Booking {booking_id} is missing its {' and '.join(missing)}")
+    return not missing
+
+async def fulfill_paid_booking_once(booking: Booking, claimed_before: Optional[datetime] = None) -> bool:
+    """
+    Claim and run the post-payment work of a booking, marking it finished
+    once every step is done. A claim that doesn't finish (a step failed or
+    the bot stopped mid-way) is retried by the reconciler after
+    PAYMENT_FULFILLMENT_TIMEOUT minutes. Only the first claim notifies the admin.
+    
+    Args:
+        booking: Booking with user and staff loaded
+        claimed_before: Also take over claims made before this time
+        
+    Returns:
+        True if this call finished the work, False if it was claimed elsewhere or a step failed
+    """
+    first_claim = await claim_payment_fulfillment_async(booking.id)
+    if not first_claim and not (claimed_before and await claim_payment_fulfillment_async(booking.id, claimed_before)):
+        return False
+    
+    if not await fulfill_paid_booking(booking, notify_admin=first_claim):
+        # The claim stays open, the reconciler retries what is missing
+        return False
+    
+    await complete_payment_fulfillment_async(booking.id)
+    return True
+
 async def successful_payment_handler(message: Message, state: FSMContext):
     """
     Handle successful payments.
@@ -76,11 +202,16 @@ async def successful_payment_handler(message: Message, state: FSMContext):
             
         booking_id = int(payment.invoice_payload.split(":")[1])
         
-        # Process successful payment
+        # Telegram may deliver the same payment more than once
         payment_success = await process_successful_payment(
             booking_id=booking_id,
-            telegram_payment_charge_id=payment.telegram_payment_charge_id
+            telegram_payment_charge_id=payment.telegram_payment_charge_id,
+            total_amount=payment.total_amount,
+            currency=payment.currency
         )
+        if payment_success is None:
+            logger.info(f"Ignoring duplicate payment update: {payment.telegram_payment_charge_id}")
+            return
         
         if payment_success:
             # Get booking information
@@ -91,66 +222,7 @@ async def successful_payment_handler(message: Message, state: FSMContext):
                 await message.answer(_("There was an error processing your booking. Please contact support."))
                 return
             
-            # Update booking status
-            await update_booking_payment_completed_async(
-                booking_id=booking_id,
-                payment_id=payment.telegram_payment_charge_id
-            )
-            
-            # Create Zoom meeting with error handling
-            try:
-                zoom_result = await create_zoom_meeting(
-                    topic=f"Appointment with {booking.staff.name}",
-                    start_time=booking.booking_date,
-                    duration_minutes=booking.duration_minutes,
-                    user_email=booking.user.email if hasattr(booking.user, 'email') else None
-                )
-                
-                if zoom_result and 'join_url' in zoom_result:
-                    # Update booking with Zoom meeting info
-                    with sync_session() as session:
-                        query = select(Booking).where(Booking.id == booking_id)
-                        result = session.execute(query)
-                        booking_obj = result.scalar_one_or_none()
-                        if booking_obj:
-                            booking_obj.zoom_meeting_id = zoom_result.get('id')
-                            booking_obj.zoom_join_url = zoom_result.get('join_url')
-                            session.commit()
-                            logger.info(f"Updated booking {booking_id} with Zoom meeting info")
-                else:
-                    logger.warning(f"Zoom meeting creation failed for booking {booking_id}")
-            except Exception as e:
-                logger.exception(f"Error creating Zoom meeting: {e}")
-            
-            # Create Bitrix24 event with error handling
-            try:
-                bitrix_result = await create_bitrix_event(
-                    user_id=booking.user.telegram_id,
-                    name=f"Appointment: {booking.user.first_name or 'Client'} - {booking.staff.name}",
-                    start_time=booking.booking_date,
-                    duration_minutes=booking.duration_minutes,
-                    phone=booking.user.phone_number if hasattr(booking.user, 'phone_number') else None,
-                    zoom_link=booking.zoom_join_url if booking.zoom_join_url else None,
-                    responsible_id=booking.staff.bitrix_user_id if booking.staff.bitrix_user_id else None
-                )
-                
-                if bitrix_result and 'event_id' in bitrix_result:
-                    # Update booking with Bitrix event info
-                    with sync_session() as session:
-                        query = select(Booking).where(Booking.id == booking_id)
-                        result = session.execute(query)
-                        booking_obj = result.scalar_one_or_none()
-                        if booking_obj:
-                            booking_obj.bitrix_event_id = bitrix_result.get('event_id')
-                            session.commit()
-                            logger.info(f"Updated booking {booking_id} with Bitrix event info")
-                else:
-                    logger.warning(f"Bitrix event creation failed for booking {booking_id}")
-            except Exception as e:
-                logger.exception(f"Error creating Bitrix event: {e}")
-            
-            # Notify admin about new booking
-            await notify_admin_about_booking(booking)
+            await fulfill_paid_booking_once(booking)
             
             # Send confirmation message
             await message.answer(
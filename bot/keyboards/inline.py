@@ -195,7 +195,10 @@ def calendar_keyboard(staff_id: int, current_date: datetime = None) -> InlineKey
             return markup  # Return empty calendar if staff doesn't exist
             
         # Get staff schedule using SQLAlchemy 2.0 pattern
-        schedule_query = select(StaffSchedule).where(StaffSchedule.staff_id == staff_id)
+        schedule_query = select(StaffSchedule).where(
+            StaffSchedule.staff_id == staff_id,
+            StaffSchedule.is_working_day.isnot(False)
+        )
         schedule_result = session.execute(schedule_query)
         staff_schedules = schedule_result.scalars().all()
         
@@ -330,7 +333,8 @@ def time_slots_keyboard(staff_id: int, year: int, month: int, day: int) -> Inlin
         # Get staff schedules for this day using SQLAlchemy 2.0 pattern
         schedule_query = select(StaffSchedule).where(
             StaffSchedule.staff_id == staff_id,
-            StaffSchedule.weekday == weekday
+            StaffSchedule.weekday == weekday,
+            StaffSchedule.is_working_day.isnot(False)
         )
         schedule_result = session.execute(schedule_query)
         schedules = schedule_result.scalars().all()
@@ -157,11 +157,49 @@ async def start_bot():
         # Set bot commands
         await set_commands(bot)
         
+        # Start background tasks
+        from bot.utils.zoom import zoom_token_refresher
+        from bot.utils.zoom_pool import zoom_meeting_pool_filler
+        from bot.utils.resilience import outbox_worker
+        from bot.utils.reconcile import stale_booking_reconciler, booking_completion_worker
+        from bot.utils.reminders import reminder_worker
+        from bot.utils.reports import report_rollup_worker
+        background_tasks = [
+            asyncio.create_task(zoom_token_refresher()),
+            asyncio.create_task(zoom_meeting_pool_filler()),
+            asyncio.create_task(outbox_worker()),
+            asyncio.create_task(stale_booking_reconciler()),
+            asyncio.create_task(booking_completion_worker()),
+            asyncio.create_task(reminder_worker()),
+            asyncio.create_task(report_rollup_worker()),
+        ]
+        
+        # Start the outbound message queue
+        from bot.utils.message_queue import message_scheduler
+        message_scheduler.start(bot)
+        
+        # Forward booking events to the admin panel's live dashboard
+        from bot.utils.live import start_event_relay
+        if start_event_relay():
+            logger.info("Relaying booking events to the admin dashboard via Redis")
+        
         # Start polling in aiogram 3.x
         logger.info("Starting bot polling...")
         try:
             await dp.start_polling(bot)
         finally:
+            await message_scheduler.stop()
+            
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            
+            from bot.utils.cache import close_redis
+            await close_redis()
+            
+            from bot.engine import dispose_engines
+            dispose_engines()
+            
             await dp.storage.close()
             await bot.session.close()
             logger.info("Bot session closed")
@@ -0,0 +1,197 @@
+"""
+Schema migrations for existing databases.
+
+`Base.metadata.create_all` only creates missing tables, so columns and indexes
+added to the models later never reach a database created before them. This
+module compares the models with the live schema and adds what is missing
+(plus the user search index, see bot.utils.search) and drops indexes the
+models replaced:
+
+    python -m bot.migrations            # apply
+    python -m bot.migrations --dry-run  # only print the statements
+"""
+import argparse
+import logging
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from bot.database import Base, engine as default_engine
+from bot.utils.search import ensure_user_search_index
+
+logger = logging.getLogger(__name__)
+
+def add_missing_columns(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Add model columns that are missing from existing tables.
+
+    Only nullable columns without a server default can be added safely;
+    anything else is reported and left for a manual migration.
+
+    Returns:
+        The ALTER TABLE statements (executed unless dry_run)
+    """
+    inspector = inspect(engine)
+    statements = []
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.primary_key:
+                logger.warning(f"Can't add required column {table.name}.{column.name}, migrate it manually")
+                continue
+
+            column_type = column.type.compile(dialect=engine.dialect)
+            statements.append(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+    _execute(engine, statements, dry_run)
+    return statements
+
+def add_missing_indexes(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Create model indexes that are missing from existing tables.
+
+    Returns:
+        The CREATE INDEX statements (executed unless dry_run)
+    """
+    inspector = inspect(engine)
+    statements = []
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                statements.append(str(CreateIndex(index).compile(dialect=engine.dialect)).strip())
+
+    _execute(engine, statements, dry_run)
+    return statements
+
+# Indexes replaced by newer ones in the models
+OBSOLETE_INDEXES = {
+    "bookings": ["ix_bookings_status_created_at"],
+    "staff_schedules": ["ix_staff_schedules_staff_id_weekday"],
+}
+
+def drop_obsolete_indexes(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Drop indexes that the models no longer define.
+
+    Returns:
+        The DROP INDEX statements (executed unless dry_run)
+    """
+    inspector = inspect(engine)
+    statements = []
+
+    for table_name, index_names in OBSOLETE_INDEXES.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        statements += [f"DROP INDEX {name}" for name in index_names if name in existing]
+
+    _execute(engine, statements, dry_run)
+    return statements
+
+def remove_duplicate_schedules(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Keep only the newest schedule row per staff member and weekday,
+    so the unique index on (staff_id, weekday) can be created.
+
+    Returns:
+        The DELETE statement if duplicates were found (executed unless dry_run)
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("staff_schedules"):
+        return []
+    if "uq_staff_schedules_staff_id_weekday" in {index["name"] for index in inspector.get_indexes("staff_schedules")}:
+        return []
+
+    with engine.connect() as connection:
+        duplicates = connection.execute(text(
+            "SELECT COUNT(*) FROM staff_schedules s "
+            "WHERE EXISTS (SELECT 1 FROM staff_schedules newer WHERE newer.staff_id = s.staff_id "
+            "AND newer.weekday = s.weekday AND newer.id > s.id)"
+        )).scalar()
+    if not duplicates:
+        return []
+
+    statements = [
+        "DELETE FROM staff_schedules WHERE id NOT IN "
+        "(SELECT MAX(id) FROM staff_schedules GROUP BY staff_id, weekday)"
+    ]
+    _execute(engine, statements, dry_run)
+    return statements
+
+def backfill_payment_started_at(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Bookings that were already payment pending when bookings.payment_started_at
+    was added have no start time, so the reconciler would never release them.
+    Their payment timeout is counted from their creation instead.
+
+    Returns:
+        The UPDATE statement if such bookings may exist (executed unless dry_run)
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("bookings"):
+        return []
+
+    condition = "status = 'PAYMENT_PENDING' AND payment_started_at IS NULL"
+    statements = [f"UPDATE bookings SET payment_started_at = created_at WHERE {condition}"]
+
+    # In a dry run the column may not have been added yet
+    if "payment_started_at" in {column["name"] for column in inspector.get_columns("bookings")}:
+        with engine.connect() as connection:
+            if not connection.execute(text(f"SELECT COUNT(*) FROM bookings WHERE {condition}")).scalar():
+                return []
+
+    _execute(engine, statements, dry_run)
+    return statements
+
+def _execute(engine: Engine, statements: List[str], dry_run: bool) -> None:
+    for statement in statements:
+        logger.info(statement if not dry_run else f"[dry run] {statement}")
+
+    if dry_run or not statements:
+        return
+
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+
+def migrate(engine: Engine = default_engine, dry_run: bool = False) -> List[str]:
+    """
+    Bring an existing database up to date with the models.
+
+    Returns:
+        Every statement that was (or would be) executed
+    """
+    # New tables first, then what create_all doesn't handle
+    if not dry_run:
+        Base.metadata.create_all(engine)
+
+    return (
+        add_missing_columns(engine, dry_run)
+        + backfill_payment_started_at(engine, dry_run)
+        + remove_duplicate_schedules(engine, dry_run)
+        + add_missing_indexes(engine, dry_run)
+        + drop_obsolete_indexes(engine, dry_run)
+        + ensure_user_search_index(engine, dry_run)
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add missing columns and indexes to the bot database")
+    parser.add_argument("--dry-run", action="store_true", help="Print the statements without running them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    statements = migrate(dry_run=args.dry_run)
+    logger.info(f"{len(statements)} migration statements {'pending' if args.dry_run else 'applied'}")
@@ -0,0 +1,64 @@
+"""
+Moves old finished bookings from the bookings table to bookings_archive
+and their payment ledger entries to payment_ledger_archive.
+
+Keeps the table used by the calendar, my_bookings and the admin panel small.
+Run it periodically (e.g. from cron):
+
+    python -m bot.utils.archive --months 6
+"""
+import argparse
+import logging
+from datetime import datetime
+
+from bot.config import BOOKING_ARCHIVE_AFTER_MONTHS
+from bot.database import Base, BookingArchive, PaymentLedgerArchive, archive_bookings_batch, engine
+
+logger = logging.getLogger(__name__)
+
+def archive_cutoff(months: int, now: datetime = None) -> datetime:
+    """
+    Get the start of the month `months` months before `now`.
+    Archiving whole months keeps every archive partition complete.
+    """
+    now = now or datetime.now()
+    month_index = now.year * 12 + now.month - 1 - months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+def archive_old_bookings(months: int = BOOKING_ARCHIVE_AFTER_MONTHS, batch_size: int = 1000) -> int:
+    """
+    Archive completed and cancelled bookings older than `months` months.
+
+    Args:
+        months: Age in whole months after which bookings are archived
+        batch_size: Number of bookings moved per transaction
+
+    Returns:
+        Number of bookings archived
+    """
+    # Make sure the archive tables exist (bookings_archive is partitioned on PostgreSQL)
+    Base.metadata.create_all(engine, tables=[BookingArchive.__table__, PaymentLedgerArchive.__table__])
+
+    cutoff = archive_cutoff(months)
+    total = 0
+
+    while True:
+        archived = archive_bookings_batch(cutoff, limit=batch_size)
+        total += archived
+        if archived:
+            logger.info(f"Archived {total} bookings so far")
+        if archived < batch_size:
+            break
+
+    logger.info(f"Archived {total} bookings dated before {cutoff:%Y-%m-%d}")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old finished bookings to bookings_archive")
+    parser.add_argument("--months", type=int, default=BOOKING_ARCHIVE_AFTER_MONTHS,
+                        help="Archive bookings older than this many months")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Bookings moved per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    archive_old_bookings(args.months, args.batch_size)
@@ -8,9 +8,72 @@ from typing import Optional, Dict, Any
 import aiohttp
 
 from bot.config import BITRIX24_WEBHOOK_URL
+from bot.utils.resilience import ServiceUnavailable, resilient
 
 logger = logging.getLogger(__name__)
 
+def build_event_add_params(
+    user_id: str,
+    name: str,
+    start_time: datetime,
+    duration_minutes: int,
+    phone: Optional[str] = None,
+    zoom_link: Optional[str] = None,
+    responsible_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build the parameters for a `calendar.event.add` call.
+    
+    Returns:
+        Dictionary of API parameters
+    """
+    # Calculate end time
+    end_time = start_time + timedelta(minutes=duration_minutes)
+    
+    # Prepare description with phone and Zoom link
+    description = ""
+    if phone:
+        description += f"Phone: {phone}\n"
+    if zoom_link:
+        description += f"Zoom link: {zoom_link}\n"
+    
+    data = {
+        "type": "user",
+        "ownerId": user_id,
+        "name": name,
+        # Format datetime for Bitrix24 API
+        "dateFrom": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dateTo": end_time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "description": description,
+        "attendees": [user_id],  # Owner as attendee
+        "remind": [{"type": "min", "count": 15}]  # 15-minute reminder
+    }
+    
+    # Add responsible person if provided
+    if responsible_id:
+        data["responsibleId"] = responsible_id
+    
+    return data
+
+def build_event_update_params(event_id: str, start_time: datetime, duration_minutes: int) -> Dict[str, Any]:
+    """
+    Build the parameters for a `calendar.event.update` call.
+    
+    Returns:
+        Dictionary of API parameters
+    """
+    end_time = start_time + timedelta(minutes=duration_minutes)
+    
+    return {
+        "id": event_id,
+        "dateFrom": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dateTo": end_time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+def bitrix_configured() -> bool:
+    """Check whether the Bitrix24 webhook is set."""
+    return bool(BITRIX24_WEBHOOK_URL)
+
 async def create_bitrix_event(
     user_id: str,
     name: str,
@@ -35,7 +98,8 @@ async def create_bitrix_event(
     Returns:
         Dictionary with event details if successful, None otherwise
     """
-    if not BITRIX24_WEBHOOK_URL:
+    # Checked outside the circuit breaker, missing configuration isn't an outage
+    if not bitrix_configured():
         logger.error("Bitrix24 webhook URL not configured")
         return None
         
@@ -43,64 +107,21 @@ async def create_bitrix_event(
         logger.error("Bitrix24 user ID not provided")
         return None
     
-    try:
-        # Calculate end time
-        end_time = start_time + timedelta(minutes=duration_minutes)
-        
-        # Format datetime for Bitrix24 API
-        start_formatted = start_time.strftime("%Y-%m-%dT%H:%M:%S")
-        end_formatted = end_time.strftime("%Y-%m-%dT%H:%M:%S")
-        
-        # Prepare description with phone and Zoom link
-        description = ""
-        if phone:
-            description += f"Phone: {phone}\n"
-        if zoom_link:
-            description += f"Zoom link: {zoom_link}\n"
-        
-        # Prepare API request
-        api_url = f"{BITRIX24_WEBHOOK_URL}/calendar.event.add"
-        
-        data = {
-            "type": "user",
-            "ownerId": user_id,
-            "name": name,
-            "dateFrom": start_formatted,
-            "dateTo": end_formatted,
-            "description": description,
-            "attendees": [user_id],  # Owner as attendee
-            "remind": [{"type": "min", "count": 15}]  # 15-minute reminder
-        }
-        
-        # Add responsible person if provided
-        if responsible_id:
-            data["responsibleId"] = responsible_id
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(api_url, json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    
-                    # Check if request was successful
-                    if result.get("result"):
-                        event_id = str(result["result"])
-                        return {
-                            "event_id": event_id,
-                            "name": name,
-                            "start_time": start_formatted,
-                            "end_time": end_formatted,
-                            "responsible_id": responsible_id
-                        }
-                    else:
-                        logger.error(f"Bitrix24 API error: {result.get('error')}")
-                        return None
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to create Bitrix24 event: {response.status} - {error_text}")
-                    return None
-    except Exception as e:
-        logger.exception(f"Error creating Bitrix24 event: {e}")
+    data = build_event_add_params(
+        user_id, name, start_time, duration_minutes,
+        phone=phone, zoom_link=zoom_link, responsible_id=responsible_id
+    )
+    event_id = await _add_bitrix_event(data)
+    if not event_id:
         return None
+    
+    return {
+        "event_id": event_id,
+        "name": name,
+        "start_time": data["dateFrom"],
+        "end_time": data["dateTo"],
+        "responsible_id": responsible_id
+    }
 
 async def update_bitrix_event(
     user_id: str,
@@ -111,6 +132,8 @@ async def update_bitrix_event(
     """
     Update an existing calendar event in Bitrix24.
     
+    Updates skipped by an open circuit are queued in the outbox.
+    
     Args:
         user_id: Bitrix24 user ID
         event_id: Event ID to update
@@ -120,7 +143,7 @@ async def update_bitrix_event(
     Returns:
         True if successful, False otherwise
     """
-    if not BITRIX24_WEBHOOK_URL:
+    if not bitrix_configured():
         logger.error("Bitrix24 webhook URL not configured")
         return False
         
@@ -128,38 +151,44 @@ async def update_bitrix_event(
         logger.error("Bitrix24 user ID or event ID not provided")
         return False
     
-    try:
-        # Calculate end time
-        end_time = start_time + timedelta(minutes=duration_minutes)
-        
-        # Format datetime for Bitrix24 API
-        start_formatted = start_time.strftime("%Y-%m-%dT%H:%M:%S")
-        end_formatted = end_time.strftime("%Y-%m-%dT%H:%M:%S")
-        
-        # Prepare API request
-        api_url = f"{BITRIX24_WEBHOOK_URL}/calendar.event.update"
-        
-        data = {
-            "id": event_id,
-            "dateFrom": start_formatted,
-            "dateTo": end_formatted
-        }
+    return await _move_bitrix_event(build_event_update_params(event_id, start_time, duration_minutes))
+
+async def _call_bitrix(method: str, data: Dict[str, Any]) -> Any:
+    """
+    Call a Bitrix24 REST method.
+    
+    Returns:
+        The method's result, or None if Bitrix24 rejected the call
         
+    Raises:
+        ServiceUnavailable: On a transport error or a 5xx answer
+    """
+    api_url = f"{BITRIX24_WEBHOOK_URL}/{method}"
+    try:
         async with aiohttp.ClientSession() as session:
             async with session.post(api_url, json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    
-                    # Check if request was successful
-                    if result.get("result"):
-                        return True
-                    else:
-                        logger.error(f"Bitrix24 API error: {result.get('error')}")
-                        return False
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to update Bitrix24 event: {response.status} - {error_text}")
-                    return False
-    except Exception as e:
-        logger.exception(f"Error updating Bitrix24 event: {e}")
-        return False
+                status = response.status
+                body = await response.json() if status == 200 else await response.text()
+    except aiohttp.ClientError as e:
+        raise ServiceUnavailable(f"{method} request failed: {e}") from e
+    
+    if status >= 500:
+        raise ServiceUnavailable(f"{method} answered {status} - {body}")
+    if status != 200:
+        logger.error(f"Bitrix24 {method} failed: {status} - {body}")
+        return None
+    if not body.get("result"):
+        logger.error(f"Bitrix24 API error: {body.get('error')}")
+        return None
+    return body["result"]
+
+@resilient("bitrix24", "bitrix24.event_add")
+async def _add_bitrix_event(data: Dict[str, Any]) -> Optional[str]:
+    """Call `calendar.event.add` (see `create_bitrix_event`), returning the event ID."""
+    result = await _call_bitrix("calendar.event.add", data)
+    return str(result) if result else None
+
+@resilient("bitrix24", "bitrix24.event_update", fallback=False, queue_on_open=True)
+async def _move_bitrix_event(data: Dict[str, Any]) -> bool:
+    """Call `calendar.event.update` (see `update_bitrix_event`)."""
+    return bool(await _call_bitrix("calendar.event.update", data))
@@ -0,0 +1,341 @@
+"""
+Batched Bitrix24 API client.
+Coalesces calendar calls into the `batch` endpoint (up to 50 commands per request).
+"""
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+
+from bot.config import BITRIX24_WEBHOOK_URL
+from bot.utils.bitrix24 import _move_bitrix_event, build_event_add_params, build_event_update_params
+from bot.utils.resilience import enqueue_outbox, get_breaker, get_latency_tracker
+
+logger = logging.getLogger(__name__)
+
+# Bitrix24 refuses batches with more than 50 commands
+MAX_BATCH_SIZE = 50
+
+# How long a command may wait for other commands to join its batch (in seconds)
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# Flush interval of the shared client, whose callers are waiting users and admins
+SHARED_FLUSH_INTERVAL = 0.1
+
+# Queued call: command key, command string, result future, called if the circuit rejects the batch
+PendingCall = Tuple[str, str, asyncio.Future, Optional[Callable[[], None]]]
+
+def _flatten_params(params: Any, prefix: str = "") -> List[Tuple[str, str]]:
+    """
+    Flatten nested parameters into PHP-style query pairs (`remind[0][type]=min`).
+    """
+    if isinstance(params, dict):
+        items = params.items()
+    elif isinstance(params, (list, tuple)):
+        items = enumerate(params)
+    else:
+        return [(prefix, "" if params is None else str(params))]
+
+    pairs = []
+    for key, value in items:
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        pairs.extend(_flatten_params(value, name))
+    return pairs
+
+def build_batch_command(method: str, params: Dict[str, Any]) -> str:
+    """
+    Encode a single API call as a `batch` command string.
+
+    Returns:
+        Command string such as "calendar.event.update?id=1&dateFrom=..."
+    """
+    return f"{method}?{urlencode(_flatten_params(params))}"
+
+class BitrixBatchClient:
+    """
+    Collects Bitrix24 calls and sends them through the `batch` endpoint.
+
+    Each submitted call returns a future that resolves to the call's result
+    (or None on error). Pending calls are flushed when MAX_BATCH_SIZE commands
+    are queued or `flush_interval` seconds after the first one arrived.
+    """
+
+    def __init__(
+        self,
+        webhook_url: Optional[str] = BITRIX24_WEBHOOK_URL,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ):
+        self.webhook_url = webhook_url
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self._pending: List[PendingCall] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: set = set()
+        self._counter = itertools.count()
+
+    def submit(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        tag: str = "cmd",
+        on_rejected: Optional[Callable[[], None]] = None
+    ) -> asyncio.Future:
+        """
+        Queue an API call.
+
+        Args:
+            method: Bitrix24 method name, e.g. "calendar.event.add"
+            params: Method parameters
+            tag: Readable prefix for the command key (e.g. the booking ID)
+            on_rejected: Called if the call's batch is skipped because the
+                circuit is open (e.g. to queue the call in the outbox)
+
+        Returns:
+            Future resolving to the call result or None if it failed
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        if not self.webhook_url:
+            logger.error("Bitrix24 webhook URL not configured")
+            future.set_result(None)
+            return future
+
+        key = f"{tag}_{next(self._counter)}"
+        self._pending.append((key, build_batch_command(method, params), future, on_rejected))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+        return future
+
+    async def add_event(
+        self,
+        booking_id: int,
+        user_id: str,
+        name: str,
+        start_time: datetime,
+        duration_minutes: int,
+        phone: Optional[str] = None,
+        zoom_link: Optional[str] = None,
+        responsible_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Create a calendar event as part of a batch.
+
+        Returns:
+            Event ID if successful, None otherwise
+        """
+        params = build_event_add_params(
+            user_id, name, start_time, duration_minutes,
+            phone=phone, zoom_link=zoom_link, responsible_id=responsible_id
+        )
+        result = await self.submit("calendar.event.add", params, tag=f"add{booking_id}")
+        return str(result) if result else None
+
+    async def update_event(
+        self,
+        booking_id: int,
+        user_id: str,
+        event_id: str,
+        start_time: datetime,
+        duration_minutes: int
+    ) -> bool:
+        """
+        Update a calendar event as part of a batch.
+
+        Like `update_bitrix_event`, an update skipped by the open circuit is
+        queued in the outbox and applied once Bitrix24 is back.
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not user_id or not event_id:
+            logger.error("Bitrix24 user ID or event ID not provided")
+            return False
+
+        params = build_event_update_params(event_id, start_time, duration_minutes)
+        result = await self.submit(
+            "calendar.event.update", params, tag=f"upd{booking_id}",
+            on_rejected=lambda: enqueue_outbox(
+                "bitrix24", "bitrix24.event_update", _move_bitrix_event.__wrapped__, params
+            )
+        )
+        return bool(result)
+
+    async def flush(self) -> None:
+        """Send every pending call and wait for all in-flight batches."""
+        while self._pending:
+            self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Flush pending calls and stop the timer."""
+        await self.flush()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _flush_later(self) -> None:
+        """Flush whatever is pending once the flush interval has passed."""
+        try:
+            await asyncio.sleep(self.flush_interval)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        while self._pending:
+            self._start_flush()
+
+    def _start_flush(self) -> None:
+        """Take up to one batch worth of calls off the queue and send it."""
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        task = asyncio.create_task(self._send_batch(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _send_batch(self, batch: List[PendingCall]) -> None:
+        """Send one batch request and resolve the futures of its calls."""
+        api_url = f"{self.webhook_url}/batch"
+        data = {
+            "halt": 0,  # Keep executing the other commands if one fails
+            "cmd": {key: command for key, command, _, _ in batch}
+        }
+
+        results: Dict[str, Any] = {}
+        errors: Dict[str, Any] = {}
+        breaker = get_breaker("bitrix24")
+        tracker = get_latency_tracker("bitrix24.batch")
+
+        if not breaker.allow():
+            logger.warning(f"Circuit 'bitrix24' is open, skipping batch of {len(batch)} commands")
+            for _, _, _, on_rejected in batch:
+                if on_rejected is not None:
+                    on_rejected()
+        else:
+            started = time.monotonic()
+            # Only transport errors, timeouts and 5xx answers are outages, None if cancelled
+            available = None
+            try:
+                timeout = aiohttp.ClientTimeout(total=tracker.timeout())
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.post(api_url, json=data) as response:
+                        if response.status == 200:
+                            body = await response.json()
+                            batch_result = body.get("result") or {}
+                            results = batch_result.get("result") or {}
+                            errors = batch_result.get("result_error") or {}
+                            tracker.observe(time.monotonic() - started)
+                        else:
+                            error_text = await response.text()
+                            logger.error(f"Bitrix24 batch request failed: {response.status} - {error_text}")
+                        available = response.status < 500
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Error sending Bitrix24 batch: {e!r}")
+                available = False
+            except Exception as e:
+                # Still resolve the futures below, the calls just get no result
+                logger.exception(f"Error sending Bitrix24 batch: {e}")
+            finally:
+                if available is None:
+                    breaker.release()
+                elif available:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+
+        # Bitrix returns an empty list instead of an object when nothing succeeded
+        if not isinstance(results, dict):
+            results = {}
+        if not isinstance(errors, dict):
+            errors = {}
+
+        for key, command, future, _ in batch:
+            if key in errors:
+                logger.error(f"Bitrix24 batch command {key} failed: {errors[key]}")
+            if not future.done():
+                future.set_result(results.get(key))
+
+_shared_client: Optional[BitrixBatchClient] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_batch_client() -> BitrixBatchClient:
+    """
+    Get the batch client shared by the booking handlers of the running event loop.
+
+    Calendar updates from concurrent reschedules (e.g. an admin moving a
+    staff member's day) go out together instead of as one request each.
+    """
+    global _shared_client, _shared_loop
+
+    loop = asyncio.get_running_loop()
+    if _shared_client is None or _shared_loop is not loop:
+        _shared_client = BitrixBatchClient(flush_interval=SHARED_FLUSH_INTERVAL)
+        _shared_loop = loop
+    return _shared_client
+
+async def backfill_bitrix_events(chunk_size: int = 500) -> int:
+    """
+    Create Bitrix24 events for confirmed bookings that don't have one yet.
+
+    Bookings are processed in chunks; every chunk goes out as a handful of
+    batch requests instead of one request per booking.
+
+    Returns:
+        Number of bookings that received an event
+    """
+    from bot.database import get_bookings_missing_bitrix_event, set_booking_bitrix_event_ids
+
+    client = BitrixBatchClient()
+    total = 0
+    after_id = 0
+
+    while True:
+        bookings = get_bookings_missing_bitrix_event(after_id=after_id, limit=chunk_size)
+        if not bookings:
+            break
+        after_id = bookings[-1].id
+
+        event_ids = await asyncio.gather(*[
+            client.add_event(
+                booking_id=booking.id,
+                user_id=booking.staff.bitrix_user_id,
+                name=f"Appointment: {booking.user.first_name or 'Client'} - {booking.staff.name}",
+                start_time=booking.booking_date,
+                duration_minutes=booking.duration_minutes or 30,
+                phone=booking.user.phone_number,
+                zoom_link=booking.zoom_join_url,
+                responsible_id=booking.staff.bitrix_user_id
+            )
+            for booking in bookings
+        ])
+
+        created = {
+            booking.id: event_id
+            for booking, event_id in zip(bookings, event_ids)
+            if event_id
+        }
+        set_booking_bitrix_event_ids(created)
+        total += len(created)
+        logger.info(f"Backfilled {len(created)} of {len(bookings)} Bitrix24 events")
+
+    await client.close()
+    return total
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    count = asyncio.run(backfill_bitrix_events())
+    logger.info(f"Bitrix24 backfill finished, {count} events created")
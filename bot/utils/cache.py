@@ -0,0 +1,58 @@
+"""
+Shared Redis connection for state that must be visible to all bot workers.
+"""
+import logging
+from typing import Optional, Any
+
+from bot.config import USE_REDIS, REDIS_HOST, REDIS_PORT, REDIS_DB
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# Lazily created client shared by the whole process
+_redis_client = None
+
+def get_redis() -> Optional[Any]:
+    """
+    Get the shared async Redis client.
+
+    Returns:
+        Redis client or None if Redis is disabled or not installed
+    """
+    global _redis_client
+
+    if not USE_REDIS:
+        return None
+
+    if aioredis is None:
+        logger.warning("USE_REDIS is set but the redis package is not installed")
+        return None
+
+    if _redis_client is None:
+        _redis_client = create_redis()
+
+    return _redis_client
+
+def create_redis() -> Any:
+    """
+    Create a new async Redis client, for an event loop other than the shared client's.
+    Only call this once `get_redis` returned a client.
+    """
+    return aioredis.Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        decode_responses=True
+    )
+
+async def close_redis() -> None:
+    """Close the shared Redis client if it was opened."""
+    global _redis_client
+
+    if _redis_client is not None:
+        await _redis_client.close()
+        _redis_client = None
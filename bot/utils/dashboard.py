@@ -0,0 +1,151 @@
+"""
+Dashboard counters for the admin panel.
+
+All counters come from one grouped query that is reused for
+DASHBOARD_CACHE_TTL seconds. In between, booking events adjust the counts in
+place (created, status changed) or force a refresh (rescheduled), so
+refreshes by several admins cost at most one query per TTL while changes
+still show up immediately. The bot's events reach the admin processes
+through the Redis relay in bot.utils.live; without Redis, changes made by
+the bot show up within the TTL.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, case, func, select
+
+from bot.utils import events
+
+logger = logging.getLogger(__name__)
+
+# How long a computed snapshot is reused (in seconds)
+DASHBOARD_CACHE_TTL = 30
+
+def _status_key(status: Any) -> Optional[str]:
+    """Status enums of the bot and Flask models share values, not identity."""
+    return getattr(status, "value", status)
+
+def count_dashboard_stats(session, booking_model, staff_model, day_start: datetime) -> Dict[str, Any]:
+    """
+    Count bookings per status, today's bookings and active staff in one query.
+
+    Args:
+        session: SQLAlchemy session
+        booking_model: Booking model class (bot or Flask models)
+        staff_model: Staff model class of the same models
+        day_start: Start of the day counted as "today"
+
+    Returns:
+        Dict with "by_status", "today" and "active_staff"
+    """
+    in_today = and_(
+        booking_model.booking_date >= day_start,
+        booking_model.booking_date < day_start + timedelta(days=1)
+    )
+    active_staff = (
+        select(func.count(staff_model.id))
+        .where(staff_model.is_active.is_(True))
+        .scalar_subquery()
+    )
+
+    rows = session.execute(
+        select(
+            booking_model.status,
+            func.count(booking_model.id),
+            func.coalesce(func.sum(case((in_today, 1), else_=0)), 0),
+            active_staff
+        ).group_by(booking_model.status)
+    ).all()
+
+    if not rows:
+        # No bookings at all, so the grouped query had nothing to attach the staff count to
+        return {"by_status": {}, "today": 0, "active_staff": session.execute(select(active_staff)).scalar()}
+
+    return {
+        "by_status": {_status_key(status): count for status, count, _, _ in rows},
+        "today": sum(today for _, _, today, _ in rows),
+        "active_staff": rows[0][3],
+    }
+
+class DashboardStats:
+    """Cached dashboard counters kept current by booking events."""
+
+    def __init__(self, ttl: float = DASHBOARD_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats: Optional[Dict[str, Any]] = None
+        self._day_start: Optional[datetime] = None
+        self._expires_at = 0.0
+
+        events.subscribe(events.BOOKING_CREATED, self._on_created)
+        events.subscribe(events.BOOKING_STATUS_CHANGED, self._on_status_changed)
+        events.subscribe(events.BOOKING_RESCHEDULED, self.invalidate)
+
+    def get(self, session, booking_model, staff_model) -> Dict[str, Any]:
+        """
+        Get the dashboard counters, querying only if the snapshot is stale.
+
+        Concurrent callers wait for a single refresh instead of all querying.
+
+        Args:
+            session: SQLAlchemy session used if a refresh is needed
+            booking_model: Booking model class (bot or Flask models)
+            staff_model: Staff model class of the same models
+
+        Returns:
+            Dict with total_bookings, today_bookings, pending_payments,
+            active_staff and bookings_by_status
+        """
+        now = datetime.now()
+        day_start = datetime(now.year, now.month, now.day)
+
+        with self._lock:
+            if self._stats is None or time.monotonic() >= self._expires_at or self._day_start != day_start:
+                self._stats = count_dashboard_stats(session, booking_model, staff_model, day_start)
+                self._day_start = day_start
+                self._expires_at = time.monotonic() + self.ttl
+            return self._snapshot()
+
+    def invalidate(self, **_: Any) -> None:
+        """Force the next `get` to query the database."""
+        with self._lock:
+            self._expires_at = 0.0
+
+    def _snapshot(self) -> Dict[str, Any]:
+        by_status = {status: count for status, count in self._stats["by_status"].items() if status is not None}
+        return {
+            "total_bookings": sum(self._stats["by_status"].values()),
+            "today_bookings": self._stats["today"],
+            "pending_payments": by_status.get("payment_pending", 0),
+            "active_staff": self._stats["active_staff"],
+            "bookings_by_status": by_status,
+        }
+
+    def _on_created(self, status: Any = None, booking_date: Any = None, **_: Any) -> None:
+        # Relayed events carry the date as an ISO string
+        if isinstance(booking_date, str):
+            booking_date = datetime.fromisoformat(booking_date)
+        with self._lock:
+            if self._stats is None:
+                return
+            key = _status_key(status)
+            self._stats["by_status"][key] = self._stats["by_status"].get(key, 0) + 1
+            if booking_date and self._day_start <= booking_date < self._day_start + timedelta(days=1):
+                self._stats["today"] += 1
+
+    def _on_status_changed(self, old_status: Any = None, new_status: Any = None, **_: Any) -> None:
+        with self._lock:
+            if self._stats is None:
+                return
+            by_status = self._stats["by_status"]
+            old_key, new_key = _status_key(old_status), _status_key(new_status)
+            if old_key == new_key:
+                return
+            by_status[old_key] = max(by_status.get(old_key, 0) - 1, 0)
+            by_status[new_key] = by_status.get(new_key, 0) + 1
+
+# Shared by the admin panel views
+dashboard_stats = DashboardStats()
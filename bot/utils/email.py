@@ -10,6 +10,8 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
 
+from bot.utils.resilience import ServiceUnavailable, resilient_sync, get_timeout
+
 # Initialize logger
 logger = logging.getLogger(__name__)
 
@@ -57,6 +59,7 @@ def send_email(to_email, subject, html_content, cc=None, bcc=None):
     Returns:
         Boolean indicating success or failure
     """
+    # Checked outside the circuit breaker, missing configuration isn't an outage
     if not EMAIL_ENABLED:
         logger.info("Email sending is disabled. Would have sent email to: %s", to_email)
         return True
@@ -65,44 +68,61 @@ def send_email(to_email, subject, html_content, cc=None, bcc=None):
         logger.warning("SMTP credentials not configured. Cannot send email.")
         return False
     
-    try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_FROM
-        msg['To'] = to_email
-        
-        if cc:
-            msg['Cc'] = cc
-        if bcc:
-            msg['Bcc'] = bcc
-            
-        # Attach HTML content
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
+    # Create message
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = EMAIL_FROM
+    msg['To'] = to_email
+    
+    if cc:
+        msg['Cc'] = cc
+    if bcc:
+        msg['Bcc'] = bcc
         
-        # Send the email
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+    # Attach HTML content
+    html_part = MIMEText(html_content, 'html')
+    msg.attach(html_part)
+    
+    # Get all recipients
+    all_recipients = []
+    if to_email:
+        all_recipients.extend(to_email.split(','))
+    if cc:
+        all_recipients.extend(cc.split(','))
+    if bcc:
+        all_recipients.extend(bcc.split(','))
+    
+    if not _send_message(msg, all_recipients):
+        return False
+    
+    logger.info("Email sent successfully to: %s", to_email)
+    return True
+
+
+@resilient_sync("smtp", "smtp.send", fallback=False)
+def _send_message(msg, recipients):
+    """
+    Deliver a message over SMTP (see `send_email`).
+    
+    Raises:
+        ServiceUnavailable: If the server can't be reached or drops the connection
+    """
+    try:
+        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=get_timeout("smtp.send")) as server:
             server.ehlo()
             server.starttls()
             server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            
-            # Get all recipients
-            all_recipients = []
-            if to_email:
-                all_recipients.extend(to_email.split(','))
-            if cc:
-                all_recipients.extend(cc.split(','))
-            if bcc:
-                all_recipients.extend(bcc.split(','))
-                
-            server.sendmail(EMAIL_FROM, all_recipients, msg.as_string())
-            
-        logger.info("Email sent successfully to: %s", to_email)
+            server.sendmail(EMAIL_FROM, recipients, msg.as_string())
         return True
-    except Exception as e:
+    except (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected) as e:
+        raise ServiceUnavailable(f"SMTP server unavailable: {e}") from e
+    except smtplib.SMTPException as e:
+        # The server answered, e.g. rejected the login or a recipient
         logger.exception("Error sending email: %s", str(e))
         return False
+    except OSError as e:
+        # Socket errors and timeouts
+        raise ServiceUnavailable(f"SMTP connection failed: {e}") from e
 
 
 def send_refund_notification(booking, user_email=None):
@@ -0,0 +1,61 @@
+"""
+In-process publish/subscribe for booking and schedule changes.
+Lets caches, counters and notifications react to changes without the
+code making the change knowing about them.
+"""
+import asyncio
+import inspect
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Event names
+BOOKING_CREATED = "booking.created"
+BOOKING_STATUS_CHANGED = "booking.status_changed"
+BOOKING_RESCHEDULED = "booking.rescheduled"
+# Payload: staff_ids and date (None when every date may be affected, e.g. a schedule change)
+AVAILABILITY_CHANGED = "availability.changed"
+
+_subscribers: Dict[str, List[Callable]] = defaultdict(list)
+
+def subscribe(event: str, handler: Callable) -> None:
+    """
+    Register a handler for an event.
+
+    Args:
+        event: Event name, e.g. AVAILABILITY_CHANGED
+        handler: Function or coroutine function called with the event payload as keyword arguments
+    """
+    if handler not in _subscribers[event]:
+        _subscribers[event].append(handler)
+
+def unsubscribe(event: str, handler: Callable) -> None:
+    """Remove a handler registered with `subscribe`."""
+    if handler in _subscribers[event]:
+        _subscribers[event].remove(handler)
+
+def publish(event: str, **payload: Any) -> None:
+    """
+    Deliver an event to its subscribers.
+
+    Plain handlers run immediately; coroutine handlers are scheduled on the
+    running event loop (or skipped with a warning if there is none). A failing
+    handler is logged and doesn't affect the others or the publisher.
+
+    Args:
+        event: Event name
+        **payload: Event data passed to every handler
+    """
+    for handler in list(_subscribers.get(event, ())):
+        try:
+            if inspect.iscoroutinefunction(handler):
+                try:
+                    asyncio.get_running_loop().create_task(handler(**payload))
+                except RuntimeError:
+                    logger.warning(f"No event loop running, skipping async handler for {event}")
+            else:
+                handler(**payload)
+        except Exception as e:
+            logger.exception(f"Error in {event} handler {getattr(handler, '__name__', handler)}: {e}")
@@ -0,0 +1,109 @@
+"""
+Streaming encoders for booking exports.
+
+Rows are turned into CSV or JSON Lines in chunks of about CHUNK_SIZE bytes,
+optionally gzip-compressed on the fly, so an export uses the same memory
+for ten rows as for ten million.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, Iterator, Sequence
+
+# Bytes collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+def _plain(value: Any) -> Any:
+    """Convert a column value to something CSV and JSON can represent."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_csv(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """
+    Encode rows as CSV with a header line.
+
+    Args:
+        columns: Column names, in the order of the row values
+        rows: Row tuples
+
+    Yields:
+        UTF-8 encoded chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_jsonl(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """
+    Encode rows as JSON Lines, one object per row.
+
+    Args:
+        columns: Object keys, in the order of the row values
+        rows: Row tuples
+
+    Yields:
+        UTF-8 encoded chunks
+    """
+    lines = []
+    size = 0
+
+    for row in rows:
+        line = json.dumps({column: _plain(value) for column, value in zip(columns, row)}, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines, size = [], 0
+
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into a single gzip stream."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def iter_export(export_format: str, columns: Sequence[str], rows: Iterable[Sequence[Any]],
+                compress: bool = False) -> Iterator[bytes]:
+    """
+    Encode rows in one of EXPORT_FORMATS.
+
+    Args:
+        export_format: "csv" or "jsonl"
+        columns: Column names, in the order of the row values
+        rows: Row tuples (e.g. a `yield_per` query)
+        compress: Gzip the output
+
+    Yields:
+        Chunks of the encoded (and possibly compressed) file
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    chunks = iter_csv(columns, rows) if export_format == "csv" else iter_jsonl(columns, rows)
+    return iter_gzip(chunks) if compress else chunks
@@ -0,0 +1,158 @@
+"""
+HTTP caching for admin pages built from rarely changing tables.
+
+Every transaction that writes to one of bot.database.VERSIONED_TABLES bumps
+that table's counter in `table_versions`. A page derives its ETag from the
+counters of the tables it shows, so checking whether a browser's copy is
+still current costs one primary key lookup instead of the page's queries and
+template rendering, and unchanged pages are answered with 304 Not Modified.
+Parts of a page that are the same for every admin are additionally kept
+rendered in `fragment_cache`, keyed by the same counters.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from sqlalchemy import select
+
+from bot.database import TableVersion
+
+# Rendered fragments kept in memory
+FRAGMENT_CACHE_SIZE = 256
+
+# Part of every ETag, so a deploy with changed templates doesn't get 304s for the old pages.
+# Covers the templates of both admin panels.
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+TEMPLATES_DIRS = (PROJECT_DIR / "admin" / "templates", PROJECT_DIR / "templates")
+
+def _templates_digest() -> str:
+    digest = hashlib.sha1()
+    for templates_dir in TEMPLATES_DIRS:
+        for path in sorted(templates_dir.rglob("*.html")):
+            digest.update(str(path.relative_to(PROJECT_DIR)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:8]
+
+TEMPLATES_DIGEST = _templates_digest()
+
+class TableVersions:
+    """Change counters of the tables a page is built from."""
+
+    def __init__(self, versions: Dict[str, int], last_modified: Optional[datetime]):
+        self.versions = versions
+        self.last_modified = last_modified
+
+    def etag(self, *variant: Any) -> str:
+        """
+        Weak ETag for a page built from these tables.
+
+        Args:
+            variant: Everything else the page depends on, e.g. the admin
+                user and the query parameters
+        """
+        parts = [TEMPLATES_DIGEST]
+        parts.extend(f"{table}:{version}" for table, version in sorted(self.versions.items()))
+        parts.extend(repr(value) for value in variant)
+        return 'W/"' + hashlib.sha1("|".join(parts).encode()).hexdigest()[:20] + '"'
+
+def get_table_versions(session, tables: Iterable[str]) -> TableVersions:
+    """
+    Read the change counters of the given tables in one query.
+    Tables that were never written since the counters were added are at version 0.
+    """
+    tables = list(tables)
+    rows = session.execute(
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(tables))
+    ).all()
+
+    versions = {table: 0 for table in tables}
+    versions.update({table: version for table, version, _ in rows})
+    last_modified = max((updated_at for _, _, updated_at in rows), default=None)
+    return TableVersions(versions, last_modified.replace(tzinfo=timezone.utc) if last_modified else None)
+
+def is_not_modified(etag: str, last_modified: Optional[datetime],
+                    if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """
+    Check the request's conditional headers against the current page version.
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+
+    Args:
+        etag: Current ETag of the page
+        last_modified: Last change of the page's tables (UTC), if known
+        if_none_match: If-None-Match request header
+        if_modified_since: If-Modified-Since request header
+    """
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" and "x" match
+        opaque = etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    """
+    Response headers for a versioned page.
+    The browser keeps the page but revalidates it on every navigation.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+class FragmentCache:
+    """Least recently used cache of rendered page fragments."""
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: str, render: Callable[[], Any]) -> Any:
+        """
+        Get a fragment, rendering it on a miss.
+
+        Args:
+            key: Cache key, should include TableVersions.etag() so a change
+                to the tables makes it miss
+            render: Builds the fragment (usually runs the queries and the template)
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Rendered outside the lock, two threads may both render the same new fragment
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# Shared by the admin panel views
+fragment_cache = FragmentCache()
@@ -0,0 +1,219 @@
+"""
+Live booking feed for the admin dashboard.
+
+The bot relays its booking events to a Redis channel. The admin panels
+republish the channel's events on their own event bus, so their caches see
+the bot's changes: the FastAPI admin from its event loop, the Flask admin
+from a background thread (`start_relay_listener_thread`). The FastAPI admin
+fans every event out to the connected dashboards over Server-Sent Events.
+N open dashboards then cost one subscription instead of N pollers.
+"""
+import asyncio
+import json
+import logging
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Set
+
+from bot.database import BookingStatus
+from bot.utils import events
+from bot.utils.cache import create_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Redis channel the bot publishes booking events to
+LIVE_CHANNEL = "booking-events"
+
+# Events buffered per dashboard before it's asked to reload instead
+CLIENT_QUEUE_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+LIVE_EVENTS = (events.BOOKING_CREATED, events.BOOKING_STATUS_CHANGED, events.BOOKING_RESCHEDULED)
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+def _status(value: Any) -> Optional[str]:
+    return getattr(value, "value", value)
+
+def dashboard_message(event: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Describe a booking event for the dashboard, with its counter deltas.
+
+    Returns:
+        Dict with "type" (created, paid, cancelled, completed, rescheduled or
+        status_changed), "booking_id" and "deltas" keyed like /api/dashboard
+    """
+    message = {"booking_id": payload.get("booking_id"), "deltas": {}}
+    deltas = message["deltas"]
+
+    if event == events.BOOKING_CREATED:
+        message["type"] = "created"
+        deltas["total_bookings"] = 1
+        booking_date = payload.get("booking_date")
+        if isinstance(booking_date, str):
+            booking_date = datetime.fromisoformat(booking_date)
+        if booking_date and booking_date.date() == date.today():
+            deltas["today_bookings"] = 1
+        if _status(payload.get("status")) == BookingStatus.PAYMENT_PENDING.value:
+            deltas["pending_payments"] = 1
+
+    elif event == events.BOOKING_STATUS_CHANGED:
+        old_status, new_status = _status(payload.get("old_status")), _status(payload.get("new_status"))
+        if new_status == BookingStatus.CONFIRMED.value and old_status == BookingStatus.PAYMENT_PENDING.value:
+            message["type"] = "paid"
+        elif new_status in (BookingStatus.CANCELLED.value, BookingStatus.COMPLETED.value):
+            message["type"] = new_status
+        else:
+            message["type"] = "status_changed"
+        message["status"] = new_status
+
+        pending = (new_status == BookingStatus.PAYMENT_PENDING.value) - (old_status == BookingStatus.PAYMENT_PENDING.value)
+        if pending:
+            deltas["pending_payments"] = pending
+
+    else:
+        message["type"] = "rescheduled"
+
+    return message
+
+def format_sse(message: Dict[str, Any]) -> str:
+    """Encode a message as a Server-Sent Events frame."""
+    return f"data: {json.dumps(message, default=_json_default)}\n\n"
+
+def _relay_handler(event: str):
+    async def relay(**payload: Any) -> None:
+        # Events received from Redis are already on the channel
+        if payload.get("remote"):
+            return
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.publish(
+                LIVE_CHANNEL,
+                json.dumps({"event": event, "payload": payload}, default=_json_default)
+            )
+        except Exception as e:
+            logger.warning(f"Couldn't relay {event} to Redis: {e}")
+    return relay
+
+_relay_handlers = {event: _relay_handler(event) for event in LIVE_EVENTS}
+
+def start_event_relay() -> bool:
+    """
+    Forward this process's booking events to LIVE_CHANNEL.
+    Called by the bot so an admin panel in another process sees its changes.
+
+    Returns:
+        True if Redis is enabled and the relay was started
+    """
+    if get_redis() is None:
+        return False
+    for event, handler in _relay_handlers.items():
+        events.subscribe(event, handler)
+    return True
+
+async def listen_relayed_events(redis) -> None:
+    """Republish events from LIVE_CHANNEL on the local event bus, until cancelled."""
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(LIVE_CHANNEL)
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                data = json.loads(item["data"])
+                events.publish(data["event"], remote=True, **data["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Lost the Redis subscription to {LIVE_CHANNEL}, retrying: {e}")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.close()
+
+def start_relay_listener_thread() -> bool:
+    """
+    Republish relayed events from a daemon thread with its own event loop.
+    Called by the Flask admin, which has no event loop to listen from.
+
+    Returns:
+        True if Redis is enabled and the listener was started
+    """
+    if get_redis() is None:
+        return False
+    thread = threading.Thread(
+        target=lambda: asyncio.run(listen_relayed_events(create_redis())),
+        name="booking-events-listener",
+        daemon=True
+    )
+    thread.start()
+    return True
+
+class LiveFeed:
+    """Fans booking events out to every connected dashboard."""
+
+    def __init__(self):
+        self._clients: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._handlers = {event: self._handler(event) for event in LIVE_EVENTS}
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def start(self) -> None:
+        """Start delivering events. Must be called from the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        for event in LIVE_EVENTS:
+            events.subscribe(event, self._handlers[event])
+
+        if get_redis() is not None and self._listener is None:
+            self._listener = self._loop.create_task(listen_relayed_events(get_redis()))
+
+    async def stop(self) -> None:
+        """Stop delivering events."""
+        for event in LIVE_EVENTS:
+            events.unsubscribe(event, self._handlers[event])
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    def connect(self) -> asyncio.Queue:
+        """Register a dashboard; its messages arrive on the returned queue."""
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self._clients.add(queue)
+        return queue
+
+    def disconnect(self, queue: asyncio.Queue) -> None:
+        """Unregister a dashboard added with `connect`."""
+        self._clients.discard(queue)
+
+    def _handler(self, event: str):
+        def handler(**payload: Any) -> None:
+            if self._loop is None or not self._clients:
+                return
+            message = dashboard_message(event, payload)
+            # Events can be published from worker threads, queues are only safe on the loop
+            self._loop.call_soon_threadsafe(self._broadcast, message)
+        return handler
+
+    def _broadcast(self, message: Dict[str, Any]) -> None:
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A slow dashboard missed events, so its counters can't be patched any more
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+# Shared by the admin panel
+live_feed = LiveFeed()
@@ -0,0 +1,204 @@
+"""
+Outbound message scheduler for the Telegram bot.
+Sends queued messages in the background within Telegram's rate limits.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lower values are sent first
+PRIORITY_USER = 0
+PRIORITY_ADMIN = 10
+
+# Telegram limits: about 30 messages per second overall, 1 per second per chat
+GLOBAL_RATE = 30
+PER_CHAT_INTERVAL = 1.0
+
+# Attempts for a message that keeps hitting flood control
+MAX_ATTEMPTS = 5
+
+class TokenBucket:
+    """Token bucket rate limiter."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take a token if one is available.
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class MessageScheduler:
+    """
+    Priority queue of outbound messages drained by a single background task.
+
+    Callers enqueue and return immediately. The worker picks the highest
+    priority message whose chat is allowed to receive another message,
+    respects the global rate and backs off on RetryAfter.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, per_chat_interval: float = PER_CHAT_INTERVAL):
+        self.per_chat_interval = per_chat_interval
+        self._bucket = TokenBucket(global_rate)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._chat_ready_at: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._queue_gauge = metrics.gauge("message_queue.size")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot: Bot) -> None:
+        """Start the background sender for a bot instance."""
+        self._bot = bot
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Give queued messages a moment to go out, then stop the sender."""
+        deadline = time.monotonic() + drain_timeout
+        while self._heap and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if self._heap:
+            logger.warning(f"Message queue stopped with {len(self._heap)} unsent messages")
+
+    def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_USER, **kwargs: Any) -> None:
+        """
+        Queue a message for sending.
+
+        Args:
+            chat_id: Telegram chat ID
+            text: Message text
+            priority: PRIORITY_USER or PRIORITY_ADMIN
+            **kwargs: Extra arguments for Bot.send_message (parse_mode, reply_markup, ...)
+        """
+        if not self.running:
+            logger.warning("Message queue is not running, message will wait until it starts")
+
+        message = {"chat_id": chat_id, "text": text, "kwargs": kwargs, "attempts": 0}
+        heapq.heappush(self._heap, (priority, next(self._seq), message))
+        self._queue_gauge.set(len(self._heap))
+        self._wakeup.set()
+
+    def _next_message(self) -> tuple:
+        """
+        Pop the highest priority message whose chat can receive it now.
+
+        Returns:
+            Tuple of (entry, seconds to wait); entry is None if nothing is ready
+        """
+        now = time.monotonic()
+        skipped = []
+        entry = None
+
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if self._chat_ready_at.get(candidate[2]["chat_id"], 0) <= now:
+                entry = candidate
+                break
+            skipped.append(candidate)
+
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+
+        if entry is not None:
+            return entry, 0.0
+
+        wait = min((self._chat_ready_at[item[2]["chat_id"]] - now for item in skipped), default=None)
+        return None, wait
+
+    async def _run(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            entry, wait = self._next_message()
+            if entry is None:
+                # Every queued message is for a chat that was messaged too recently
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = self._bucket.take()
+            if wait > 0:
+                heapq.heappush(self._heap, entry)
+                await asyncio.sleep(wait)
+                continue
+
+            await self._deliver(entry)
+            self._queue_gauge.set(len(self._heap))
+
+    async def _deliver(self, entry: tuple) -> None:
+        priority, seq, message = entry
+        chat_id = message["chat_id"]
+        self._chat_ready_at[chat_id] = time.monotonic() + self.per_chat_interval
+
+        try:
+            await self._bot.send_message(chat_id=chat_id, text=message["text"], **message["kwargs"])
+            metrics.counter("message_queue.sent").inc()
+        except TelegramRetryAfter as e:
+            message["attempts"] += 1
+            logger.warning(f"Flood control hit sending to {chat_id}, retrying in {e.retry_after}s")
+            metrics.counter("message_queue.retry_after").inc()
+            self._paused_until = time.monotonic() + e.retry_after
+
+            if message["attempts"] < MAX_ATTEMPTS:
+                heapq.heappush(self._heap, entry)
+            else:
+                logger.error(f"Dropping message to {chat_id} after {message['attempts']} attempts")
+        except Exception as e:
+            logger.exception(f"Failed to send message to {chat_id}: {e}")
+            metrics.counter("message_queue.failed").inc()
+
+        # Forget chats that can already receive again so the map doesn't grow forever
+        if len(self._chat_ready_at) > 10000:
+            now = time.monotonic()
+            self._chat_ready_at = {c: t for c, t in self._chat_ready_at.items() if t > now}
+
+# Shared scheduler used by the whole bot
+message_scheduler = MessageScheduler()
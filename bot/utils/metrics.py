@@ -0,0 +1,113 @@
+"""
+Lightweight in-process metrics (counters, gauges and histograms).
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+
+class Counter:
+    """Monotonically increasing counter."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with _lock:
+            self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+class Gauge:
+    """Value that can go up and down."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+class Histogram:
+    """Bucketed distribution of observed values."""
+
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        with _lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))
+        }
+
+_metrics: Dict[str, object] = {}
+
+def _get_or_create(name: str, factory):
+    metric = _metrics.get(name)
+    if metric is None:
+        with _lock:
+            metric = _metrics.setdefault(name, factory())
+    return metric
+
+def counter(name: str) -> Counter:
+    """Get or create a counter."""
+    return _get_or_create(name, lambda: Counter(name))
+
+def gauge(name: str) -> Gauge:
+    """Get or create a gauge."""
+    return _get_or_create(name, lambda: Gauge(name))
+
+def histogram(name: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a histogram."""
+    return _get_or_create(name, lambda: Histogram(name, buckets))
+
+def snapshot(prefix: str = "") -> Dict[str, object]:
+    """
+    Get the current value of every metric.
+
+    Args:
+        prefix: Only include metrics whose name starts with this prefix
+
+    Returns:
+        Dictionary mapping metric names to their values
+    """
+    return {
+        name: metric.snapshot()
+        for name, metric in sorted(_metrics.items())
+        if name.startswith(prefix)
+    }
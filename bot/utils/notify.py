@@ -5,15 +5,31 @@ import logging
 from datetime import datetime
 from typing import List, Optional
 
-from aiogram import Bot
 from aiogram import enums
 
 from bot.config import ADMIN_IDS
-from bot.database import Session, Booking, User, Staff
+from bot.database import sync_session, Booking, User, Staff
 from bot.utils.calendar import format_date_for_user
+from bot.utils.message_queue import message_scheduler, PRIORITY_ADMIN
 
 logger = logging.getLogger(__name__)
 
+def send_to_admins(message: str) -> None:
+    """
+    Queue an HTML message for every admin.
+    Messages go out through the rate-limited scheduler, so this never blocks the caller.
+    
+    Args:
+        message: HTML formatted message text
+    """
+    for admin_id in ADMIN_IDS:
+        message_scheduler.send_message(
+            chat_id=admin_id,
+            text=message,
+            priority=PRIORITY_ADMIN,
+            parse_mode=enums.ParseMode.HTML
+        )
+
 async def notify_admin_about_booking(booking: Booking) -> None:
     """
     Notify admins about a new booking.
@@ -25,7 +41,7 @@ async def notify_admin_about_booking(booking: Booking) -> None:
         logger.warning("No admin IDs configured, skipping admin notification")
         return
     
-    session = Session()
+    session = sync_session()
     try:
         # Get user and staff
         user = session.query(User).filter(User.id == booking.user_id).first()
@@ -51,19 +67,8 @@ async def notify_admin_about_booking(booking: Booking) -> None:
         if booking.zoom_join_url:
             message += f"<b>Zoom Link:</b> {booking.zoom_join_url}\n"
         
-        # Get bot instance
-        bot = Bot.get_current()
-        
-        # Send notification to all admins
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=message,
-                    parse_mode=enums.ParseMode.HTML
-                )
-            except Exception as e:
-                logger.exception(f"Failed to send notification to admin {admin_id}: {e}")
+        # Queue notification for all admins
+        send_to_admins(message)
     
     except Exception as e:
         logger.exception(f"Error notifying admins about booking: {e}")
@@ -82,7 +87,7 @@ async def notify_admin_about_reschedule(booking: Booking, old_date: datetime) ->
         logger.warning("No admin IDs configured, skipping admin notification")
         return
     
-    session = Session()
+    session = sync_session()
     try:
         # Get user and staff
         user = session.query(User).filter(User.id == booking.user_id).first()
@@ -105,19 +110,8 @@ async def notify_admin_about_reschedule(booking: Booking, old_date: datetime) ->
             f"<b>New Time:</b> {booking.booking_date.strftime('%H:%M')}\n"
         )
         
-        # Get bot instance
-        bot = Bot.get_current()
-        
-        # Send notification to all admins
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=message,
-                    parse_mode=enums.ParseMode.HTML
-                )
-            except Exception as e:
-                logger.exception(f"Failed to send notification to admin {admin_id}: {e}")
+        # Queue notification for all admins
+        send_to_admins(message)
     
     except Exception as e:
         logger.exception(f"Error notifying admins about reschedule: {e}")
@@ -135,7 +129,7 @@ async def notify_admin_about_cancellation(booking: Booking) -> None:
         logger.warning("No admin IDs configured, skipping admin notification")
         return
     
-    session = Session()
+    session = sync_session()
     try:
         # Get user and staff
         user = session.query(User).filter(User.id == booking.user_id).first()
@@ -156,19 +150,8 @@ async def notify_admin_about_cancellation(booking: Booking) -> None:
             f"<b>Time:</b> {booking.booking_date.strftime('%H:%M')}\n"
         )
         
-        # Get bot instance
-        bot = Bot.get_current()
-        
-        # Send notification to all admins
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=message,
-                    parse_mode=enums.ParseMode.HTML
-                )
-            except Exception as e:
-                logger.exception(f"Failed to send notification to admin {admin_id}: {e}")
+        # Queue notification for all admins
+        send_to_admins(message)
     
     except Exception as e:
         logger.exception(f"Error notifying admins about cancellation: {e}")
@@ -0,0 +1,131 @@
+"""
+Keyset (cursor) pagination for booking lists in the admin panels.
+
+Pages are fetched with `WHERE (booking_date, id) < cursor` instead of OFFSET,
+so a deep page costs the same as the first one. Totals are counted at most
+once per COUNT_CACHE_TTL seconds per filter combination.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+# How long a total count is reused (in seconds)
+COUNT_CACHE_TTL = 60
+
+_count_cache: Dict[Hashable, Tuple[int, float]] = {}
+
+def encode_cursor(booking_date: datetime, booking_id: int) -> str:
+    """Encode a row position as a URL-safe cursor, e.g. "20240131T093000000000-42"."""
+    return f"{booking_date:%Y%m%dT%H%M%S%f}-{booking_id}"
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    Decode a cursor created by `encode_cursor`.
+
+    Returns:
+        Tuple of (booking_date, id), or None if the cursor is missing or invalid
+    """
+    if not cursor:
+        return None
+    try:
+        date_part, id_part = cursor.rsplit("-", 1)
+        return datetime.strptime(date_part, "%Y%m%dT%H%M%S%f"), int(id_part)
+    except ValueError:
+        return None
+
+class KeysetPage:
+    """One page of results plus the cursors to its neighbours."""
+
+    def __init__(self, items: List[Any], next_cursor: Optional[str], prev_cursor: Optional[str], total: Optional[int]):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+def cached_count(query, cache_key: Hashable, ttl: float = COUNT_CACHE_TTL) -> int:
+    """
+    Count the rows of a query, reusing a recent result for the same key.
+
+    Args:
+        query: SQLAlchemy ORM query
+        cache_key: Hashable description of the query's filters
+        ttl: Seconds a count may be reused
+    """
+    cached = _count_cache.get(cache_key)
+    now = time.monotonic()
+    if cached and cached[1] > now:
+        return cached[0]
+
+    total = query.order_by(None).count()
+    _count_cache[cache_key] = (total, now + ttl)
+
+    # Drop expired entries so rarely used filters don't pile up
+    if len(_count_cache) > 1000:
+        for key in [key for key, (_, expires) in _count_cache.items() if expires <= now]:
+            del _count_cache[key]
+    return total
+
+def paginate_bookings(
+    query,
+    model,
+    per_page: int = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    count_key: Optional[Hashable] = None
+) -> KeysetPage:
+    """
+    Get one page of bookings, newest first, using keyset pagination.
+
+    Args:
+        query: Filtered ORM query over `model` (without ORDER BY/LIMIT)
+        model: Booking model class of the query (bot or Flask models)
+        per_page: Rows per page
+        after: Cursor of the last row of the previous page (go forward)
+        before: Cursor of the first row of the next page (go back)
+        count_key: Cache key for the total; None skips counting
+
+    Returns:
+        KeysetPage with the rows and neighbour cursors
+    """
+    base_query = query
+    key = tuple_(model.booking_date, model.id)
+    after_position = decode_cursor(after)
+    before_position = decode_cursor(before)
+
+    if before_position:
+        # Walk backwards in ascending order, then flip the rows back
+        rows = (
+            query.filter(key > tuple_(*before_position))
+            .order_by(model.booking_date.asc(), model.id.asc())
+            .limit(per_page + 1)
+            .all()
+        )
+        has_more_before = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more_before, True
+    else:
+        if after_position:
+            query = query.filter(key < tuple_(*after_position))
+        rows = (
+            query.order_by(model.booking_date.desc(), model.id.desc())
+            .limit(per_page + 1)
+            .all()
+        )
+        items = rows[:per_page]
+        has_prev, has_next = after_position is not None, len(rows) > per_page
+
+    next_cursor = encode_cursor(items[-1].booking_date, items[-1].id) if items and has_next else None
+    prev_cursor = encode_cursor(items[0].booking_date, items[0].id) if items and has_prev else None
+    total = cached_count(base_query, count_key) if count_key is not None else None
+
+    return KeysetPage(items, next_cursor, prev_cursor, total)
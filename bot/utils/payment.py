@@ -1,8 +1,12 @@
 """
 Payment integration with Telegram Payments API and Click.uz provider.
 """
+import asyncio
+import json
 import logging
 import os
+import time
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, Tuple
 
 from aiogram import Bot
@@ -14,9 +18,24 @@ logger = logging.getLogger(__name__)
 # Import payment token from config
 from bot.config import PAYMENT_PROVIDER_TOKEN
 
+from bot.utils.cache import get_redis
+from bot.utils import events, metrics
+
 # Use the token from config, which already handles environment variables
 CLICK_PAYMENT_TOKEN = PAYMENT_PROVIDER_TOKEN
 
+# Largest tip a user can add to an invoice (in smallest currency unit)
+MAX_TIP_AMOUNT = 5000
+
+# How long an "invoice issued" record is kept for pre-checkout validation (in seconds)
+INVOICE_RECORD_TTL = 24 * 60 * 60
+
+# Local fallback for invoice records when Redis is not used: booking_id -> (amount, expiry)
+_issued_invoices: Dict[int, Tuple[int, float]] = {}
+
+# Invoice links being created, so a prefetch and a tap on "pay" share one API call
+_invoice_link_tasks: Dict[int, asyncio.Task] = {}
+
 # Log which token we're using (test or live)
 if CLICK_PAYMENT_TOKEN and "TEST" in CLICK_PAYMENT_TOKEN:
     logging.info("Using Telegram Payments TEST mode")
@@ -72,7 +91,7 @@ async def create_invoice(bot: Bot, chat_id: int, booking_id: int, amount: int,
             provider_token=CLICK_PAYMENT_TOKEN,
             currency="UZS",  # Uzbekistan Som
             prices=prices,
-            max_tip_amount=5000,  # Optional tip, 50 UZS max
+            max_tip_amount=MAX_TIP_AMOUNT,  # Optional tip, 50 UZS max
             suggested_tip_amounts=[500, 1000, 2000],  # Suggested tip amounts
             start_parameter=f"booking_{booking_id}",
             provider_data=None,
@@ -95,15 +114,164 @@ async def create_invoice(bot: Bot, chat_id: int, booking_id: int, amount: int,
             request_timeout=None
         )
         
+        # Remember the invoice so the pre-checkout query can be answered quickly
+        await remember_issued_invoice(booking_id, amount)
+        
         return result
     except Exception as e:
         logger.exception(f"Error creating payment invoice: {e}")
         return None
 
+def _cached_invoice_link(booking, amount: int) -> Optional[str]:
+    """Get the stored invoice link of a booking if it is unexpired and for the same amount."""
+    if (
+        booking.invoice_url
+        and booking.invoice_amount == amount
+        and booking.invoice_expires_at
+        and booking.invoice_expires_at > datetime.utcnow()
+    ):
+        return booking.invoice_url
+    return None
+
+async def _create_invoice_link(bot: Bot, booking, amount: int, description: str, title: str) -> Optional[str]:
+    """Create an invoice link with the Bot API and store it on the booking."""
+    from bot.database import set_booking_invoice_link_async
+    
+    booking_id = booking.id
+    try:
+        invoice_link = await bot.create_invoice_link(
+            title=title,
+            description=description,
+            payload=f"booking:{booking_id}",
+            provider_token=CLICK_PAYMENT_TOKEN,
+            currency="UZS",  # Uzbekistan Som
+            prices=[LabeledPrice(label="Appointment", amount=amount)],
+            max_tip_amount=MAX_TIP_AMOUNT,
+            suggested_tip_amounts=[500, 1000, 2000]
+        )
+    except Exception as e:
+        logger.exception(f"Error creating invoice link for booking {booking_id}: {e}")
+        return None
+    
+    metrics.counter("payments.invoice_link.created").inc()
+    expires_at = datetime.utcnow() + timedelta(seconds=INVOICE_RECORD_TTL)
+    await set_booking_invoice_link_async(booking_id, invoice_link, amount, expires_at)
+    await remember_issued_invoice(booking_id, amount)
+    
+    # Keep the caller's copy in sync so it sees the link without reloading
+    booking.invoice_url = invoice_link
+    booking.invoice_amount = amount
+    booking.invoice_expires_at = expires_at
+    return invoice_link
+
+def prefetch_invoice_link(bot: Bot, booking, amount: int, description: str,
+                          title: str = "Appointment Booking") -> Optional[asyncio.Task]:
+    """
+    Start creating a booking's invoice link in the background.
+    Does nothing if a valid link is already stored or being created.
+    
+    Args:
+        bot: Telegram Bot instance
+        booking: Booking to create the link for
+        amount: Payment amount in smallest currency unit
+        description: Description of the payment
+        title: Title of the invoice
+        
+    Returns:
+        Task creating the link, or None if a stored link can be used
+    """
+    if _cached_invoice_link(booking, amount):
+        return None
+    
+    booking_id = booking.id
+    task = _invoice_link_tasks.get(booking_id)
+    if task is None:
+        task = asyncio.create_task(_create_invoice_link(bot, booking, amount, description, title))
+        _invoice_link_tasks[booking_id] = task
+        task.add_done_callback(lambda done: _invoice_link_tasks.pop(booking_id, None))
+    return task
+
+async def get_invoice_link(bot: Bot, booking, amount: int, description: str,
+                           title: str = "Appointment Booking") -> Optional[str]:
+    """
+    Get a payment link for a booking.
+    
+    The link stored on the booking is reused until it expires or the amount
+    changes, so showing it again costs no Bot API call. Otherwise the link
+    started by `prefetch_invoice_link` is awaited, or a new one is created.
+    
+    Args:
+        bot: Telegram Bot instance
+        booking: Booking to pay for
+        amount: Payment amount in smallest currency unit
+        description: Description of the payment
+        title: Title of the invoice
+        
+    Returns:
+        Invoice link or None if it couldn't be created
+    """
+    cached = _cached_invoice_link(booking, amount)
+    if cached:
+        metrics.counter("payments.invoice_link.reused").inc()
+        return cached
+    
+    task = prefetch_invoice_link(bot, booking, amount, description, title)
+    # Shield the shared task so a cancelled handler doesn't cancel it for others
+    return await asyncio.shield(task)
+
+async def remember_issued_invoice(booking_id: int, amount: int) -> None:
+    """
+    Record that an invoice was issued for a booking.
+    
+    Args:
+        booking_id: Booking ID
+        amount: Invoiced amount in smallest currency unit
+    """
+    redis = get_redis()
+    if redis is not None:
+        try:
+            await redis.set(f"invoice:booking:{booking_id}", json.dumps({"amount": amount}), ex=INVOICE_RECORD_TTL)
+            return
+        except Exception as e:
+            logger.warning(f"Could not store invoice record in Redis: {e}")
+    
+    _issued_invoices[booking_id] = (amount, time.time() + INVOICE_RECORD_TTL)
+
+async def get_issued_invoice_amount(booking_id: int) -> Optional[int]:
+    """
+    Get the amount of the invoice issued for a booking.
+    
+    Returns:
+        Invoiced amount or None if no record is known
+    """
+    redis = get_redis()
+    if redis is not None:
+        try:
+            raw = await redis.get(f"invoice:booking:{booking_id}")
+            if raw:
+                return json.loads(raw)["amount"]
+        except Exception as e:
+            logger.warning(f"Could not read invoice record from Redis: {e}")
+    
+    record = _issued_invoices.get(booking_id)
+    if record and record[1] > time.time():
+        return record[0]
+    
+    _issued_invoices.pop(booking_id, None)
+    return None
+
+def _amount_matches(total_amount: int, amount: int) -> bool:
+    """Check a paid total against the invoiced amount, allowing for a tip."""
+    return amount <= total_amount <= amount + MAX_TIP_AMOUNT
+
 async def process_pre_checkout(pre_checkout_query: PreCheckoutQuery) -> bool:
     """
     Process a pre-checkout query from Telegram Payments API.
     
+    Telegram only waits 10 seconds for the answer, so validation is a single
+    conditional UPDATE (booking still pending -> payment pending) plus an
+    amount check against the recorded invoice, without loading the booking.
+    
     Args:
         pre_checkout_query: Pre-checkout query object
         
@@ -111,7 +279,7 @@ async def process_pre_checkout(pre_checkout_query: PreCheckoutQuery) -> bool:
         True if successful, False otherwise
     """
     try:
-        from bot.database import get_booking_by_id_async, update_booking_payment_pending_async
+        from bot.database import mark_booking_payment_pending_async
         
         # Extract booking ID from payload
         payload = pre_checkout_query.invoice_payload
@@ -121,51 +289,76 @@ async def process_pre_checkout(pre_checkout_query: PreCheckoutQuery) -> bool:
             return False
         
         booking_id = int(payload.split(":")[1])
+        total_amount = pre_checkout_query.total_amount
         
-        # Verify the booking exists and is in a valid state
-        booking = await get_booking_by_id_async(booking_id)
-        if not booking:
-            logger.error(f"Booking {booking_id} not found during pre-checkout")
+        # Reject amounts that don't match the issued invoice before touching the database
+        invoiced_amount = await get_issued_invoice_amount(booking_id)
+        if invoiced_amount is not None and not _amount_matches(total_amount, invoiced_amount):
+            logger.error(f"Pre-checkout amount {total_amount} doesn't match invoice for booking {booking_id}")
             return False
-            
-        # Update booking status to payment_pending
-        result = await update_booking_payment_pending_async(booking_id, payload)
-        if not result:
-            logger.error(f"Failed to update booking {booking_id} status to payment_pending")
+        
+        # Verify the booking is in a valid state and mark it as payment pending in one statement
+        price = await mark_booking_payment_pending_async(booking_id, payload)
+        if price is None:
+            logger.error(f"Booking {booking_id} not found or no longer payable during pre-checkout")
+            return False
+        
+        if invoiced_amount is None and not _amount_matches(total_amount, price):
+            logger.error(f"Pre-checkout amount {total_amount} doesn't match price of booking {booking_id}")
             return False
             
         # At this point, the booking is valid and ready to accept payment
-        logger.info(f"Pre-checkout validated for booking {booking_id}")
         return True
     except Exception as e:
         logger.exception(f"Error processing pre-checkout: {e}")
         return False
 
-async def process_successful_payment(booking_id: int, telegram_payment_charge_id: str) -> bool:
+async def process_successful_payment(
+    booking_id: int,
+    telegram_payment_charge_id: str,
+    total_amount: int = None,
+    currency: str = None
+) -> Optional[bool]:
     """
     Process a successful payment from Telegram Payments API.
     
+    The payment is recorded in the ledger and the booking confirmed in one
+    transaction, so a payment Telegram redelivers is recognised and one whose
+    processing failed is processed again on redelivery.
+    
     Args:
         booking_id: Booking ID
         telegram_payment_charge_id: Telegram payment charge ID
+        total_amount: Amount paid, in the smallest currency unit
+        currency: Currency code
         
     Returns:
-        True if successful, False otherwise
+        True if successful, None if the payment was already processed, False otherwise
     """
     try:
-        from bot.database import update_booking_payment_completed_async
+        from bot.database import BookingStatus, record_payment_async, get_booking_by_id_async
         
         logger.info(f"Payment successful for booking {booking_id}: {telegram_payment_charge_id}")
         
-        # Update booking status in database
-        result = await update_booking_payment_completed_async(
+        old_status = await record_payment_async(
+            telegram_payment_charge_id=telegram_payment_charge_id,
             booking_id=booking_id,
-            payment_id=telegram_payment_charge_id
+            total_amount=total_amount,
+            currency=currency
         )
         
-        if not result:
+        if old_status is None:
+            if await get_booking_by_id_async(booking_id):
+                return None
             logger.error(f"Failed to update booking {booking_id} status after payment")
             return False
+        
+        events.publish(
+            events.BOOKING_STATUS_CHANGED,
+            booking_id=booking_id,
+            old_status=old_status,
+            new_status=BookingStatus.CONFIRMED
+        )
             
         # Return True to indicate success
         return True
@@ -228,8 +421,7 @@ async def process_refund(bot: Bot, booking_id: int) -> bool:
         True if successful, False otherwise
     """
     try:
-        from bot.database import get_booking_by_id_async, update_booking_status_async
-        from models import BookingStatus
+        from bot.database import BookingStatus, get_booking_by_id_async, update_booking_status_async
         
         # Get booking details
         booking = await get_booking_by_id_async(booking_id)
@@ -248,6 +440,13 @@ async def process_refund(bot: Bot, booking_id: int) -> bool:
             logger.error(f"Failed to update booking status for refund: {booking_id}")
             return False
             
+        events.publish(
+            events.BOOKING_STATUS_CHANGED,
+            booking_id=booking_id,
+            old_status=BookingStatus.CONFIRMED,
+            new_status=BookingStatus.CANCELLED
+        )
+            
         # Notify user about refund
         try:
             await bot.send_message(
@@ -0,0 +1,43 @@
+"""
+Counts the SQL statements executed on an engine.
+Used to catch N+1 queries: a page should run a fixed number of statements
+no matter how many rows it shows.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class StatementCounter:
+    """The statements seen while a `count_statements` block was active."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+@contextmanager
+def count_statements(engine: Engine) -> Iterator[StatementCounter]:
+    """
+    Count the statements executed on an engine inside a `with` block.
+
+    Example:
+        with count_statements(engine) as counter:
+            client.get("/bookings")
+        assert counter.count <= 4, counter.statements
+
+    Args:
+        engine: Engine (or Flask-SQLAlchemy `db.engine`) to watch
+    """
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._record)
@@ -0,0 +1,105 @@
+"""
+Cached "recent bookings" rows of the admin dashboard.
+
+Every open dashboard polls the rows and reloads them on each live event,
+but they only change when a booking is added or changes. The rendered rows
+are memoized by the latest booking id, the latest bookings.updated_at and a
+version that booking events bump, so identical polls cost two index lookups
+and return the cached bytes. New bookings and updates made by any process
+(e.g. the bot without Redis) change the key on the next poll. Only changes
+the key can't see, like a second update of a booking within the same
+timestamp resolution or a deleted booking, wait for an event or for
+RECENT_BOOKINGS_CACHE_TTL seconds.
+"""
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from bot.utils import events, metrics
+
+# Rows shown on the dashboard
+RECENT_BOOKINGS_LIMIT = 5
+
+# Longest a rendering is reused without a matching event (in seconds)
+RECENT_BOOKINGS_CACHE_TTL = 30
+
+# Rendering takes well under the default latency buckets
+RENDER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+def change_key_query(booking_model):
+    """
+    Latest booking id and update time, as separate subqueries so each is
+    answered from its index (a combined SELECT of both aggregates scans).
+    """
+    return select(
+        select(func.max(booking_model.id)).scalar_subquery(),
+        select(func.max(booking_model.updated_at)).scalar_subquery()
+    )
+
+class RecentBookings:
+    """Rendered recent bookings rows, keyed by (latest id, latest update, event version)."""
+
+    def __init__(self, ttl: float = RECENT_BOOKINGS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._status_version = 0
+        self._key: Optional[Tuple[Any, Any, int]] = None
+        self._html = b""
+        self._expires_at = 0.0
+
+        self._render_histogram = metrics.histogram("admin.recent_bookings.render_seconds", RENDER_BUCKETS)
+        self._hits = metrics.counter("admin.recent_bookings.cache_hits")
+        self._misses = metrics.counter("admin.recent_bookings.cache_misses")
+
+        for event in (events.BOOKING_CREATED, events.BOOKING_STATUS_CHANGED, events.BOOKING_RESCHEDULED):
+            events.subscribe(event, self.invalidate)
+
+    def render(self, session, booking_model, render_rows: Callable[[List[Any]], str]) -> bytes:
+        """
+        Get the rendered rows, querying and rendering only if they changed.
+
+        Args:
+            session: SQLAlchemy session
+            booking_model: Booking model class
+            render_rows: Renders the table rows for a list of bookings
+
+        Returns:
+            UTF-8 encoded HTML
+        """
+        latest_id, latest_update = session.execute(change_key_query(booking_model)).one()
+
+        with self._lock:
+            key = (latest_id, latest_update, self._status_version)
+            if key == self._key and time.monotonic() < self._expires_at:
+                self._hits.inc()
+                return self._html
+        self._misses.inc()
+
+        bookings = session.execute(
+            select(booking_model)
+            .options(joinedload(booking_model.user), joinedload(booking_model.staff))
+            .order_by(booking_model.created_at.desc())
+            .limit(RECENT_BOOKINGS_LIMIT)
+        ).scalars().all()
+
+        started = time.perf_counter()
+        html = render_rows(bookings).encode()
+        self._render_histogram.observe(time.perf_counter() - started)
+
+        with self._lock:
+            # Keyed by the version read before the query, so a change during it isn't lost
+            self._key = key
+            self._html = html
+            self._expires_at = time.monotonic() + self.ttl
+        return html
+
+    def invalidate(self, **_: Any) -> None:
+        """Make the next `render` query and render again."""
+        with self._lock:
+            self._status_version += 1
+
+# Shared by the admin panel views
+recent_bookings = RecentBookings()
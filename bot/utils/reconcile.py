@@ -0,0 +1,185 @@
+"""
+Background maintenance of booking statuses.
+Releases bookings stuck waiting for payment (they block their slot),
+finishes post-payment work that was interrupted and marks past bookings
+completed so the set of active bookings stays small.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from bot.config import (
+    PAYMENT_PENDING_TIMEOUT, PAYMENT_RECONCILE_INTERVAL, PAYMENT_RECONCILE_BATCH_SIZE, PAYMENT_FULFILLMENT_TIMEOUT,
+    BOOKING_COMPLETE_AFTER, BOOKING_COMPLETE_INTERVAL, BOOKING_COMPLETE_BATCH_SIZE
+)
+from bot.database import (
+    BookingStatus,
+    get_booking_by_id_async,
+    get_unfulfilled_paid_bookings_async,
+    get_stale_payment_pending_bookings_async,
+    resolve_stale_payment_pending_bookings_async,
+    complete_past_bookings_async
+)
+from bot.utils import events, metrics
+
+logger = logging.getLogger(__name__)
+
+async def reconcile_stale_bookings(batch_size: int = PAYMENT_RECONCILE_BATCH_SIZE) -> int:
+    """
+    Confirm or release every booking that has been payment pending for too long.
+
+    The timeout counts from when the invoice was sent or last approved at
+    pre-checkout, not from when the booking was made. Bookings are handled in
+    batches. A booking whose payment is already in the ledger (e.g. the bot
+    stopped before updating it) is confirmed and gets its post-payment work
+    done like in the payment handler; the rest are cancelled. Every settled
+    booking is published so availability caches for its staff and date can
+    be invalidated.
+
+    Args:
+        batch_size: Number of bookings settled per query
+
+    Returns:
+        Number of bookings settled
+    """
+    # Imported here so loading this module doesn't pull in the bot handlers
+    from bot.handlers.users.payment import fulfill_paid_booking_once
+
+    cutoff = datetime.now() - timedelta(minutes=PAYMENT_PENDING_TIMEOUT)
+    settled = 0
+
+    while True:
+        booking_ids = await get_stale_payment_pending_bookings_async(cutoff, limit=batch_size)
+        if not booking_ids:
+            break
+
+        confirmed, released = await resolve_stale_payment_pending_bookings_async(booking_ids)
+        metrics.counter("reconcile.bookings_confirmed").inc(len(confirmed))
+        metrics.counter("reconcile.bookings_released").inc(len(released))
+
+        for status, rows in ((BookingStatus.CONFIRMED, confirmed), (BookingStatus.CANCELLED, released)):
+            for booking_id, staff_id, booking_date in rows:
+                events.publish(
+                    events.BOOKING_STATUS_CHANGED,
+                    booking_id=booking_id,
+                    old_status=BookingStatus.PAYMENT_PENDING,
+                    new_status=status
+                )
+        for booking_id, staff_id, booking_date in released:
+            events.publish(events.AVAILABILITY_CHANGED, staff_ids=[staff_id], date=booking_date.date())
+        for booking_id, staff_id, booking_date in confirmed:
+            booking = await get_booking_by_id_async(booking_id)
+            if booking:
+                await fulfill_paid_booking_once(booking)
+
+        settled += len(confirmed) + len(released)
+
+        # A short batch means nothing older is left
+        if len(booking_ids) < batch_size:
+            break
+
+    return settled
+
+async def retry_unfinished_fulfillments(batch_size: int = PAYMENT_RECONCILE_BATCH_SIZE) -> int:
+    """
+    Run the post-payment work (Zoom, Bitrix24, notifications) of upcoming paid
+    bookings where it never finished, because a step failed or the bot
+    stopped in the middle of it.
+
+    Only claims older than PAYMENT_FULFILLMENT_TIMEOUT minutes are taken over,
+    so work that is still running in the payment handler isn't duplicated.
+
+    Args:
+        batch_size: Most bookings handled per run
+
+    Returns:
+        Number of bookings fulfilled
+    """
+    # Imported here so loading this module doesn't pull in the bot handlers
+    from bot.handlers.users.payment import fulfill_paid_booking_once
+
+    claimed_before = datetime.now() - timedelta(minutes=PAYMENT_FULFILLMENT_TIMEOUT)
+    fulfilled = 0
+
+    for booking_id in await get_unfulfilled_paid_bookings_async(claimed_before, limit=batch_size):
+        booking = await get_booking_by_id_async(booking_id)
+        if booking and await fulfill_paid_booking_once(booking, claimed_before):
+            fulfilled += 1
+
+    metrics.counter("reconcile.fulfillments_retried").inc(fulfilled)
+    return fulfilled
+
+async def stale_booking_reconciler() -> None:
+    """
+    Background task that periodically settles stale payment-pending bookings
+    and finishes interrupted post-payment work.
+    """
+    while True:
+        try:
+            settled = await reconcile_stale_bookings()
+            if settled:
+                logger.info(f"Reconciled {settled} stale payment-pending bookings")
+            fulfilled = await retry_unfinished_fulfillments()
+            if fulfilled:
+                logger.info(f"Finished post-payment work for {fulfilled} bookings")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error reconciling stale bookings: {e}")
+
+        await asyncio.sleep(PAYMENT_RECONCILE_INTERVAL)
+
+async def complete_finished_bookings(batch_size: int = BOOKING_COMPLETE_BATCH_SIZE) -> int:
+    """
+    Mark confirmed bookings that are over as completed.
+
+    Works in bounded batches so each transaction stays short, and publishes
+    every transition for downstream caches and counters.
+
+    Args:
+        batch_size: Number of bookings completed per statement
+
+    Returns:
+        Number of bookings completed
+    """
+    cutoff = datetime.now() - timedelta(minutes=BOOKING_COMPLETE_AFTER)
+    completed_total = 0
+
+    while True:
+        completed = await complete_past_bookings_async(cutoff, limit=batch_size)
+        if not completed:
+            break
+
+        metrics.counter("bookings.completed").inc(len(completed))
+        for booking_id, staff_id, booking_date in completed:
+            events.publish(
+                events.BOOKING_STATUS_CHANGED,
+                booking_id=booking_id,
+                old_status=BookingStatus.CONFIRMED,
+                new_status=BookingStatus.COMPLETED
+            )
+
+        completed_total += len(completed)
+        if len(completed) < batch_size:
+            break
+
+        # Give other tasks (and database writers) a turn between batches
+        await asyncio.sleep(0)
+
+    return completed_total
+
+async def booking_completion_worker() -> None:
+    """
+    Background task that periodically marks finished bookings completed.
+    """
+    while True:
+        try:
+            completed = await complete_finished_bookings()
+            if completed:
+                logger.info(f"Marked {completed} past bookings as completed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error completing past bookings: {e}")
+
+        await asyncio.sleep(BOOKING_COMPLETE_INTERVAL)
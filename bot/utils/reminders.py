@@ -0,0 +1,239 @@
+"""
+Appointment reminders for confirmed bookings.
+Upcoming bookings are kept in a heap ordered by reminder time, so nothing
+polls the bookings table while waiting for the next reminder.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bot.database import (
+    BookingStatus,
+    get_booking_by_id_async,
+    get_confirmed_booking_times_between_async
+)
+from bot.middlewares.i18n import _
+from bot.utils import events, metrics
+from bot.utils.message_queue import message_scheduler, PRIORITY_USER
+
+logger = logging.getLogger(__name__)
+
+# Reminders sent before each appointment
+REMINDER_OFFSETS = {
+    "24h": timedelta(hours=24),
+    "1h": timedelta(hours=1),
+}
+
+LAST_REMINDER = min(REMINDER_OFFSETS, key=REMINDER_OFFSETS.get)
+
+# How far ahead bookings are loaded; must exceed the largest offset plus the refresh interval
+REMINDER_LOOKAHEAD = timedelta(hours=48)
+
+# How often the window is reloaded, extending it and picking up changes made by other processes
+REMINDER_REFRESH_INTERVAL = 300  # Seconds
+
+# Reminders that became due at most this long ago are still sent (e.g. after a restart)
+REMINDER_GRACE = timedelta(minutes=5)
+
+REMINDER_TEXTS = {
+    "24h": (
+        "<b>Appointment Reminder</b>\n\n"
+        "You have an appointment with {staff_name} tomorrow at {time}."
+    ),
+    "1h": (
+        "<b>Appointment Reminder</b>\n\n"
+        "Your appointment with {staff_name} starts in one hour, at {time}."
+    ),
+}
+
+class ReminderScheduler:
+    """
+    Heap of pending reminders for bookings in a rolling window.
+
+    Confirmed bookings up to REMINDER_LOOKAHEAD ahead are loaded with one range
+    query, on start and again every REMINDER_REFRESH_INTERVAL. Booking events
+    update the heap in between. Changes made by other processes (e.g. the admin
+    panel) don't reach this process's events: bookings they confirm or move are
+    picked up by the next reload, and cancellations are caught by re-checking
+    the booking right before sending. Superseded heap entries are skipped
+    lazily: every booking has a version and only entries carrying the current
+    version are sent.
+    """
+
+    def __init__(self, lookahead: timedelta = REMINDER_LOOKAHEAD):
+        self.lookahead = lookahead
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._versions: Dict[int, int] = {}
+        # Appointment time each booking's reminders were scheduled for, kept after
+        # the last one is sent so a reload doesn't schedule them again
+        self._dates: Dict[int, datetime] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._scheduled_gauge = metrics.gauge("reminders.scheduled")
+
+    def schedule(self, booking_id: int, booking_date: datetime) -> None:
+        """
+        Schedule (or reschedule) the reminders for a booking.
+
+        Args:
+            booking_id: Booking ID
+            booking_date: Appointment start time
+        """
+        now = datetime.now()
+        entries = [
+            (booking_date - offset, kind)
+            for kind, offset in REMINDER_OFFSETS.items()
+            if booking_date - offset >= now - REMINDER_GRACE
+        ]
+        if not entries:
+            self.unschedule(booking_id)
+            self._dates[booking_id] = booking_date
+            return
+
+        version = next(self._seq)
+        self._versions[booking_id] = version
+        self._dates[booking_id] = booking_date
+        for send_at, kind in entries:
+            heapq.heappush(self._heap, (send_at, version, booking_id, booking_date, kind))
+
+        self._scheduled_gauge.set(len(self._versions))
+        self._wakeup.set()
+
+    def unschedule(self, booking_id: int, forget: bool = True) -> None:
+        """
+        Drop the pending reminders of a booking.
+
+        Args:
+            booking_id: Booking ID
+            forget: Also forget the appointment time, so the next reload
+                schedules the booking again if it's still confirmed
+        """
+        if forget:
+            self._dates.pop(booking_id, None)
+        if self._versions.pop(booking_id, None) is not None:
+            self._scheduled_gauge.set(len(self._versions))
+
+    async def load(self, until: datetime) -> int:
+        """
+        Load the confirmed bookings between now and `until`.
+
+        Bookings already scheduled for the same time are left alone, so a
+        reload only adds bookings that were confirmed or moved without an
+        event reaching this process.
+
+        Returns:
+            Number of bookings scheduled
+        """
+        now = datetime.now()
+        rows = await get_confirmed_booking_times_between_async(now, until)
+
+        scheduled = 0
+        for booking_id, booking_date in rows:
+            if self._dates.get(booking_id) != booking_date:
+                self.schedule(booking_id, booking_date)
+                scheduled += 1
+
+        # Appointments that have started can't be loaded again
+        self._dates = {
+            booking_id: booking_date for booking_id, booking_date in self._dates.items()
+            if booking_date > now or booking_id in self._versions
+        }
+        self._loaded_until = until
+        return scheduled
+
+    async def _on_status_changed(self, booking_id: int, new_status: BookingStatus, **payload) -> None:
+        if new_status != BookingStatus.CONFIRMED:
+            self.unschedule(booking_id)
+            return
+
+        booking = await get_booking_by_id_async(booking_id)
+        if not booking or booking.status != BookingStatus.CONFIRMED:
+            return
+        # Bookings beyond the window are picked up when it's extended
+        if self._loaded_until and booking.booking_date <= self._loaded_until:
+            self.schedule(booking.id, booking.booking_date)
+
+    async def _on_rescheduled(self, booking_id: int, **payload) -> None:
+        self.unschedule(booking_id)
+        await self._on_status_changed(booking_id, BookingStatus.CONFIRMED)
+
+    async def _send(self, booking_id: int, booking_date: datetime, kind: str) -> None:
+        """Send one reminder, after checking the booking wasn't changed by another process."""
+        booking = await get_booking_by_id_async(booking_id)
+        if not booking or booking.status != BookingStatus.CONFIRMED or booking.booking_date != booking_date:
+            logger.info(f"Skipping {kind} reminder for booking {booking_id}, booking changed")
+            return
+
+        language = booking.user.language
+        text = _(REMINDER_TEXTS[kind], language).format(
+            staff_name=booking.staff.name,
+            time=f"{booking_date.hour:02d}:{booking_date.minute:02d}"
+        )
+        if booking.zoom_join_url:
+            text += "\n\n" + _("Zoom link: {zoom_link}", language).format(zoom_link=booking.zoom_join_url)
+
+        message_scheduler.send_message(booking.user.telegram_id, text, priority=PRIORITY_USER, parse_mode="HTML")
+        metrics.counter(f"reminders.sent.{kind}").inc()
+
+    async def _send_due(self) -> None:
+        """Send every reminder whose time has come."""
+        now = datetime.now()
+        while self._heap and self._heap[0][0] <= now:
+            send_at, version, booking_id, booking_date, kind = heapq.heappop(self._heap)
+            if self._versions.get(booking_id) != version:
+                continue
+
+            # The last reminder of a booking is the one closest to the appointment
+            if kind == LAST_REMINDER:
+                self.unschedule(booking_id, forget=False)
+
+            try:
+                await self._send(booking_id, booking_date, kind)
+            except Exception as e:
+                logger.exception(f"Error sending {kind} reminder for booking {booking_id}: {e}")
+
+    async def run(self) -> None:
+        """Load the window, then send reminders as they become due."""
+        events.subscribe(events.BOOKING_STATUS_CHANGED, self._on_status_changed)
+        events.subscribe(events.BOOKING_RESCHEDULED, self._on_rescheduled)
+        next_refresh = 0.0
+
+        try:
+            while True:
+                try:
+                    if time.monotonic() >= next_refresh:
+                        loaded = await self.load(datetime.now() + self.lookahead)
+                        if loaded:
+                            logger.info(f"Scheduled reminders for {loaded} upcoming bookings")
+                        next_refresh = time.monotonic() + REMINDER_REFRESH_INTERVAL
+
+                    await self._send_due()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.exception(f"Error in reminder scheduler: {e}")
+
+                timeout = next_refresh - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            events.unsubscribe(events.BOOKING_STATUS_CHANGED, self._on_status_changed)
+            events.unsubscribe(events.BOOKING_RESCHEDULED, self._on_rescheduled)
+
+# Shared scheduler used by the bot
+reminder_scheduler = ReminderScheduler()
+
+async def reminder_worker() -> None:
+    """Background task running the shared reminder scheduler."""
+    await reminder_scheduler.run()
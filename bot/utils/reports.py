@@ -0,0 +1,373 @@
+"""
+Staff utilization, cancellation and revenue reports.
+
+Reports read staff_daily_stats, one small row per staff member and day,
+never the bookings. The rows are maintained incrementally: every
+transaction that adds, changes or deletes a booking queues that staff
+member's day in report_dirty_days (see the session listeners in
+bot.database), and `report_rollup_worker` recomputes only the queued days.
+The reports never write: `staff_report` is read-only and the admin panels
+show how many days of the range are still queued (`queued_day_count`), so
+a report can lag the bookings by up to REPORT_REFRESH_INTERVAL.
+Days before the rollups existed are loaded in chunks with:
+
+    python -m bot.utils.reports backfill --from 2024-01-01
+
+Bookings have no no-show status, so the cancellation rate stands in for the
+no-show rate.
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select
+
+from bot.config import REPORT_BACKFILL_CHUNK_DAYS, REPORT_REFRESH_BATCH_SIZE, REPORT_REFRESH_INTERVAL
+from bot.database import (
+    Booking, BookingArchive, BookingStatus, ReportDirtyDay, Staff, StaffDailyStats, StaffSchedule,
+    staff_daily_stats_upsert, sync_session, utc_now
+)
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Counters of a staff_daily_stats row
+STAT_COLUMNS = ("bookings", "pending", "confirmed", "completed", "cancelled", "booked_minutes", "revenue")
+
+# Statuses whose time is booked and whose price is earned
+BOOKED_STATUSES = (BookingStatus.CONFIRMED, BookingStatus.COMPLETED)
+
+REPORT_PERIODS = ("day", "week", "month")
+
+# Rollup rows per INSERT statement (SQLite allows at most 32766 bound parameters)
+UPSERT_BATCH_SIZE = 1000
+
+# Columns of a report row, in CSV order
+REPORT_COLUMNS = (
+    "period_start", "staff_id", "staff_name", "bookings", "completed", "cancelled", "cancellation_rate",
+    "booked_minutes", "available_minutes", "utilization", "revenue"
+)
+
+def _as_date(value: Any) -> date:
+    """func.date() returns a string on SQLite and a date on PostgreSQL."""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+def compute_daily_stats(session, start: date, end: date,
+                        staff_ids: Optional[Iterable[int]] = None) -> Dict[Tuple[int, date], Dict[str, int]]:
+    """
+    Compute the rollup counters from the bookings (and the archive) of a date range.
+
+    Args:
+        session: SQLAlchemy session
+        start: First day
+        end: Day after the last day
+        staff_ids: Limit to these staff members
+
+    Returns:
+        Counters keyed by (staff_id, day), only for days with bookings
+    """
+    stats: Dict[Tuple[int, date], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STAT_COLUMNS, 0))
+
+    # A booking is in exactly one of the tables, archiving moves it in one transaction
+    for model in (Booking, BookingArchive):
+        day = func.date(model.booking_date)
+        query = (
+            select(
+                model.staff_id,
+                day,
+                model.status,
+                func.count(),
+                func.coalesce(func.sum(model.duration_minutes), 0),
+                func.coalesce(func.sum(model.price), 0)
+            )
+            .where(model.booking_date >= _day_start(start), model.booking_date < _day_start(end))
+            .group_by(model.staff_id, day, model.status)
+        )
+        if staff_ids is not None:
+            query = query.where(model.staff_id.in_(list(staff_ids)))
+
+        for staff_id, booking_day, status, count, minutes, price in session.execute(query):
+            row = stats[(staff_id, _as_date(booking_day))]
+            row["bookings"] += count
+            if status in (BookingStatus.PENDING, BookingStatus.PAYMENT_PENDING):
+                row["pending"] += count
+            elif status == BookingStatus.CONFIRMED:
+                row["confirmed"] += count
+            elif status == BookingStatus.COMPLETED:
+                row["completed"] += count
+            elif status == BookingStatus.CANCELLED:
+                row["cancelled"] += count
+            if status in BOOKED_STATUSES:
+                row["booked_minutes"] += minutes
+                row["revenue"] += price
+
+    return dict(stats)
+
+def replace_daily_stats(session, start: date, end: date, staff_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the rollup rows of a date range (optionally only some staff) in the session's transaction.
+
+    Returns:
+        Number of rollup rows written
+    """
+    staff_ids = list(staff_ids) if staff_ids is not None else None
+    stats = compute_daily_stats(session, start, end, staff_ids)
+
+    condition = and_(StaffDailyStats.day >= start, StaffDailyStats.day < end)
+    if staff_ids is not None:
+        condition = and_(condition, StaffDailyStats.staff_id.in_(staff_ids))
+    session.execute(delete(StaffDailyStats).where(condition))
+
+    now = utc_now()
+    rows = [
+        {"staff_id": staff_id, "day": day, "updated_at": now, **counters}
+        for (staff_id, day), counters in sorted(stats.items())
+    ]
+    # Bounded statements, a backfill chunk can hold a row per staff member and day
+    dialect_name = session.get_bind().dialect.name
+    for offset in range(0, len(rows), UPSERT_BATCH_SIZE):
+        session.execute(staff_daily_stats_upsert(rows[offset:offset + UPSERT_BATCH_SIZE], dialect_name))
+    return len(rows)
+
+def refresh_queued_days(session, batch_size: int = REPORT_REFRESH_BATCH_SIZE) -> int:
+    """
+    Recompute the rollups of queued days, oldest first, in the session's transaction.
+
+    Args:
+        session: SQLAlchemy session, committed by the caller
+        batch_size: Most queued days to process
+
+    Returns:
+        Number of queued days processed
+    """
+    query = (
+        select(ReportDirtyDay.staff_id, ReportDirtyDay.day, ReportDirtyDay.marked_at)
+        .order_by(ReportDirtyDay.marked_at)
+        .limit(batch_size)
+    )
+    queued = session.execute(query).all()
+    if not queued:
+        return 0
+
+    staff_by_day: Dict[date, List[int]] = defaultdict(list)
+    for staff_id, day, _ in queued:
+        staff_by_day[day].append(staff_id)
+    for day, staff_ids in staff_by_day.items():
+        replace_daily_stats(session, day, day + timedelta(days=1), staff_ids)
+
+    # Days queued again while this ran have a newer marked_at and stay queued
+    session.execute(delete(ReportDirtyDay).where(or_(*(
+        and_(ReportDirtyDay.staff_id == staff_id, ReportDirtyDay.day == day, ReportDirtyDay.marked_at <= marked_at)
+        for staff_id, day, marked_at in queued
+    ))))
+
+    metrics.counter("reports.days_refreshed").inc(len(queued))
+    return len(queued)
+
+def queued_day_count(session, date_from: date, date_to: date) -> int:
+    """
+    Count the queued staff days of a date range, whose rollups are out of date.
+
+    Args:
+        session: SQLAlchemy session
+        date_from: First day
+        date_to: Last day (inclusive)
+    """
+    return session.execute(
+        select(func.count()).select_from(ReportDirtyDay)
+        .where(ReportDirtyDay.day >= date_from, ReportDirtyDay.day <= date_to)
+    ).scalar_one()
+
+def refresh_dirty_days(batch_size: int = REPORT_REFRESH_BATCH_SIZE) -> int:
+    """
+    Recompute the rollups of queued days, oldest first, in one transaction.
+
+    Returns:
+        Number of queued days processed
+    """
+    with sync_session() as session:
+        processed = refresh_queued_days(session, batch_size)
+        session.commit()
+    return processed
+
+async def report_rollup_worker() -> None:
+    """
+    Background task that keeps the staff report rollups up to date.
+    """
+    while True:
+        try:
+            refreshed = 0
+            while True:
+                processed = refresh_dirty_days()
+                refreshed += processed
+                if processed < REPORT_REFRESH_BATCH_SIZE:
+                    break
+                # Give other tasks (and database writers) a turn between batches
+                await asyncio.sleep(0)
+            if refreshed:
+                logger.info(f"Refreshed report rollups for {refreshed} staff days")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error refreshing report rollups: {e}")
+
+        await asyncio.sleep(REPORT_REFRESH_INTERVAL)
+
+def backfill_daily_stats(start: date, end: date, chunk_days: int = REPORT_BACKFILL_CHUNK_DAYS) -> int:
+    """
+    Rebuild the rollups of a date range from the bookings, one chunk of days per transaction.
+
+    Args:
+        start: First day
+        end: Day after the last day
+        chunk_days: Days per transaction
+
+    Returns:
+        Number of rollup rows written
+    """
+    written = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        with sync_session() as session:
+            written += replace_daily_stats(session, chunk_start, chunk_end)
+            session.commit()
+        logger.info(f"Backfilled report rollups up to {chunk_end - timedelta(days=1):%Y-%m-%d} ({written} rows)")
+        chunk_start = chunk_end
+    return written
+
+def period_start(day: date, period: str) -> date:
+    """First day of the day, week (Monday) or month containing `day`."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+def _working_minutes(session) -> Dict[int, Dict[int, int]]:
+    """Scheduled minutes per staff member and weekday."""
+    minutes: Dict[int, Dict[int, int]] = defaultdict(dict)
+    for schedule in session.execute(select(StaffSchedule).where(StaffSchedule.is_working_day.isnot(False))).scalars():
+        start_hour, start_minute = map(int, schedule.start_time.split(":"))
+        end_hour, end_minute = map(int, schedule.end_time.split(":"))
+        minutes[schedule.staff_id][schedule.weekday] = max((end_hour * 60 + end_minute) - (start_hour * 60 + start_minute), 0)
+    return minutes
+
+def staff_report(session, date_from: date, date_to: date, period: str = "month") -> List[Dict[str, Any]]:
+    """
+    Per-staff utilization, cancellations and revenue by period, from the rollups.
+    Read-only: queued days are left to `report_rollup_worker`, see `queued_day_count`.
+
+    Utilization is booked minutes over the minutes the staff member's weekly
+    schedule makes available in the period.
+
+    Args:
+        session: SQLAlchemy session
+        date_from: First day
+        date_to: Last day (inclusive)
+        period: "day", "week" or "month"
+
+    Returns:
+        Report rows (dicts keyed by REPORT_COLUMNS), by period and staff name
+    """
+    if period not in REPORT_PERIODS:
+        raise ValueError(f"Unknown report period: {period}")
+
+    end = date_to + timedelta(days=1)
+
+    rollups = session.execute(
+        select(StaffDailyStats).where(StaffDailyStats.day >= date_from, StaffDailyStats.day < end)
+    ).scalars().all()
+    staff_names = dict(session.execute(select(Staff.id, Staff.name)).all())
+    active_staff = set(session.execute(select(Staff.id).where(Staff.is_active.is_(True))).scalars())
+    working_minutes = _working_minutes(session)
+
+    totals: Dict[Tuple[date, int], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STAT_COLUMNS, 0))
+    for rollup in rollups:
+        counters = totals[(period_start(rollup.day, period), rollup.staff_id)]
+        for column in STAT_COLUMNS:
+            counters[column] += getattr(rollup, column)
+
+    # Scheduled time of every active staff member counts, booked or not
+    staff_ids = active_staff | {staff_id for _, staff_id in totals}
+    available: Dict[Tuple[date, int], int] = defaultdict(int)
+    current = date_from
+    while current < end:
+        start = period_start(current, period)
+        for staff_id in staff_ids:
+            available[(start, staff_id)] += working_minutes.get(staff_id, {}).get(current.weekday(), 0)
+        current += timedelta(days=1)
+
+    rows = []
+    for start, staff_id in set(totals) | {key for key in available if key[1] in active_staff}:
+        counters = totals[(start, staff_id)]
+        settled = counters["confirmed"] + counters["completed"] + counters["cancelled"]
+        available_minutes = available[(start, staff_id)]
+        rows.append({
+            "period_start": start,
+            "staff_id": staff_id,
+            "staff_name": staff_names.get(staff_id, f"#{staff_id}"),
+            "bookings": counters["bookings"],
+            "completed": counters["completed"],
+            "cancelled": counters["cancelled"],
+            "cancellation_rate": round(counters["cancelled"] / settled, 4) if settled else 0.0,
+            "booked_minutes": counters["booked_minutes"],
+            "available_minutes": available_minutes,
+            "utilization": round(counters["booked_minutes"] / available_minutes, 4) if available_minutes else None,
+            "revenue": counters["revenue"],
+        })
+
+    rows.sort(key=lambda row: (row["period_start"], row["staff_name"]))
+    return rows
+
+def report_range(date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[date, date]:
+    """
+    Parse the date filters of a report (YYYY-MM-DD), defaulting to the current month so far.
+
+    Raises:
+        ValueError: If a date is malformed or the range is reversed
+    """
+    today = date.today()
+    start = date.fromisoformat(date_from) if date_from else today.replace(day=1)
+    end = date.fromisoformat(date_to) if date_to else today
+    if start > end:
+        raise ValueError("date_from is after date_to")
+    return start, end
+
+def report_csv_rows(rows: List[Dict[str, Any]]) -> Iterable[Tuple[Any, ...]]:
+    """Report rows as tuples in REPORT_COLUMNS order, for bot.utils.export."""
+    return (tuple(row[column] for column in REPORT_COLUMNS) for row in rows)
+
+def _parse_day(value: str) -> date:
+    return date.fromisoformat(value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the staff report rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill", help="Rebuild the rollups of past days from the bookings")
+    backfill.add_argument("--from", dest="date_from", type=_parse_day, required=True, help="First day (YYYY-MM-DD)")
+    backfill.add_argument("--to", dest="date_to", type=_parse_day, default=date.today(),
+                          help="Last day (YYYY-MM-DD), defaults to today")
+    backfill.add_argument("--chunk-days", type=int, default=REPORT_BACKFILL_CHUNK_DAYS, help="Days per transaction")
+
+    commands.add_parser("refresh", help="Recompute the queued days now")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "backfill":
+        backfill_daily_stats(args.date_from, args.date_to + timedelta(days=1), args.chunk_days)
+    else:
+        while refresh_dirty_days() == REPORT_REFRESH_BATCH_SIZE:
+            pass
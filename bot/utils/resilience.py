@@ -0,0 +1,355 @@
+"""
+Circuit breakers, adaptive timeouts and a retry outbox for external APIs.
+Used by the Zoom, Bitrix24 and email integrations.
+"""
+import asyncio
+import enum
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from bot.config import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT,
+    EXTERNAL_TIMEOUT_MIN, EXTERNAL_TIMEOUT_MAX
+)
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per endpoint
+LATENCY_WINDOW = 100
+
+# Samples needed before the timeout adapts to observed latency
+LATENCY_MIN_SAMPLES = 10
+
+# Timeout is this multiple of the observed p95 latency
+TIMEOUT_MULTIPLIER = 3
+
+# Outbox retry settings
+OUTBOX_RETRY_INTERVAL = 15  # Seconds between outbox runs
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_MAX_SIZE = 1000
+
+class ServiceUnavailable(Exception):
+    """
+    Raised by a guarded call when the service itself failed: a transport
+    error, a timeout or a 5xx answer. Only these count as circuit failures.
+    """
+
+class CircuitState(str, enum.Enum):
+    """Enum for circuit breaker state"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class LatencyTracker:
+    """
+    Tracks recent call latencies for one endpoint and derives a timeout from them.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.histogram = metrics.histogram(f"external.{name}.latency")
+
+    def observe(self, latency: float) -> None:
+        self.samples.append(latency)
+        self.histogram.observe(latency)
+
+    def timeout(self) -> float:
+        """
+        Get the timeout for the next call, in seconds.
+
+        Until enough samples are collected the maximum timeout is used;
+        afterwards it is a multiple of the p95 latency within the configured bounds.
+        """
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return EXTERNAL_TIMEOUT_MAX
+
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return min(EXTERNAL_TIMEOUT_MAX, max(EXTERNAL_TIMEOUT_MIN, p95 * TIMEOUT_MULTIPLIER))
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one external service.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast. Once `reset_timeout` seconds have passed a single trial call is
+    let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CircuitState.CLOSED
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+        self._state_gauge = metrics.gauge(f"circuit.{name}.state")
+        self._state_gauge.set(self._state.value)
+        self._opened_counter = metrics.counter(f"circuit.{name}.opened")
+        self._half_open_counter = metrics.counter(f"circuit.{name}.half_opened")
+        self._rejected_counter = metrics.counter(f"circuit.{name}.rejected")
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Check whether a call may go through right now."""
+        with self._lock:
+            state = self.state
+            if state == CircuitState.CLOSED:
+                return True
+            if state == CircuitState.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+
+        self._rejected_counter.inc()
+        return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self._state != CircuitState.CLOSED:
+                self._transition(CircuitState.CLOSED)
+
+    def release(self) -> None:
+        """End a call without a verdict (e.g. cancelled), so the next call can be the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self._state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self._state != CircuitState.OPEN:
+                    self._transition(CircuitState.OPEN)
+
+    def _transition(self, state: CircuitState) -> None:
+        logger.warning(f"Circuit '{self.name}' changed from {self._state.value} to {state.value}")
+        self._state = state
+        self._state_gauge.set(state.value)
+        if state == CircuitState.OPEN:
+            self._opened_counter.inc()
+        elif state == CircuitState.HALF_OPEN:
+            self._half_open_counter.inc()
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+def get_breaker(service: str) -> CircuitBreaker:
+    """Get the circuit breaker for a service (e.g. "zoom")."""
+    if service not in _breakers:
+        _breakers[service] = CircuitBreaker(service)
+    return _breakers[service]
+
+def get_latency_tracker(endpoint: str) -> LatencyTracker:
+    """Get the latency tracker for an endpoint (e.g. "zoom.create_meeting")."""
+    if endpoint not in _latencies:
+        _latencies[endpoint] = LatencyTracker(endpoint)
+    return _latencies[endpoint]
+
+def get_timeout(endpoint: str) -> float:
+    """Get the current adaptive timeout for an endpoint, in seconds."""
+    return get_latency_tracker(endpoint).timeout()
+
+def get_circuit_states() -> Dict[str, str]:
+    """Get the current state of every circuit breaker."""
+    return {name: breaker.state.value for name, breaker in _breakers.items()}
+
+# Calls rejected by an open circuit, waiting to be retried
+_outbox: Deque[Dict[str, Any]] = deque(maxlen=OUTBOX_MAX_SIZE)
+
+def enqueue_outbox(service: str, endpoint: str, func: Callable, *args, **kwargs) -> None:
+    """Queue a call to be retried once the service's circuit allows it."""
+    if len(_outbox) == _outbox.maxlen:
+        logger.error(f"Outbox full, dropping oldest queued call to {_outbox[0]['endpoint']}")
+    _outbox.append({
+        "service": service,
+        "endpoint": endpoint,
+        "func": func,
+        "args": args,
+        "kwargs": kwargs,
+        "attempts": 0
+    })
+    metrics.gauge("outbox.size").set(len(_outbox))
+
+async def _call_guarded(service: str, endpoint: str, func: Callable, args, kwargs) -> Any:
+    """
+    Run a call the circuit breaker has already allowed, with the adaptive
+    timeout, and record its latency and outcome.
+
+    Raises:
+        ServiceUnavailable: If the call raised it or timed out
+    """
+    breaker = get_breaker(service)
+    tracker = get_latency_tracker(endpoint)
+    timeout = tracker.timeout()
+    started = time.monotonic()
+
+    # None until the service answered (True) or failed (False)
+    outcome = None
+    try:
+        result = await asyncio.wait_for(func(*args, **kwargs), timeout=timeout)
+        outcome = True
+    except asyncio.TimeoutError:
+        metrics.counter(f"external.{endpoint}.timeouts").inc()
+        outcome = False
+        raise ServiceUnavailable(f"timed out after {timeout:.1f}s") from None
+    except ServiceUnavailable:
+        outcome = False
+        raise
+    finally:
+        # Also runs for other errors and cancellation, which say nothing about the service
+        _record_outcome(breaker, outcome)
+
+    tracker.observe(time.monotonic() - started)
+    return result
+
+def _record_outcome(breaker: CircuitBreaker, outcome: Optional[bool]) -> None:
+    if outcome is None:
+        breaker.release()
+    elif outcome:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+async def run_outbox() -> int:
+    """
+    Retry queued calls whose circuit is closed or half-open.
+
+    Returns:
+        Number of calls that succeeded
+    """
+    succeeded = 0
+
+    for _ in range(len(_outbox)):
+        item = _outbox.popleft()
+
+        if not get_breaker(item["service"]).allow():
+            _outbox.append(item)
+            continue
+
+        item["attempts"] += 1
+        try:
+            result = await _call_guarded(
+                item["service"], item["endpoint"], item["func"], item["args"], item["kwargs"]
+            )
+        except ServiceUnavailable as e:
+            if item["attempts"] < OUTBOX_MAX_ATTEMPTS:
+                _outbox.append(item)
+            else:
+                logger.error(f"Giving up on outbox call to {item['endpoint']} after {item['attempts']} attempts: {e}")
+            continue
+        except Exception as e:
+            logger.exception(f"Outbox call to {item['endpoint']} failed: {e}")
+            continue
+
+        # The service answered, a rejected call won't succeed on a retry either
+        if result:
+            succeeded += 1
+        else:
+            logger.error(f"Outbox call to {item['endpoint']} was rejected, not retrying")
+
+    metrics.gauge("outbox.size").set(len(_outbox))
+    return succeeded
+
+async def outbox_worker() -> None:
+    """Background task that periodically retries queued calls."""
+    while True:
+        await asyncio.sleep(OUTBOX_RETRY_INTERVAL)
+        try:
+            if _outbox:
+                succeeded = await run_outbox()
+                if succeeded:
+                    logger.info(f"Outbox delivered {succeeded} queued calls")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error running outbox: {e}")
+
+def resilient(service: str, endpoint: str, fallback: Any = None, queue_on_open: bool = False):
+    """
+    Guard an async API call with the service's circuit breaker and an adaptive timeout.
+
+    Only outages count as failures: the wrapped function raises
+    ServiceUnavailable for transport errors and 5xx answers, and the call
+    may time out. Whatever it returns means the service is up, including a
+    falsy value for a request the service rejected. Check configuration and
+    arguments before calling a guarded function, not inside it.
+
+    Args:
+        service: Circuit breaker name, shared by all endpoints of a service
+        endpoint: Name used for latency tracking and the timeout
+        fallback: Value returned when the call is rejected or the service is unavailable
+        queue_on_open: Queue rejected calls in the outbox (for calls whose result isn't needed)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not get_breaker(service).allow():
+                logger.warning(f"Circuit '{service}' is open, skipping {endpoint}")
+                if queue_on_open:
+                    enqueue_outbox(service, endpoint, func, *args, **kwargs)
+                return fallback
+
+            try:
+                return await _call_guarded(service, endpoint, func, args, kwargs)
+            except ServiceUnavailable as e:
+                logger.error(f"{endpoint} failed: {e}")
+                return fallback
+
+        return wrapper
+    return decorator
+
+def resilient_sync(service: str, endpoint: str, fallback: Any = None):
+    """
+    Guard a blocking API call with the service's circuit breaker.
+
+    Failures are counted like in `resilient`. Blocking calls can't be
+    cancelled, so the wrapped function should pass `get_timeout(endpoint)`
+    to its client library itself and raise ServiceUnavailable when it expires.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            breaker = get_breaker(service)
+            if not breaker.allow():
+                logger.warning(f"Circuit '{service}' is open, skipping {endpoint}")
+                return fallback
+
+            started = time.monotonic()
+            outcome = None
+            try:
+                result = func(*args, **kwargs)
+                outcome = True
+            except ServiceUnavailable as e:
+                outcome = False
+                logger.error(f"{endpoint} failed: {e}")
+                return fallback
+            finally:
+                _record_outcome(breaker, outcome)
+
+            get_latency_tracker(endpoint).observe(time.monotonic() - started)
+            return result
+
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+"""
+Indexed user search for the admin panel.
+
+`ilike('%term%')` can't use a B-tree index, so searching bookings by user
+name or phone scanned the whole users table. This module backs the search
+with an index that can answer substring queries:
+
+- PostgreSQL: pg_trgm GIN indexes on the searched columns, used by ILIKE
+- SQLite: an FTS5 table with the trigram tokenizer, kept in sync with
+  `users` by triggers
+
+Create them with `ensure_user_search_index` (run by `python -m bot.migrations`).
+Without them the search still works, just with a full scan.
+"""
+import logging
+import re
+from typing import Dict, List
+
+from sqlalchemy import and_, inspect, or_, select, text
+from sqlalchemy.engine import Engine
+
+from bot.database import User
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ("first_name", "last_name", "username", "phone_number")
+
+# FTS5 table mirroring the searched columns of `users`
+FTS_TABLE = "users_fts"
+
+# Trigram indexes can only narrow down terms of at least this many characters
+MIN_INDEXED_TERM = 3
+
+# A search that is only digits and phone punctuation is matched against the end of the number
+PHONE_TERM = re.compile(r"^\+?[\d\s\-()]+$")
+
+# Whether each database has the FTS5 table, checked once per engine
+_fts_available: Dict[str, bool] = {}
+
+def _postgresql_statements(engine: Engine) -> List[str]:
+    existing = {index["name"] for index in inspect(engine).get_indexes("users")}
+    statements = [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_{column}_trgm "
+        f"ON users USING gin ({column} gin_trgm_ops)"
+        for column in SEARCH_COLUMNS
+        if f"ix_users_{column}_trgm" not in existing
+    ]
+    return ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + statements if statements else []
+
+def _sqlite_statements() -> List[str]:
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"{columns}, content='users', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER users_fts_insert AFTER INSERT ON users BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER users_fts_delete AFTER DELETE ON users BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER users_fts_update AFTER UPDATE ON users BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        # Index the users that existed before the table
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+def ensure_user_search_index(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Create the user search index for the engine's database if it's missing.
+
+    Returns:
+        The statements (executed unless dry_run)
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        statements = _postgresql_statements(engine)
+    elif dialect == "sqlite":
+        statements = [] if inspect(engine).has_table(FTS_TABLE) else _sqlite_statements()
+    else:
+        logger.warning(f"No user search index for {dialect}, searches will scan the users table")
+        return []
+
+    for statement in statements:
+        logger.info(statement if not dry_run else f"[dry run] {statement}")
+
+    if statements and not dry_run:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+        _fts_available.pop(str(engine.url), None)
+
+    return statements
+
+def _has_fts(engine: Engine) -> bool:
+    key = str(engine.url)
+    if key not in _fts_available:
+        _fts_available[key] = inspect(engine).has_table(FTS_TABLE)
+    return _fts_available[key]
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def user_search_condition(engine: Engine, term: str):
+    """
+    Build a WHERE condition matching users by name, username or phone.
+
+    Every word of the term must appear in one of the columns, so "ali val"
+    finds "Ali Valiyev". A term made of digits (and phone punctuation)
+    matches the end of the phone number instead, e.g. "4567" or "90 123-45-67".
+
+    Args:
+        engine: Engine the query runs on (selects the index to use)
+        term: Search text as typed by the admin
+
+    Returns:
+        SQLAlchemy condition on User, or None for an empty term
+    """
+    term = term.strip()
+    if not term:
+        return None
+
+    digits = re.sub(r"\D", "", term)
+    if PHONE_TERM.match(term) and digits:
+        words = [digits]
+        columns = ("phone_number",)
+        phone_suffix = User.phone_number.like(f"%{digits}")
+    else:
+        words = term.split()
+        columns = SEARCH_COLUMNS
+        phone_suffix = None
+
+    conditions = []
+    fts_terms = []
+    use_fts = engine.dialect.name == "sqlite" and _has_fts(engine)
+    for word in words:
+        if use_fts and len(word) >= MIN_INDEXED_TERM:
+            fts_terms.append(f"{{{' '.join(columns)}}} : {_fts_phrase(word)}")
+        else:
+            # Uses the trigram indexes on PostgreSQL
+            pattern = _like_pattern(word)
+            conditions.append(or_(*(getattr(User, column).ilike(pattern, escape="\\") for column in columns)))
+
+    if fts_terms:
+        matches = select(text("rowid")).select_from(text(FTS_TABLE)).where(
+            text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=" AND ".join(fts_terms))
+        )
+        conditions.append(User.id.in_(matches))
+    if phone_suffix is not None:
+        conditions.append(phone_suffix)
+
+    return and_(*conditions)
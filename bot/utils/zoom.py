@@ -1,16 +1,20 @@
 """
 Zoom API integration for the Telegram bot.
 """
+import asyncio
 import json
 import logging
+import secrets
 import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
 import aiohttp
 import jwt
 
-from bot.config import ZOOM_CLIENT_ID, ZOOM_CLIENT_SECRET, ZOOM_ACCOUNT_EMAIL
+from bot.config import ZOOM_CLIENT_ID, ZOOM_CLIENT_SECRET, ZOOM_ACCOUNT_EMAIL, ZOOM_TOKEN_REFRESH_MARGIN
+from bot.utils.cache import get_redis
+from bot.utils.resilience import ServiceUnavailable, resilient
 
 logger = logging.getLogger(__name__)
 
@@ -18,25 +22,52 @@ logger = logging.getLogger(__name__)
 ACCESS_TOKEN = None
 TOKEN_EXPIRY = 0
 
-async def get_zoom_access_token() -> Optional[str]:
+# Only one coroutine at a time may talk to the OAuth endpoint
+_token_lock = asyncio.Lock()
+
+# Redis keys for sharing the token between worker processes
+REDIS_TOKEN_KEY = "zoom:access_token"
+REDIS_LOCK_KEY = "zoom:access_token:lock"
+
+# Seconds before an abandoned lock expires
+REDIS_LOCK_TTL = 30
+
+# Deletes the lock only while it still holds this worker's token, a refresh
+# slower than the TTL must not release the lock another worker took since
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+def _token_is_fresh(margin: int = 60) -> bool:
+    """Check whether the cached token is valid for at least `margin` seconds."""
+    return bool(ACCESS_TOKEN) and TOKEN_EXPIRY > int(time.time()) + margin
+
+def zoom_configured() -> bool:
+    """Check whether the Zoom API credentials are set."""
+    return bool(ZOOM_CLIENT_ID and ZOOM_CLIENT_SECRET)
+
+async def _fetch_zoom_access_token() -> Optional[Tuple[str, int]]:
     """
-    Get a Zoom access token using the OAuth2 flow.
+    Request a new access token from the Zoom OAuth endpoint.
     
     Returns:
-        Access token string or None if failed
+        Tuple of (access token, expiry timestamp) or None if failed
     """
-    global ACCESS_TOKEN, TOKEN_EXPIRY
-    
-    # Check if we have a valid cached token
-    current_time = int(time.time())
-    if ACCESS_TOKEN and TOKEN_EXPIRY > current_time + 60:  # 60-second buffer
-        return ACCESS_TOKEN
-    
-    # No valid token, need to get a new one
-    if not ZOOM_CLIENT_ID or not ZOOM_CLIENT_SECRET:
+    # Checked outside the circuit breaker, missing credentials aren't an outage
+    if not zoom_configured():
         logger.error("Zoom API credentials not configured")
         return None
     
+    return await _request_zoom_access_token()
+
+# Own circuit: the meeting calls fetch their token from inside the "zoom"
+# circuit, whose half-open state lets only one call through at a time
+@resilient("zoom_oauth", "zoom.oauth_token")
+async def _request_zoom_access_token() -> Optional[Tuple[str, int]]:
+    """Call the Zoom OAuth endpoint (see `_fetch_zoom_access_token`)."""
     try:
         auth_url = "https://zoom.us/oauth/token"
         auth_str = f"{ZOOM_CLIENT_ID}:{ZOOM_CLIENT_SECRET}"
@@ -55,19 +86,165 @@ async def get_zoom_access_token() -> Optional[str]:
         
         async with aiohttp.ClientSession() as session:
             async with session.post(auth_url, headers=headers, data=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    ACCESS_TOKEN = result.get("access_token")
-                    expires_in = result.get("expires_in", 3600)
-                    TOKEN_EXPIRY = current_time + expires_in
-                    return ACCESS_TOKEN
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to get Zoom access token: {response.status} - {error_text}")
-                    return None
-    except Exception as e:
-        logger.exception(f"Error getting Zoom access token: {e}")
+                status = response.status
+                body = await response.json() if status == 200 else await response.text()
+    except aiohttp.ClientError as e:
+        raise ServiceUnavailable(f"Zoom OAuth request failed: {e}") from e
+    
+    if status >= 500:
+        raise ServiceUnavailable(f"Zoom OAuth answered {status} - {body}")
+    if status != 200:
+        logger.error(f"Failed to get Zoom access token: {status} - {body}")
         return None
+    
+    expires_in = body.get("expires_in", 3600)
+    return body.get("access_token"), int(time.time()) + expires_in
+
+async def _load_shared_token() -> bool:
+    """
+    Load a token published by another worker from Redis into the local cache.
+    
+    Returns:
+        True if a fresh token was loaded, False otherwise
+    """
+    global ACCESS_TOKEN, TOKEN_EXPIRY
+    
+    redis = get_redis()
+    if redis is None:
+        return False
+    
+    try:
+        raw = await redis.get(REDIS_TOKEN_KEY)
+    except Exception as e:
+        logger.warning(f"Could not read Zoom token from Redis: {e}")
+        return False
+    
+    if not raw:
+        return False
+    
+    cached = json.loads(raw)
+    if cached.get("expiry", 0) <= int(time.time()) + ZOOM_TOKEN_REFRESH_MARGIN:
+        return False
+    
+    ACCESS_TOKEN = cached["token"]
+    TOKEN_EXPIRY = cached["expiry"]
+    return True
+
+async def _store_shared_token() -> None:
+    """Publish the locally cached token to Redis for other workers."""
+    redis = get_redis()
+    if redis is None:
+        return
+    
+    ttl = TOKEN_EXPIRY - int(time.time())
+    if ttl <= 0:
+        return
+    
+    try:
+        await redis.set(
+            REDIS_TOKEN_KEY,
+            json.dumps({"token": ACCESS_TOKEN, "expiry": TOKEN_EXPIRY}),
+            ex=ttl
+        )
+    except Exception as e:
+        logger.warning(f"Could not store Zoom token in Redis: {e}")
+
+async def refresh_zoom_access_token(force: bool = False) -> Optional[str]:
+    """
+    Refresh the Zoom access token, making sure only one request is in flight.
+    
+    Concurrent callers within this process wait on the same lock and reuse
+    the token fetched by the first one. Across processes a short Redis lock
+    decides which worker talks to Zoom; the others pick the token up from Redis.
+    
+    Args:
+        force: Refresh even if the cached token is still valid
+        
+    Returns:
+        Access token string or None if failed
+    """
+    global ACCESS_TOKEN, TOKEN_EXPIRY
+    
+    async with _token_lock:
+        # Another coroutine may have refreshed while we were waiting
+        if not force and _token_is_fresh(ZOOM_TOKEN_REFRESH_MARGIN):
+            return ACCESS_TOKEN
+        
+        if await _load_shared_token():
+            return ACCESS_TOKEN
+        
+        redis = get_redis()
+        lock_acquired = True
+        lock_token = secrets.token_hex(16)
+        if redis is not None:
+            try:
+                lock_acquired = bool(await redis.set(REDIS_LOCK_KEY, lock_token, nx=True, ex=REDIS_LOCK_TTL))
+            except Exception as e:
+                logger.warning(f"Could not acquire Zoom token lock in Redis: {e}")
+        
+        if not lock_acquired:
+            # Another worker is fetching the token, wait for it to publish
+            for _ in range(20):
+                await asyncio.sleep(0.5)
+                if await _load_shared_token():
+                    return ACCESS_TOKEN
+            logger.warning("Timed out waiting for another worker to refresh the Zoom token")
+        
+        try:
+            token = await _fetch_zoom_access_token()
+            if token:
+                ACCESS_TOKEN, TOKEN_EXPIRY = token
+                await _store_shared_token()
+        finally:
+            if redis is not None and lock_acquired:
+                try:
+                    await redis.eval(RELEASE_LOCK_SCRIPT, 1, REDIS_LOCK_KEY, lock_token)
+                except Exception as e:
+                    logger.warning(f"Could not release Zoom token lock in Redis: {e}")
+        
+        return ACCESS_TOKEN if _token_is_fresh() else None
+
+async def get_zoom_access_token() -> Optional[str]:
+    """
+    Get a Zoom access token using the OAuth2 flow.
+    
+    The token is normally kept fresh by `zoom_token_refresher`, so this
+    only falls back to a (single-flight) refresh when the cache is empty.
+    
+    Returns:
+        Access token string or None if failed
+    """
+    # Check if we have a valid cached token
+    if _token_is_fresh():  # 60-second buffer
+        return ACCESS_TOKEN
+    
+    return await refresh_zoom_access_token()
+
+async def zoom_token_refresher() -> None:
+    """
+    Background task that renews the Zoom token before it expires.
+    
+    Started once from the bot entry point, it keeps the token fresh so that
+    booking confirmations never wait for the OAuth round trip.
+    """
+    if not zoom_configured():
+        logger.info("Zoom API credentials not configured, token refresher not started")
+        return
+    
+    while True:
+        try:
+            token = await refresh_zoom_access_token()
+            if token:
+                delay = TOKEN_EXPIRY - ZOOM_TOKEN_REFRESH_MARGIN - int(time.time())
+            else:
+                delay = 30  # Retry soon after a failed refresh
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error in Zoom token refresher: {e}")
+            delay = 30
+        
+        await asyncio.sleep(max(delay, 5))
 
 async def create_zoom_meeting(
     topic: str,
@@ -87,6 +264,20 @@ async def create_zoom_meeting(
     Returns:
         Dictionary with meeting details or None if failed
     """
+    if not zoom_configured():
+        logger.error("Zoom API credentials not configured")
+        return None
+    
+    return await _create_zoom_meeting(topic, start_time, duration_minutes, user_email)
+
+@resilient("zoom", "zoom.create_meeting")
+async def _create_zoom_meeting(
+    topic: str,
+    start_time: datetime,
+    duration_minutes: int,
+    user_email: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Call the Zoom API to create a meeting (see `create_zoom_meeting`)."""
     # Get access token
     access_token = await get_zoom_access_token()
     if not access_token:
@@ -127,21 +318,23 @@ async def create_zoom_meeting(
         
         async with aiohttp.ClientSession() as session:
             async with session.post(api_url, headers=headers, json=meeting_data) as response:
-                if response.status == 201:
-                    result = await response.json()
-                    return {
-                        "id": result.get("id"),
-                        "join_url": result.get("join_url"),
-                        "start_url": result.get("start_url"),
-                        "password": result.get("password")
-                    }
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to create Zoom meeting: {response.status} - {error_text}")
-                    return None
-    except Exception as e:
-        logger.exception(f"Error creating Zoom meeting: {e}")
+                status = response.status
+                body = await response.json() if status == 201 else await response.text()
+    except aiohttp.ClientError as e:
+        raise ServiceUnavailable(f"Zoom create meeting request failed: {e}") from e
+    
+    if status >= 500:
+        raise ServiceUnavailable(f"Zoom create meeting answered {status} - {body}")
+    if status != 201:
+        logger.error(f"Failed to create Zoom meeting: {status} - {body}")
         return None
+    
+    return {
+        "id": body.get("id"),
+        "join_url": body.get("join_url"),
+        "start_url": body.get("start_url"),
+        "password": body.get("password")
+    }
 
 async def update_zoom_meeting(
     meeting_id: str,
@@ -159,6 +352,19 @@ async def update_zoom_meeting(
     Returns:
         True if successful, False otherwise
     """
+    if not zoom_configured():
+        logger.error("Zoom API credentials not configured")
+        return False
+    
+    return await _update_zoom_meeting(meeting_id, start_time, duration_minutes)
+
+@resilient("zoom", "zoom.update_meeting", fallback=False, queue_on_open=True)
+async def _update_zoom_meeting(
+    meeting_id: str,
+    start_time: datetime,
+    duration_minutes: int
+) -> bool:
+    """Call the Zoom API to move a meeting (see `update_zoom_meeting`)."""
     # Get access token
     access_token = await get_zoom_access_token()
     if not access_token:
@@ -186,12 +392,14 @@ async def update_zoom_meeting(
         
         async with aiohttp.ClientSession() as session:
             async with session.patch(api_url, headers=headers, json=meeting_data) as response:
-                if response.status == 204:
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to update Zoom meeting: {response.status} - {error_text}")
-                    return False
-    except Exception as e:
-        logger.exception(f"Error updating Zoom meeting: {e}")
+                status = response.status
+                error_text = await response.text() if status != 204 else ""
+    except aiohttp.ClientError as e:
+        raise ServiceUnavailable(f"Zoom update meeting request failed: {e}") from e
+    
+    if status >= 500:
+        raise ServiceUnavailable(f"Zoom update meeting answered {status} - {error_text}")
+    if status != 204:
+        logger.error(f"Failed to update Zoom meeting: {status} - {error_text}")
         return False
+    return True
@@ -0,0 +1,142 @@
+"""
+Pool of pre-created Zoom meetings for faster booking confirmation.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from bot.config import ZOOM_MEETING_POOL_SIZE, ZOOM_POOL_DEFER_PATCH
+from bot.database import (
+    get_active_staff_async, count_pooled_zoom_meetings_async,
+    add_pooled_zoom_meeting_async, claim_pooled_zoom_meeting_async
+)
+from bot.utils.zoom import create_zoom_meeting, update_zoom_meeting
+
+logger = logging.getLogger(__name__)
+
+# How often the pool is checked even if nothing was claimed (in seconds)
+POOL_CHECK_INTERVAL = 600
+
+# Placeholder start time for pooled meetings, replaced when claimed
+POOL_PLACEHOLDER_OFFSET = timedelta(days=30)
+
+# Set whenever a meeting is claimed so the filler tops the pool up right away
+_refill_needed = asyncio.Event()
+
+# Deferred patches still running, referenced so they aren't garbage collected
+_patch_tasks: set = set()
+
+async def fill_zoom_meeting_pool() -> int:
+    """
+    Top up the pool of pre-created meetings for every active staff member.
+
+    Returns:
+        Number of meetings created
+    """
+    created = 0
+
+    for staff in await get_active_staff_async():
+        missing = ZOOM_MEETING_POOL_SIZE - await count_pooled_zoom_meetings_async(staff.id)
+
+        for _ in range(missing):
+            meeting = await create_zoom_meeting(
+                topic=f"Appointment with {staff.name}",
+                start_time=datetime.utcnow() + POOL_PLACEHOLDER_OFFSET,
+                duration_minutes=30
+            )
+            if not meeting:
+                logger.warning(f"Could not pre-create Zoom meeting for staff {staff.id}")
+                break
+
+            await add_pooled_zoom_meeting_async(staff.id, meeting)
+            created += 1
+
+    return created
+
+async def zoom_meeting_pool_filler() -> None:
+    """
+    Background task that keeps the Zoom meeting pool topped up.
+    """
+    if ZOOM_MEETING_POOL_SIZE <= 0:
+        logger.info("Zoom meeting pool disabled")
+        return
+
+    while True:
+        try:
+            created = await fill_zoom_meeting_pool()
+            if created:
+                logger.info(f"Added {created} meetings to the Zoom meeting pool")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error filling Zoom meeting pool: {e}")
+
+        _refill_needed.clear()
+        try:
+            await asyncio.wait_for(_refill_needed.wait(), timeout=POOL_CHECK_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+async def _patch_meeting(meeting_id: str, start_time: datetime, duration_minutes: int) -> bool:
+    """Move a claimed meeting to the booking time."""
+    try:
+        success = await update_zoom_meeting(meeting_id, start_time, duration_minutes)
+    except Exception as e:
+        logger.exception(f"Error moving pooled Zoom meeting {meeting_id}: {e}")
+        return False
+    if not success:
+        logger.error(f"Failed to move pooled Zoom meeting {meeting_id} to {start_time}")
+    return success
+
+async def get_zoom_meeting_for_booking(
+    staff_id: int,
+    topic: str,
+    start_time: datetime,
+    duration_minutes: int,
+    user_email: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Get a Zoom meeting for a booking, preferring a pre-created one.
+
+    A pooled meeting only needs its start time patched, which is done inline
+    or, with ZOOM_POOL_DEFER_PATCH, in the background. When the pool is
+    disabled or empty a new meeting is created as before.
+
+    Args:
+        staff_id: Staff member the booking is with
+        topic: Meeting topic/title (used when creating a new meeting)
+        start_time: Start time of the meeting
+        duration_minutes: Duration in minutes
+        user_email: Optional email address for the participant
+
+    Returns:
+        Dictionary with meeting details or None if failed
+    """
+    meeting = None
+    if ZOOM_MEETING_POOL_SIZE > 0:
+        meeting = await claim_pooled_zoom_meeting_async(staff_id)
+        _refill_needed.set()
+
+    if not meeting:
+        return await create_zoom_meeting(
+            topic=topic,
+            start_time=start_time,
+            duration_minutes=duration_minutes,
+            user_email=user_email
+        )
+
+    if ZOOM_POOL_DEFER_PATCH:
+        # The join URL does not change, so the user can have it right away
+        task = asyncio.create_task(_patch_meeting(meeting["id"], start_time, duration_minutes))
+        _patch_tasks.add(task)
+        task.add_done_callback(_patch_tasks.discard)
+    elif not await _patch_meeting(meeting["id"], start_time, duration_minutes):
+        return await create_zoom_meeting(
+            topic=topic,
+            start_time=start_time,
+            duration_minutes=duration_minutes,
+            user_email=user_email
+        )
+
+    return meeting
@@ -0,0 +1,110 @@
+"""
+Check that concurrent admin panel requests don't wait for each other.
+
+Seeds a throwaway SQLite database, makes every SQL statement artificially
+slow (like a heavy report on a busy database) and sends the same admin
+pages one after another and then all at once. If database work blocked the
+event loop, the concurrent run would take as long as the sequential one.
+Exits with status 1 if the concurrent run isn't at least SPEEDUP times faster.
+
+    python check_admin_concurrency.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the admin panel at a scratch database before it is imported
+handle, DATABASE_PATH = tempfile.mkstemp(suffix=".db")
+os.close(handle)
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from admin.auth import get_current_user  # noqa: E402
+from admin.database import engine  # noqa: E402
+from admin.main import app  # noqa: E402
+from admin.models import AdminUser  # noqa: E402
+from bot.database import Base, Booking, BookingStatus, Staff, User  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Added to every SQL statement
+STATEMENT_DELAY = 0.05
+
+# Requests sent in each run
+REQUESTS = 10
+
+# How much faster the concurrent run must be
+SPEEDUP = 3
+
+# Pages that render without the Flask-only parts of the shared templates
+PAGES = ["/bookings/recent", "/bookings/export?format=jsonl", "/bookings/recent", "/api/dashboard"]
+
+def seed() -> None:
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(User(telegram_id=100000 + i, first_name=f"User {i}", language="en") for i in range(20))
+        session.add_all(Staff(name=f"Staff {i}", price=100000, is_active=True) for i in range(5))
+        session.flush()
+        now = datetime.now()
+        session.add_all(
+            Booking(
+                user_id=i % 20 + 1,
+                staff_id=i % 5 + 1,
+                booking_date=now - timedelta(hours=i),
+                status=BookingStatus.CONFIRMED
+            )
+            for i in range(50)
+        )
+        session.commit()
+
+def slow_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    time.sleep(STATEMENT_DELAY)
+
+async def timed_run(client: httpx.AsyncClient, concurrent: bool) -> float:
+    paths = [PAGES[i % len(PAGES)] for i in range(REQUESTS)]
+    started = time.perf_counter()
+    if concurrent:
+        responses = await asyncio.gather(*(client.get(path) for path in paths))
+    else:
+        responses = [await client.get(path) for path in paths]
+    elapsed = time.perf_counter() - started
+
+    failed = [(response.url.path, response.status_code) for response in responses if response.status_code != 200]
+    if failed:
+        raise RuntimeError(f"Requests failed: {failed}")
+    return elapsed
+
+async def run() -> int:
+    seed()
+    app.dependency_overrides[get_current_user] = lambda: AdminUser(id=1, username="admin", is_active=True)
+    event.listen(engine, "before_cursor_execute", slow_statement)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://admin") as client:
+        sequential = await timed_run(client, concurrent=False)
+        concurrent = await timed_run(client, concurrent=True)
+
+    speedup = sequential / concurrent
+    ok = speedup >= SPEEDUP
+    logger.info(f"{REQUESTS} requests: sequential {sequential:.2f}s, concurrent {concurrent:.2f}s ({speedup:.1f}x)")
+    logger.info("[OK] requests run in parallel" if ok else "[BLOCKED] requests wait for each other")
+    return 0 if ok else 1
+
+def main() -> int:
+    try:
+        return asyncio.run(run())
+    finally:
+        engine.dispose()
+        os.remove(DATABASE_PATH)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Check that the Bitrix24 batch client coalesces calendar calls.
+
+Starts a local stub of the Bitrix24 `batch` endpoint, sends concurrent
+event updates through the shared client the reschedule handlers use and
+checks that they go out as a few batch requests, that every call gets its
+own result (including a command Bitrix24 rejects) and that updates skipped
+by an open circuit land in the outbox. Exits with status 1 on a mismatch.
+
+    python check_bitrix_batch.py
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+# Point the client at the stub before the config is imported
+with socket.socket() as probe:
+    probe.bind(("127.0.0.1", 0))
+    PORT = probe.getsockname()[1]
+os.environ["BITRIX24_WEBHOOK_URL"] = f"http://127.0.0.1:{PORT}/rest/1/token"
+
+from aiohttp import web  # noqa: E402
+
+from bot.utils import resilience  # noqa: E402
+from bot.utils.bitrix24_batch import MAX_BATCH_SIZE, get_batch_client  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+# Concurrent updates sent through the client
+UPDATES = 120
+
+# Event ID the stub answers with an error
+BAD_EVENT_ID = "17"
+
+batch_sizes = []
+
+async def handle_batch(request: web.Request) -> web.Response:
+    """Answer like Bitrix24: per-command results and errors keyed by command key."""
+    body = await request.json()
+    batch_sizes.append(len(body["cmd"]))
+
+    results, errors = {}, {}
+    for key, command in body["cmd"].items():
+        method, query = command.split("?", 1)
+        params = parse_qs(query)
+        if method != "calendar.event.update" or "dateFrom" not in params:
+            errors[key] = {"error": "INVALID_REQUEST"}
+        elif params["id"][0] == BAD_EVENT_ID:
+            errors[key] = {"error": "NOT_FOUND", "error_description": "Event not found"}
+        else:
+            results[key] = True
+    return web.json_response({"result": {"result": results, "result_error": errors}})
+
+async def run_checks() -> list:
+    failures = []
+    client = get_batch_client()
+    start = datetime(2030, 1, 1, 10, 0)
+
+    outcomes = await asyncio.gather(*[
+        client.update_event(i, "5", str(i), start + timedelta(minutes=30 * i), 30)
+        for i in range(UPDATES)
+    ])
+
+    expected_requests = -(-UPDATES // MAX_BATCH_SIZE)
+    logger.info(f"{UPDATES} updates went out as {len(batch_sizes)} batch requests of {batch_sizes}")
+    if len(batch_sizes) != expected_requests:
+        failures.append(f"expected {expected_requests} batch requests, got {len(batch_sizes)}")
+    if get_batch_client() is not client:
+        failures.append("get_batch_client() returned a new client on the same event loop")
+
+    failed = [i for i, ok in enumerate(outcomes) if not ok]
+    if failed != [int(BAD_EVENT_ID)]:
+        failures.append(f"expected only update {BAD_EVENT_ID} to fail, failed: {failed}")
+
+    # An open circuit skips the batch and queues the updates for the outbox worker
+    breaker = resilience.get_breaker("bitrix24")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    sent_before = len(batch_sizes)
+    rejected = await asyncio.gather(*[
+        client.update_event(i, "5", str(i), start, 30) for i in range(3)
+    ])
+    queued = [item for item in resilience._outbox if item["endpoint"] == "bitrix24.event_update"]
+    logger.info(f"With the circuit open: {len(batch_sizes) - sent_before} requests, {len(queued)} updates queued")
+    if any(rejected) or len(batch_sizes) != sent_before:
+        failures.append("updates were sent although the circuit was open")
+    if len(queued) != 3:
+        failures.append(f"expected 3 queued updates, got {len(queued)}")
+
+    await client.close()
+    return failures
+
+async def main() -> int:
+    app = web.Application()
+    app.router.add_post(urlsplit(os.environ["BITRIX24_WEBHOOK_URL"]).path + "/batch", handle_batch)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    try:
+        failures = await run_checks()
+    finally:
+        await runner.cleanup()
+
+    for failure in failures:
+        logger.error(f"FAIL: {failure}")
+    if not failures:
+        logger.info("OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
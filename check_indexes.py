@@ -0,0 +1,175 @@
+"""
+Verify that the bot's hot queries are served by indexes.
+
+Seeds a throwaway database with realistic data, applies the schema
+migrations and prints the EXPLAIN plan of every hot query. Exits with
+status 1 if any of them falls back to a full table scan.
+
+    python check_indexes.py                                  # temporary SQLite file
+    python check_indexes.py --database-url postgresql://...  # empty scratch database
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+
+from bot.database import (
+    Base, User, Staff, StaffSchedule, Booking, BookingStatus, ACTIVE_BOOKING_STATUSES
+)
+from bot.migrations import migrate
+from bot.utils.recent_bookings import change_key_query
+from bot.utils.search import user_search_condition
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+def seed(session: Session, users: int = 2000, staff: int = 20, bookings: int = 50000) -> None:
+    """Fill the database with random users, staff, schedules and bookings."""
+    random.seed(42)
+    session.add_all(User(telegram_id=100000 + i, first_name=f"User {i}", language="en") for i in range(users))
+    session.add_all(Staff(name=f"Staff {i}", price=100000, is_active=True) for i in range(staff))
+    session.flush()
+
+    session.add_all(
+        StaffSchedule(staff_id=staff_id, weekday=weekday, start_time="09:00", end_time="18:00")
+        for staff_id in range(1, staff + 1)
+        for weekday in range(5)
+    )
+
+    # Most bookings are in the past and finished, like in a long-running deployment
+    start = datetime.now() - timedelta(days=730)
+    statuses = [BookingStatus.COMPLETED] * 12 + [BookingStatus.CANCELLED] * 4 + [
+        BookingStatus.CONFIRMED, BookingStatus.PAYMENT_PENDING, BookingStatus.PENDING
+    ]
+    rows = []
+    for _ in range(bookings):
+        booking_date = start + timedelta(days=random.randint(0, 790), hours=random.randint(9, 17))
+        status = random.choice(statuses)
+        if booking_date > datetime.now() and status in (BookingStatus.COMPLETED, BookingStatus.CANCELLED):
+            status = BookingStatus.CONFIRMED
+        created_at = booking_date - timedelta(days=random.randint(1, 14))
+        rows.append(Booking(
+            user_id=random.randint(1, users),
+            staff_id=random.randint(1, staff),
+            booking_date=booking_date,
+            status=status,
+            payment_started_at=created_at if status == BookingStatus.PAYMENT_PENDING else None,
+            created_at=created_at
+        ))
+    session.add_all(rows)
+    session.commit()
+
+def hot_queries(engine):
+    """The statements the bot, the reconciler and the admin panel run most."""
+    now = datetime.now()
+    month_start = datetime(now.year, now.month, 1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    day_start = datetime(now.year, now.month, now.day)
+
+    return {
+        "calendar month (calendar_keyboard)": select(Booking).where(
+            Booking.staff_id == 3,
+            Booking.booking_date >= month_start,
+            Booking.booking_date < month_end,
+            Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+        ),
+        "day slots (time_slots_keyboard)": select(Booking).where(
+            Booking.staff_id == 3,
+            Booking.booking_date >= day_start,
+            Booking.booking_date < day_start + timedelta(days=1),
+            Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+        ),
+        "user bookings (my_bookings)": select(Booking).where(
+            Booking.user_id == 17
+        ).order_by(Booking.booking_date.desc()),
+        "admin list by staff": select(Booking).where(
+            Booking.staff_id == 3,
+            Booking.booking_date >= month_start
+        ).order_by(Booking.booking_date.desc()).limit(10),
+        "pending payments count (stats)": select(func.count(Booking.id)).where(
+            Booking.status == BookingStatus.PAYMENT_PENDING
+        ),
+        "stale pending (reconciler)": select(Booking.id).where(
+            Booking.status == BookingStatus.PAYMENT_PENDING,
+            Booking.payment_started_at < now - timedelta(minutes=30)
+        ).order_by(Booking.payment_started_at, Booking.id).limit(200),
+        "upcoming confirmed (reminders)": select(Booking.id, Booking.booking_date).where(
+            Booking.status == BookingStatus.CONFIRMED,
+            Booking.booking_date > now,
+            Booking.booking_date <= now + timedelta(hours=48)
+        ),
+        "change key (recent bookings cache)": change_key_query(Booking),
+        "user search (admin bookings)": select(User.id).where(
+            user_search_condition(engine, "User 17")
+        ),
+        "staff schedule by weekday": select(StaffSchedule).where(
+            StaffSchedule.staff_id == 3,
+            StaffSchedule.weekday == 2
+        ),
+    }
+
+def explain(session: Session, statement) -> str:
+    """Get the query plan of a statement as text."""
+    dialect = session.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+    if dialect.name == "sqlite":
+        rows = session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return "\n".join(row[-1] for row in rows)
+
+    # Small seeded tables might otherwise be scanned sequentially just because it's cheap
+    session.execute(text("SET enable_seqscan = off"))
+    rows = session.execute(text(f"EXPLAIN {sql}")).all()
+    return "\n".join(row[0] for row in rows)
+
+def uses_index(plan: str) -> bool:
+    """Check that no table in the plan is read with a full scan."""
+    lines = plan.splitlines()
+    full_scans = [
+        line for line in lines
+        if ("SCAN " in line and "USING" not in line and "INDEX" not in line
+            and "CONSTANT ROW" not in line)  # SQLite, a constant row only drives subqueries
+        or "Seq Scan" in line  # PostgreSQL
+    ]
+    return not full_scans
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check that hot queries use indexes")
+    parser.add_argument("--database-url", help="Scratch database to seed (default: temporary SQLite file)")
+    parser.add_argument("--bookings", type=int, default=50000, help="Number of bookings to seed")
+    args = parser.parse_args()
+
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        database_url = f"sqlite:///{path}"
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    migrate(engine)
+
+    failures = 0
+    with Session(engine) as session:
+        seed(session, bookings=args.bookings)
+        session.execute(text("ANALYZE"))
+        session.commit()
+
+        for name, statement in hot_queries(engine).items():
+            plan = explain(session, statement)
+            ok = uses_index(plan)
+            failures += not ok
+            logger.info(f"[{'OK' if ok else 'FULL SCAN'}] {name}\n    " + plan.replace("\n", "\n    "))
+
+    logger.info(f"{len(hot_queries(engine)) - failures} of {len(hot_queries(engine))} hot queries use an index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Check that the admin booking pages don't run a query per row (N+1).
+
+Seeds a throwaway SQLite database through the Flask admin's models, requests
+every booking page with the test client and counts the SQL statements each
+request runs. Exits with status 1 if a page goes over its budget.
+
+    python check_query_budget.py
+"""
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Point the admin app at a scratch database before it is imported
+handle, DATABASE_PATH = tempfile.mkstemp(suffix=".db")
+os.close(handle)
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ["DISABLE_TELEGRAM_BOT"] = "1"
+
+from main import app, db  # noqa: E402
+from bot.utils.query_counter import count_statements  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+# Maximum statements per page: the current admin user, the rows and
+# (for the list) the total count and the staff filter dropdown.
+# The recent bookings are cached by the latest booking id, looked up first.
+BUDGETS = {
+    "/bookings": 4,
+    "/bookings/recent": 2,
+    "/bookings/1": 2,
+    "/api/dashboard": 1,
+}
+
+def seed(users: int = 30, staff: int = 10, bookings: int = 60) -> None:
+    """Add bookings that each belong to a different user/staff pair where possible."""
+    from models import TelegramUser, Staff, Booking, BookingStatus
+
+    db.session.add_all(TelegramUser(telegram_id=100000 + i, first_name=f"User {i}") for i in range(users))
+    db.session.add_all(Staff(name=f"Staff {i}", price=100000) for i in range(staff))
+    db.session.flush()
+
+    now = datetime.now()
+    statuses = list(BookingStatus)
+    db.session.add_all(
+        Booking(
+            user_id=i % users + 1,
+            staff_id=i % staff + 1,
+            booking_date=now - timedelta(hours=i),
+            status=statuses[i % len(statuses)],
+            created_at=now - timedelta(hours=i)
+        )
+        for i in range(bookings)
+    )
+    db.session.commit()
+
+def main() -> int:
+    from models import User
+
+    with app.app_context():
+        seed()
+        admin_id = User.query.filter_by(username="admin").first().id
+        engine = db.engine
+
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["user_id"] = admin_id
+
+    failures = 0
+    for path, budget in BUDGETS.items():
+        with count_statements(engine) as counter:
+            response = client.get(path)
+
+        ok = response.status_code == 200 and counter.count <= budget
+        failures += not ok
+        logger.info(
+            f"[{'OK' if ok else 'OVER BUDGET'}] GET {path} -> {response.status_code}, "
+            f"{counter.count} statements (budget {budget})"
+        )
+        if not ok:
+            for statement in counter.statements:
+                logger.info("    " + " ".join(statement.split()))
+
+    os.remove(DATABASE_PATH)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
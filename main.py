@@ -2,14 +2,18 @@
 Main entrypoint for the Admin Panel Application.
 Gunicorn will use this Flask app directly.
 """
+import atexit
 import logging
 import os
 import sys
 import threading
 import time
-from flask import Flask, render_template, redirect, url_for, request, flash, session
+from flask import Flask, Response, render_template, redirect, url_for, request, flash, session
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+
+from bot.config import DB_URL
+from bot.database import Base
+from bot.engine import dispose_engines, get_engine
 
 # Setup logging
 logging.basicConfig(
@@ -26,15 +30,26 @@ app = Flask(__name__,
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_for_testing')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///admin.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = DB_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_recycle': 300,
-    'pool_pre_ping': True
-}
+
+class SharedSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy on the bot's models and the process-wide engine,
+    so the admin panel and the bot code it calls share one connection pool.
+    """
+    def _make_engine(self, bind_key, options, app):
+        return get_engine(app.config['SQLALCHEMY_DATABASE_URI'])
 
 # Initialize database
-db = SQLAlchemy(app)
+db = SharedSQLAlchemy(app, model_class=Base)
+
+# Flask has no shutdown hook, close the pooled connections when the worker exits
+atexit.register(dispose_engines)
+
+# See the bot's booking changes in the cached dashboard counters and recent bookings
+from bot.utils.live import start_relay_listener_thread
+start_relay_listener_thread()
 
 # Telegram bot functionality
 def start_telegram_bot():
@@ -77,17 +92,8 @@ def start_telegram_bot():
         # Set environment variable to prevent future attempts
         os.environ["DISABLE_TELEGRAM_BOT"] = "1"
 
-# User model methods
-def set_password(self, password):
-    self.password_hash = generate_password_hash(password)
-    
-def check_password(self, password):
-    return check_password_hash(self.password_hash, password)
-
-# Add methods to the User model imported from models.py
+# Admin user model (set_password/check_password are shared with the FastAPI admin)
 from models import User
-User.set_password = set_password
-User.check_password = check_password
 
 # Add context processor for datetime and current user
 @app.context_processor
@@ -104,17 +110,31 @@ def inject_context():
         'current_user': current_user
     }
 
-# Create tables and default admin user
-with app.app_context():
-    db.create_all()
-    # Create admin user if it doesn't exist
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        admin = User(username='admin')
-        admin.set_password('adminpassword')
-        db.session.add(admin)
-        db.session.commit()
-        logger.info("Created default admin user")
+# Create tables and the default admin user (ADMIN_USERNAME/ADMIN_PASSWORD), shared with the FastAPI admin
+from admin.database import init_admin_db
+init_admin_db()
+
+def _conditional_page(tables, *variant):
+    """
+    Version a page built from rarely changing tables (see bot.utils.http_cache).
+    
+    Returns:
+        (table versions, cache headers for the response, 304 response if the
+        browser's copy is still current or None)
+    """
+    from bot.utils.http_cache import cache_headers, get_table_versions, is_not_modified
+    
+    versions = get_table_versions(db.session, tables)
+    etag = versions.etag(request.full_path, session.get('user_id'), *variant)
+    headers = cache_headers(etag, versions.last_modified)
+    
+    # A pending flash message isn't part of the ETag, so the page must be rendered
+    if '_flashes' not in session and is_not_modified(
+        etag, versions.last_modified,
+        request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')
+    ):
+        return versions, headers, Response(status=304, headers=headers)
+    return versions, headers, None
 
 # Routes
 @app.route('/')
@@ -149,11 +169,21 @@ def staff():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
+    from markupsafe import Markup
     from models import Staff
-    # Get staff data from the database
-    staff_list = Staff.query.all()
+    from bot.utils.http_cache import fragment_cache
+    
+    versions, headers, not_modified = _conditional_page(('staff',))
+    if not_modified:
+        return not_modified
+    
+    # The staff cards are the same for every admin until the staff table changes
+    staff_cards = fragment_cache.get_or_render(
+        f"flask:staff_cards:{versions.etag()}",
+        lambda: app.jinja_env.get_template('components/staff_cards.html').render(staff_list=Staff.query.all())
+    )
     
-    return render_template('staff.html', title="Staff Management", staff_list=staff_list)
+    return render_template('staff.html', title="Staff Management", staff_cards=Markup(staff_cards)), 200, headers
 
 @app.route('/bookings')
 def bookings():
@@ -168,11 +198,13 @@ def bookings():
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     search = request.args.get('search')
-    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 10
     
-    # Base query
-    query = Booking.query
+    # Base query; user and staff are shown on every row, so load them in the same query
+    from sqlalchemy.orm import joinedload
+    query = Booking.query.options(joinedload(Booking.user), joinedload(Booking.staff))
     
     # Apply filters
     if status:
@@ -200,8 +232,16 @@ def bookings():
         except ValueError:
             pass
     
-    # Paginate results
-    bookings_paginated = query.order_by(Booking.booking_date.desc()).paginate(page=page, per_page=per_page)
+    # Paginate results newest first, using the last row seen as the cursor
+    from bot.utils.pagination import paginate_bookings
+    bookings_paginated = paginate_bookings(
+        query,
+        Booking,
+        per_page=per_page,
+        after=after,
+        before=before,
+        count_key=('flask.bookings', status, staff_id, date_from, date_to)
+    )
     
     # Get staff for filter dropdown
     from models import Staff
@@ -227,8 +267,11 @@ def booking_detail(booking_id):
     
     from models import Booking, BookingStatus
     
-    # Get booking details
-    booking = Booking.query.get_or_404(booking_id)
+    # Get booking details together with the user and staff shown on the page
+    from sqlalchemy.orm import joinedload
+    booking = Booking.query.options(
+        joinedload(Booking.user), joinedload(Booking.staff)
+    ).filter_by(id=booking_id).first_or_404()
     
     return render_template('booking_detail.html', title=f"Booking #{booking.id}", 
                            booking=booking,
@@ -296,8 +339,17 @@ def update_booking_status(booking_id):
                 # Still continue with the status change
         else:
             # Normal status update without refund
+            old_status = booking.status
             booking.status = status_enum
             db.session.commit()
+            
+            from bot.utils import events
+            events.publish(
+                events.BOOKING_STATUS_CHANGED,
+                booking_id=booking.id,
+                old_status=old_status,
+                new_status=status_enum
+            )
             flash('Booking status updated successfully', 'success')
     except ValueError:
         flash('Invalid status', 'danger')
@@ -320,6 +372,12 @@ def delete_booking(booking_id):
     db.session.delete(booking)
     db.session.commit()
     
+    # The deleted booking no longer counts towards the dashboard totals or shows as recent
+    from bot.utils.dashboard import dashboard_stats
+    from bot.utils.recent_bookings import recent_bookings
+    dashboard_stats.invalidate()
+    recent_bookings.invalidate()
+    
     return "success"
 
 @app.route('/schedule')
@@ -329,6 +387,10 @@ def schedule():
     
     from models import Staff, StaffSchedule
     
+    _, headers, not_modified = _conditional_page(('staff', 'staff_schedules'))
+    if not_modified:
+        return not_modified
+    
     # Get all active staff members for schedule management
     staff_list = Staff.query.filter_by(is_active=True).all()
     
@@ -352,7 +414,7 @@ def schedule():
         schedules[str(staff.id)] = staff_schedule_dict
     
     return render_template('schedule.html', title="Schedule Management", 
-                           staff_list=staff_list, schedules=schedules)
+                           staff_list=staff_list, schedules=schedules), 200, headers
 
 @app.route('/schedule/update', methods=['POST'])
 def update_schedule():
@@ -400,145 +462,142 @@ def set_default_schedule():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    from models import StaffSchedule
-    
     staff_id = request.form.get('staff_id', type=int)
     
     if not staff_id:
         flash('Missing staff information', 'danger')
         return redirect(url_for('schedule'))
     
-    # Delete existing schedules first
-    StaffSchedule.query.filter_by(staff_id=staff_id).delete()
-    
-    # Create default schedule (Mon-Fri 9AM-5PM)
-    for weekday in range(5):  # 0-4 (Monday to Friday)
-        schedule = StaffSchedule(
-            staff_id=staff_id,
-            weekday=weekday,
-            start_time="09:00",
-            end_time="17:00",
-            is_working_day=True
-        )
-        db.session.add(schedule)
-    
-    # Add weekend (not working)
-    for weekday in range(5, 7):  # 5-6 (Saturday and Sunday)
-        schedule = StaffSchedule(
-            staff_id=staff_id,
-            weekday=weekday,
-            start_time="09:00",
-            end_time="17:00",
-            is_working_day=False
-        )
-        db.session.add(schedule)
-    
+    # Default schedule (Mon-Fri 9AM-5PM, weekend off) written in one statement
+    from bot.database import staff_schedule_upsert
+    from bot.utils import events
+    rows = [
+        {
+            'staff_id': staff_id,
+            'weekday': weekday,
+            'start_time': "09:00",
+            'end_time': "17:00",
+            'is_working_day': weekday < 5
+        }
+        for weekday in range(7)
+    ]
+    db.session.execute(staff_schedule_upsert(rows, db.engine.dialect.name))
     db.session.commit()
+    events.publish(events.AVAILABILITY_CHANGED, staff_ids=[staff_id], date=None)
     flash('Default schedule applied successfully', 'success')
     return redirect(url_for('schedule'))
 
 # API endpoints for AJAX requests
+def _dashboard_stats():
+    """Get the cached dashboard counters (one grouped query per cache TTL)."""
+    from models import Booking, Staff
+    from bot.utils.dashboard import dashboard_stats
+    return dashboard_stats.get(db.session, Booking, Staff)
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    if 'user_id' not in session:
+        return {"error": "Unauthorized"}, 401
+    
+    return _dashboard_stats()
+
+@app.route('/api/metrics')
+def api_metrics():
+    if 'user_id' not in session:
+        return {"error": "Unauthorized"}, 401
+    
+    from bot.utils import metrics
+    return metrics.snapshot("admin.")
+
 @app.route('/bookings/stats/total')
 def bookings_stats_total():
     if 'user_id' not in session:
         return "0", 401
     
-    from models import Booking
-    # Count total bookings
-    total_count = Booking.query.count()
-    return str(total_count)
+    return str(_dashboard_stats()['total_bookings'])
 
 @app.route('/bookings/stats/today')
 def bookings_stats_today():
     if 'user_id' not in session:
         return "0", 401
     
-    from models import Booking
-    from datetime import datetime, time
-    # Count today's bookings
-    today = datetime.now().date()
-    today_start = datetime.combine(today, time.min)
-    today_end = datetime.combine(today, time.max)
-    
-    today_count = Booking.query.filter(
-        Booking.booking_date >= today_start,
-        Booking.booking_date <= today_end
-    ).count()
-    
-    return str(today_count)
+    return str(_dashboard_stats()['today_bookings'])
 
 @app.route('/bookings/stats/pending-payments')
 def bookings_stats_pending_payments():
     if 'user_id' not in session:
         return "0", 401
     
-    from models import Booking, BookingStatus
-    # Count pending payment bookings
-    pending_payments = Booking.query.filter_by(status=BookingStatus.PAYMENT_PENDING).count()
-    return str(pending_payments)
+    return str(_dashboard_stats()['pending_payments'])
 
 @app.route('/staff/stats/active')
 def staff_stats_active():
     if 'user_id' not in session:
         return "0", 401
     
-    from models import Staff
-    # Count active staff members
-    active_count = Staff.query.filter_by(is_active=True).count()
-    return str(active_count)
+    return str(_dashboard_stats()['active_staff'])
 
 @app.route('/bookings/recent')
 def bookings_recent():
     if 'user_id' not in session:
         return "No data", 401
     
-    from models import Booking, BookingStatus
-    # Get recent bookings
-    recent_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(5).all()
-    
-    if not recent_bookings:
-        return "<tr><td colspan='6' class='text-center'>No bookings found</td></tr>"
-    
-    html = ""
-    for booking in recent_bookings:
-        status_class = ""
-        if booking.status == BookingStatus.CONFIRMED:
-            status_class = "status-confirmed"
-        elif booking.status == BookingStatus.PENDING:
-            status_class = "status-pending"
-        elif booking.status == BookingStatus.PAYMENT_PENDING:
-            status_class = "status-payment-pending"
-        elif booking.status == BookingStatus.CANCELLED:
-            status_class = "status-cancelled"
-        elif booking.status == BookingStatus.COMPLETED:
-            status_class = "status-completed"
-        
-        html += f"""
-        <tr>
-            <td>{booking.id}</td>
-            <td>
-                <div>{booking.user.first_name} {booking.user.last_name or ''}</div>
-                <small class="text-muted">{booking.user.phone_number or 'No phone'}</small>
-            </td>
-            <td>{booking.staff.name}</td>
-            <td>{booking.booking_date.strftime('%d %b %Y %H:%M')}</td>
-            <td>
-                <span class="badge {status_class}">{booking.status.value.upper()}</span>
-            </td>
-            <td>
-                <div class="btn-group">
-                    <a href="/bookings/{booking.id}" class="btn btn-sm btn-primary">
-                        <i class="fas fa-eye"></i>
-                    </a>
-                    <button class="btn btn-sm btn-danger delete-btn" data-id="{booking.id}" data-type="bookings">
-                        <i class="fas fa-trash"></i>
-                    </button>
-                </div>
-            </td>
-        </tr>
-        """
-    
-    return html
+    from models import Booking
+    from bot.utils.recent_bookings import recent_bookings
+    
+    # Compiled once by Jinja, rendered only when a booking was added or changed
+    rows_template = app.jinja_env.get_template('recent_bookings.html')
+    html = recent_bookings.render(db.session, Booking, lambda bookings: rows_template.render(bookings=bookings))
+    return Response(html, mimetype='text/html')
+
+def _staff_report():
+    """Staff report for the request's date_from, date_to and period, or a 400 response."""
+    from bot.utils.reports import REPORT_PERIODS, report_range, staff_report
+    
+    period = request.args.get('period', 'week')
+    if period not in REPORT_PERIODS:
+        return None, (f"Unknown period: {period}", 400)
+    try:
+        start, end = report_range(request.args.get('date_from'), request.args.get('date_to'))
+    except ValueError as e:
+        return None, (str(e), 400)
+    return (start, end, period, staff_report(db.session, start, end, period)), None
+
+@app.route('/reports')
+def reports():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    from bot.utils.reports import REPORT_PERIODS, queued_day_count
+    
+    report, error = _staff_report()
+    if error:
+        return error
+    start, end, period, rows = report
+    stale_days = queued_day_count(db.session, start, end)
+    
+    return render_template('reports.html', title="Staff Performance", rows=rows, periods=REPORT_PERIODS,
+                           stale_days=stale_days, filters={'date_from': start.isoformat(), 'date_to': end.isoformat(), 'period': period})
+
+@app.route('/reports/download')
+def reports_download():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    from bot.utils.export import EXPORT_FORMATS, iter_export
+    from bot.utils.reports import REPORT_COLUMNS, report_csv_rows
+    
+    report, error = _staff_report()
+    if error:
+        return error
+    start, end, period, rows = report
+    filename = f"staff-report-{start:%Y%m%d}-{end:%Y%m%d}-{period}.csv"
+    
+    return Response(
+        iter_export('csv', list(REPORT_COLUMNS), report_csv_rows(rows)),
+        mimetype=EXPORT_FORMATS['csv'],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @app.route('/staff/add', methods=['GET', 'POST'])
 def add_staff():